@@ -1,6 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
 import xarray as xr
 import numpy as np
 
+from calc import _check_engine, _values_like
+
 
 DEFAULT_API_THRESHOLD = (6.3, 19, 31.7, 44.4, 57.1, 69.8)
 DEFAULT_API_POLYNOMIALS = (
@@ -77,6 +80,8 @@ def soil_plant_water_balance(
     rho_crop=None,
     rho_adj=False,
     time_dim="T",
+    engine="numpy",
+    n_workers=1,
 ):
     """Compute soil-plant-water balance day after day over a growing season.
 
@@ -119,6 +124,14 @@ def soil_plant_water_balance(
         (default is `rho_adj` =False).
     time_dim : str, optional
         Daily time dimension to run the balance against (default `time_dim` ="T").
+    engine : str, optional
+        "numpy" runs the balance over arrays, with Kc looked up in a table
+        indexed by days since planting,
+        "xarray" runs soil_plant_water_step day after day on DataArrays
+        (default `engine` ="numpy").
+    n_workers : int, optional
+        With the "numpy" engine, number of threads across which the first
+        non-time dimension is split (default `n_workers` =1).
         
     Returns
     -------
@@ -169,6 +182,9 @@ def soil_plant_water_balance(
     Allen, Richard & Pereira, L. & Raes, D. & Smith, M. (1998).
     FAO Irrigation and drainage paper No. 56.
     Rome: Food and Agriculture Organization of the United Nations. 56. 26-40.
+
+    The "numpy" engine assumes `kc_params` periods and `planting_date` are
+    whole days, which the "xarray" engine doesn't need.
     
     Examples
     --------
@@ -261,39 +277,58 @@ def soil_plant_water_balance(
     drainage = xr.full_like(sm, fill_value=np.nan)
     # sm starts with initial condition sminit
     sm = xr.concat([sminit, sm], time_dim)
-    # Filling/emptying bucket day after day
-    for doy in range(0, peffective[time_dim].size):
-        if kc_params is not None: # interpolate kc value per distance from planting
-            kc = kc_inflex.interp(
-                kc_periods=planted_since, kwargs={"fill_value": 1}
-            ).where(lambda x: x.notnull(), other=1).drop_vars("kc_periods")
-            if time_dim in et_crop.dims: # et _crop depends on time_dim but et might not
-                et_crop[{time_dim: doy}] = kc * et.isel({time_dim: doy}, missing_dims='ignore')
-        if rho_crop is not None: # apply water stress conditions penalization of et_crop
-            if rho_adj: # raw depends on et_crop
-                raw = (
-                    rho_crop + 0.04 * (5 - et_crop.isel({time_dim: doy}, missing_dims='ignore'))
-                ).clip(0.1, 0.8) * taw
-            # penalization depends on previous day sm
-            ks = (sm.isel({time_dim: doy}, drop=True) / raw).clip(max=1)
-            et_crop_red[{time_dim: doy}] = ks * et_crop.isel({time_dim: doy}, missing_dims='ignore')
-        # water balance step
-        sm[{time_dim: doy+1}], drainage[{time_dim: doy}] = soil_plant_water_step(
-            sm.isel({time_dim: doy}, drop=True),
-            peffective.isel({time_dim: doy}, drop=True),
-            et_crop_red.isel({time_dim: doy}, missing_dims='ignore', drop=True),
+    _check_engine(engine)
+    if engine == "numpy":
+        sm, drainage, et_crop, et_crop_red, planted_since = _soil_plant_water_scan(
+            peffective,
+            et,
             taw,
+            sm,
+            drainage,
+            et_crop,
+            et_crop_red,
+            kc_inflex if kc_params is not None else None,
+            planted_since if kc_params is not None else None,
+            sm_threshold if planting_date is None else None,
+            rho_crop,
+            rho_adj,
+            time_dim,
+            n_workers,
         )
-        # Increment planted_since
-        if kc_params is not None:
-            if planting_date is None: # did doy met planting conditions?
-                planted_since = planted_since.where(
-                    lambda x: x.notnull(), # no planting date found yet
-                    other=xr.where( # next day is planting if sm condition met
-                        sm.isel({time_dim: doy+1}) >= sm_threshold, -1, np.nan
-                    ).astype("timedelta64[D]"),
-                )
-            planted_since = planted_since + np.timedelta64(1, "D")
+    else:
+        # Filling/emptying bucket day after day
+        for doy in range(0, peffective[time_dim].size):
+            if kc_params is not None: # interpolate kc value per distance from planting
+                kc = kc_inflex.interp(
+                    kc_periods=planted_since, kwargs={"fill_value": 1}
+                ).where(lambda x: x.notnull(), other=1).drop_vars("kc_periods")
+                if time_dim in et_crop.dims: # et _crop depends on time_dim but et might not
+                    et_crop[{time_dim: doy}] = kc * et.isel({time_dim: doy}, missing_dims='ignore')
+            if rho_crop is not None: # apply water stress conditions penalization of et_crop
+                if rho_adj: # raw depends on et_crop
+                    raw = (
+                        rho_crop + 0.04 * (5 - et_crop.isel({time_dim: doy}, missing_dims='ignore'))
+                    ).clip(0.1, 0.8) * taw
+                # penalization depends on previous day sm
+                ks = (sm.isel({time_dim: doy}, drop=True) / raw).clip(max=1)
+                et_crop_red[{time_dim: doy}] = ks * et_crop.isel({time_dim: doy}, missing_dims='ignore')
+            # water balance step
+            sm[{time_dim: doy+1}], drainage[{time_dim: doy}] = soil_plant_water_step(
+                sm.isel({time_dim: doy}, drop=True),
+                peffective.isel({time_dim: doy}, drop=True),
+                et_crop_red.isel({time_dim: doy}, missing_dims='ignore', drop=True),
+                taw,
+            )
+            # Increment planted_since
+            if kc_params is not None:
+                if planting_date is None: # did doy met planting conditions?
+                    planted_since = planted_since.where(
+                        lambda x: x.notnull(), # no planting date found yet
+                        other=xr.where( # next day is planting if sm condition met
+                            sm.isel({time_dim: doy+1}) >= sm_threshold, -1, np.nan
+                        ).astype("timedelta64[D]"),
+                    )
+                planted_since = planted_since + np.timedelta64(1, "D")
     # Let's have sm same shape as other variables
     sm = sm.isel({time_dim: slice(1,None)})
     # Let's save planting_date
@@ -310,6 +345,141 @@ def soil_plant_water_balance(
     )
 
 
+def _soil_plant_water_scan(
+    peffective,
+    et,
+    taw,
+    sm,
+    drainage,
+    et_crop,
+    et_crop_red,
+    kc_inflex,
+    planted_since,
+    sm_threshold,
+    rho_crop,
+    rho_adj,
+    time_dim,
+    n_workers,
+):
+    """Array version of soil_plant_water_balance's daily loop.
+
+    Fills `sm` (that starts with sminit), `drainage`, and `et_crop` and `et_crop_red`
+    if they are allocated (respectively if `kc_inflex` and `rho_crop` are not None),
+    and returns them with the updated `planted_since` .
+    Kc is read from a table of Kc for each day of the Kc curve.
+    Days not planted yet are NaN in `planted_since` and all arrays
+    are broadcast against `drainage` dims with `time_dim` first.
+    """
+    like = drainage.transpose(time_dim, ...)
+    cells = like.isel({time_dim: 0}, drop=True)
+    peffective_v, et_v = (_values_like(x, like) for x in (peffective, et))
+    taw_v = _values_like(taw, cells)
+    sm_v = np.empty((like.shape[0] + 1,) + cells.shape)
+    sm_v[0] = _values_like(sm.isel({time_dim: 0}, drop=True), cells)
+    drainage_v = np.empty(like.shape)
+    if kc_inflex is None:
+        et_crop_v = et_v
+    else:
+        et_crop_v = np.empty(like.shape)
+        kc_days = kc_inflex["kc_periods"].values.astype("timedelta64[D]").astype(int)
+        kc_first, kc_last = kc_days[0], kc_days[-1]
+        kc_lut = kc_inflex.interp(
+            kc_periods=np.arange(kc_first, kc_last + 1)
+                .astype("timedelta64[D]").astype("timedelta64[ns]"),
+        )
+        kc_lut = _values_like(
+            kc_lut, cells.expand_dims(kc_periods=kc_lut["kc_periods"].values)
+        )
+        planted_since_v = np.array(
+            _values_like(planted_since / np.timedelta64(1, "D"), cells), dtype=float
+        )
+        if sm_threshold is not None:
+            sm_threshold = _values_like(sm_threshold, cells)
+    if rho_crop is None:
+        et_crop_red_v = et_crop_v
+    else:
+        et_crop_red_v = np.empty(like.shape)
+        rho_crop_v = _values_like(rho_crop, cells)
+        raw = rho_crop_v * taw_v
+
+    def scan(cells_slice):
+        ps = planted_since_v[cells_slice] if kc_inflex is not None else None
+        for doy in range(like.shape[0]):
+            et_t = et_v[doy, cells_slice]
+            if kc_inflex is not None:
+                kc_known = (ps >= kc_first) & (ps <= kc_last)
+                kc_index = np.where(kc_known, ps - kc_first, 0).astype(int)
+                kc = np.where(
+                    kc_known,
+                    np.take_along_axis(
+                        kc_lut[:, cells_slice], kc_index[np.newaxis], axis=0
+                    )[0],
+                    1,
+                )
+                et_crop_v[doy, cells_slice] = kc * et_t
+            et_crop_t = et_crop_v[doy, cells_slice]
+            sm_t = sm_v[doy, cells_slice]
+            taw_t = taw_v[cells_slice]
+            if rho_crop is not None:
+                if rho_adj:
+                    raw_t = (
+                        rho_crop_v[cells_slice] + 0.04 * (5 - et_crop_t)
+                    ).clip(0.1, 0.8) * taw_t
+                else:
+                    raw_t = raw[cells_slice]
+                ks = (sm_t / raw_t).clip(max=1)
+                et_crop_red_v[doy, cells_slice] = ks * et_crop_t
+            wb = (
+                sm_t + peffective_v[doy, cells_slice] - et_crop_red_v[doy, cells_slice]
+            ).clip(min=0)
+            drainage_v[doy, cells_slice] = (wb - taw_t).clip(min=0)
+            sm_v[doy + 1, cells_slice] = wb - drainage_v[doy, cells_slice]
+            if kc_inflex is not None:
+                if sm_threshold is not None:
+                    ps = np.where(
+                        np.isnan(ps),
+                        np.where(
+                            sm_v[doy + 1, cells_slice] >= sm_threshold[cells_slice],
+                            -1,
+                            np.nan,
+                        ),
+                        ps,
+                    )
+                ps = ps + 1
+                planted_since_v[cells_slice] = ps
+
+    if n_workers > 1 and cells.ndim > 0:
+        bounds = np.linspace(0, cells.shape[0], n_workers + 1).astype(int)
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            list(pool.map(scan, [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]))
+    else:
+        scan(...)
+
+    def fill(target, values):
+        full = xr.DataArray(values, dims=like.dims)
+        return target.copy(data=full.isel(
+            {dim: 0 for dim in full.dims if dim not in target.dims}
+        ).transpose(*target.dims).values)
+
+    sm = sm.copy(data=xr.DataArray(sm_v, dims=like.dims).transpose(*sm.dims).values)
+    drainage = fill(drainage, drainage_v)
+    if kc_inflex is not None:
+        et_crop = fill(et_crop, et_crop_v)
+        planted_since = cells.copy(data=planted_since_v).astype(
+            "timedelta64[D]"
+        ).transpose(*planted_since.dims, ...)
+        if sm_threshold is not None:
+            # Like the daily loop's search, that compares the last day's sm
+            planted_since = planted_since.assign_coords(
+                {time_dim: sm[time_dim][-1]}
+            )
+    if rho_crop is None:
+        et_crop_red = et_crop
+    else:
+        et_crop_red = fill(et_crop_red, et_crop_red_v)
+    return sm, drainage, et_crop, et_crop_red, planted_since
+
+
 def api_runoff(
     daily_rain,
     api,
@@ -328,7 +498,7 @@ def api_runoff(
     daily_rain : DataArray
         daily precipitation
     api : DataArray
-        an Antecedent Precipitiona Index. Must be same size as daily_rain.
+        an Antecedent Precipitiona Index. Aligned with `daily_rain` by label.
     no_runoff : DataArray, optional
         `runoff` is 0 if `daily_rain` is lesser or equal to `no_runoff`
         (default `no_runoff` =12.5)
@@ -344,7 +514,7 @@ def api_runoff(
     Returns
     -------
     runoff : DataArray
-        daily Runoff.
+        daily Runoff, with the coordinates of `daily_rain` that `api` has too.
 
     See Also
     --------
@@ -352,7 +522,10 @@ def api_runoff(
     
     Notes
     -----
-    `runoff` drops NA values.
+    `runoff` is missing where `daily_rain` is,
+    and uses the last polynomial where `api` is missing.
+    API categories are found with numpy.digitize, and the polynomials are
+    evaluated by Horner's scheme on their coefficients gathered by category.
     Typically the heading values of `api`
     that is typically defined on a rolling time window of daily rain.
     The default `api_thresh` is
@@ -378,28 +551,33 @@ def api_runoff(
     
     where x is daily rain.
     """
-    conds = (
-        [(daily_rain <= no_runoff).values] +
-        [
-            (
-                (daily_rain > no_runoff) &
-                ((i == 0) | (api > api_thresh[i-1])) &
-                ((i == len(api_thresh)) | (api <= api_thresh[i]))
-            ).values
-            for i in range(len(api_thresh))
-        ]
+    daily_rain, api = xr.align(daily_rain, api, join="inner")
+    # API category of each day, the last one for missing API
+    api_category = np.digitize(
+        api.transpose(*daily_rain.dims).values, api_thresh, right=True
     )
-    funcs = [0] + [
-        np.polynomial.polynomial.Polynomial(coeffs)
-        for coeffs in api_poly
-    ]
+    rain = daily_rain.values
+    # Coefficients of each degree (rows) of each category's polynomial
+    coeffs = np.zeros((max(len(poly) for poly in api_poly), len(api_poly)))
+    for i, poly in enumerate(api_poly):
+        coeffs[:len(poly), i] = poly
+    # Horner's scheme on gathered coefficients
+    runoff = coeffs[-1][api_category]
+    for degree_coeffs in coeffs[-2::-1]:
+        runoff *= rain
+        runoff += degree_coeffs[api_category]
+    runoff[(daily_rain <= no_runoff).values] = 0
+    np.maximum(runoff, 0, out=runoff)
     return xr.DataArray(
-        np.piecewise(daily_rain, conds, funcs),
-        dims=daily_rain.dims, attrs=dict(description="Runoff", units="mm")
-    ).clip(min=0).rename("runoff")
+        runoff.astype(np.result_type(rain.dtype, np.float32), copy=False),
+        dims=daily_rain.dims,
+        coords=daily_rain.coords,
+        attrs=dict(description="Runoff", units="mm"),
+        name="runoff",
+    )
 
 
-def antecedent_precip_ind(daily_rain, n, time_dim="T"):
+def antecedent_precip_ind(daily_rain, n, time_dim="T", time_block=None):
     """Antecedent Precipitation Index (API) is a rolling weighted sum
     of daily rainfall `daily_rain` over a window of `n` days.
     The weights are 1/2 for last day and 1/( `n` -i-1) for i :sup:`th` day of the window.
@@ -412,6 +590,11 @@ def antecedent_precip_ind(daily_rain, n, time_dim="T"):
         size of the rolling window to weight-sum against.
     time_dim : str, optional
         Daily time dimension to run weighted-sum against (default `time_dim` ="T").
+    time_block : int, optional
+        number of days of `daily_rain` to read at a time, carrying the last
+        `n` -1 days of a block to the next one,
+        e.g. to process records that don't fit in memory.
+        All of them at once if None (default).
     
     Returns
     -------
@@ -422,15 +605,46 @@ def antecedent_precip_ind(daily_rain, n, time_dim="T"):
     See Also
     --------
     api_runoff
+
+    Notes
+    -----
+    The weighted sum is a correlation with the `n` weights along `time_dim` ,
+    accumulated weight by weight from shifted slices of `daily_rain` into
+    the result, so that windows are never materialized.
     """
-    dr_rolled = (
-        daily_rain.rolling(**{time_dim: n})
-        .construct("window")
-        .isel({time_dim: slice(n-1, None)})
+    weights = np.empty(n)
+    weights[:-1] = 1 / np.arange(n - 1, 0, -1)
+    weights[-1] = 1 / 2
+    size = daily_rain[time_dim].size
+    if time_block is None:
+        time_block = size
+    dims = daily_rain.transpose(time_dim, ...).dims
+    api = np.zeros(
+        (max(size - n + 1, 0),) + tuple(daily_rain[dim].size for dim in dims[1:])
     )
-    return dr_rolled.weighted(
-        1 / dr_rolled["window"][::-1].where(lambda x: x != 0, 2)
-    ).sum(dim="window", skipna=False).rename("api")
+    carried = np.zeros((0,) + api.shape[1:])
+    for start in range(0, size, time_block):
+        rain = np.concatenate([
+            carried,
+            daily_rain.isel({time_dim: slice(start, start + time_block)})
+            .transpose(*dims).values,
+        ])
+        # API of days from the last of the first window of rain on
+        first = start - carried.shape[0]
+        windows = rain.shape[0] - n + 1
+        if windows > 0:
+            block_api = api[first:first + windows]
+            weighted = np.empty(block_api.shape)
+            for i, weight in enumerate(weights):
+                np.multiply(rain[i:i + windows], weight, out=weighted)
+                block_api += weighted
+        carried = rain[max(rain.shape[0] - (n - 1), 0):]
+    return xr.DataArray(
+        api,
+        dims=dims,
+        coords=daily_rain.isel({time_dim: slice(n - 1, None)}).coords,
+        name="api",
+    ).transpose(*daily_rain.dims)
 
 
 def hargreaves_et_ref(temp_avg, temp_amp, ra):
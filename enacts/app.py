@@ -2,7 +2,7 @@ import flask
 import importlib
 import os
 
-from globals_ import FLASK, GLOBAL_CONFIG
+from globals_ import FLASK, GLOBAL_CONFIG, TILE_RENDERER
 import homepage
 import pingrid
 
@@ -13,6 +13,10 @@ for name, config in GLOBAL_CONFIG['maprooms'].items():
             for c in config:
                 module.register(FLASK, c)
 
+# Fork the tile rendering workers now that they can see all the maprooms.
+if TILE_RENDERER is not None:
+    TILE_RENDERER.start()
+
 
 @FLASK.route(f"{GLOBAL_CONFIG['url_path_prefix']}/health")
 def health_endpoint():
@@ -0,0 +1,128 @@
+"""Benchmarks of calc functions on a synthetic ENACTS-like grid.
+
+Run from the enacts directory so that calc can be imported, e.g.:
+
+    PYTHONPATH=. python benchmarks/bench_calc.py --lon-span 3 --lat-span 3 --years 2
+
+The grid has the 0.0375 degree resolution of ENACTS daily data.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import calc
+
+
+RESOLUTION = 0.0375
+
+
+def synthetic_precip(lon_span, lat_span, years, seed=0):
+    """Daily rainfall on a (T, Y, X) grid at ENACTS resolution,
+    dry most days, with gamma-distributed wet days."""
+    t = pd.date_range(start="1981-01-01", periods=int(365.25 * years), freq="1D")
+    x = np.arange(33, 33 + lon_span, RESOLUTION)
+    y = np.arange(3, 3 + lat_span, RESOLUTION)
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(0.6, 12, (t.size, y.size, x.size)) * (
+        rng.random((t.size, y.size, x.size)) < 0.4
+    )
+    return xr.DataArray(
+        values,
+        dims=["T", "Y", "X"],
+        coords={"T": t, "Y": y, "X": x},
+        name="precip",
+    )
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    print(f"{label}: {time.perf_counter() - start:.3f}s")
+    return result
+
+
+def bench_water_balance(precip):
+    for reduce in [False, True]:
+        print(f"water_balance reduce={reduce}")
+        ref = timed(
+            "  xarray engine",
+            calc.water_balance, precip, 5, 60, 60./3., reduce=reduce, engine="xarray",
+        )
+        new = timed(
+            "  numpy engine",
+            calc.water_balance, precip, 5, 60, 60./3., reduce=reduce, engine="numpy",
+        )
+        xr.testing.assert_allclose(ref, new)
+
+
+def bench_cess_date(precip):
+    print("cess_date_from_rain")
+    ref = timed(
+        "  xarray engine",
+        calc.cess_date_from_rain, precip, 5, 3, 5, 60, 60./3., engine="xarray",
+    )
+    new = timed(
+        "  numpy engine",
+        calc.cess_date_from_rain, precip, 5, 3, 5, 60, 60./3., engine="numpy",
+    )
+    xr.testing.assert_identical(ref, new)
+
+
+def bench_onset_date(precip):
+    print("onset_date")
+    ref = timed(
+        "  xarray engine",
+        calc.onset_date, precip, 1, 3, 20, 1, 7, 21, engine="xarray",
+    )
+    new = timed(
+        "  numpy engine",
+        calc.onset_date, precip, 1, 3, 20, 1, 7, 21, engine="numpy",
+    )
+    xr.testing.assert_identical(ref, new)
+    new = timed(
+        "  numpy engine by 90 days",
+        calc.onset_date, precip, 1, 3, 20, 1, 7, 21, engine="numpy", time_chunk=90,
+    )
+    xr.testing.assert_identical(ref, new)
+
+
+def bench_following_dry_spell_length(precip):
+    print("following_dry_spell_length")
+    ref = timed(
+        "  xarray engine",
+        calc.following_dry_spell_length, precip, 1, engine="xarray",
+    )
+    new = timed(
+        "  numpy engine",
+        calc.following_dry_spell_length, precip, 1, engine="numpy",
+    )
+    xr.testing.assert_identical(ref, new)
+    new = timed(
+        "  numpy engine by 365 days",
+        calc.following_dry_spell_length, precip, 1, engine="numpy", time_block=365,
+    )
+    xr.testing.assert_identical(ref, new)
+
+
+BENCHMARKS = {
+    "water_balance": bench_water_balance,
+    "cess_date": bench_cess_date,
+    "onset_date": bench_onset_date,
+    "following_dry_spell_length": bench_following_dry_spell_length,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lon-span", type=float, default=3.)
+    parser.add_argument("--lat-span", type=float, default=3.)
+    parser.add_argument("--years", type=float, default=2.)
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS))
+    args = parser.parse_args()
+    precip = synthetic_precip(args.lon_span, args.lat_span, args.years)
+    print(f"grid {dict(precip.sizes)}")
+    for name in args.benchmarks:
+        BENCHMARKS[name](precip)
@@ -1,7 +1,11 @@
+import weakref
+
 import numpy as np
 import pandas as pd
 import xarray as xr
 
+import run_length
+
 # Date Reading functions
 def read_zarr_data(zarr_path):
     """Read and return data in zarr format.
@@ -29,6 +33,12 @@ def water_balance_step(sm_yesterday, peffective, et, taw):
     return (sm_yesterday + peffective - et).clip(min=0, max=taw)
 
 
+def _check_engine(engine):
+    """Raises a ValueError if `engine` is neither "numpy" nor "xarray"."""
+    if engine not in ("numpy", "xarray"):
+        raise ValueError(f"engine must be numpy or xarray, not {engine}")
+
+
 def water_balance(
     daily_rain,
     et,
@@ -36,6 +46,7 @@ def water_balance(
     sminit,
     reduce=False,
     time_dim="T",
+    engine="numpy",
 ):
     """Calculate soil moisture.
 
@@ -56,16 +67,28 @@ def water_balance(
     sminit : DataArray
         Soil moisture initialization. If DataArray, must not have `time_dim` dim.
         Can be a single value with no dimensions or axes.
-    time_dim : str, optional             
-        Time coordinate in `daily_rain` (default `time_dim`="T"). 
+    reduce : boolean, optional
+        If True, only returns soil moisture of the last day of `daily_rain`
+        (default `reduce` =False).
+    time_dim : str, optional
+        Time coordinate in `daily_rain` (default `time_dim`="T").
+    engine : str, optional
+        "numpy" runs the recurrence over contiguous arrays
+        with `time_dim` as first axis,
+        "xarray" runs water_balance_step day after day on DataArrays
+        (default `engine` ="numpy").
     Returns
     -------
     water_balance : Dataset
         `water_balance` dataset with daily `soil_moisture`.
     See Also
     --------
+    water_balance_step
     Notes
     -----
+    The "numpy" engine clips the running soil moisture at 0 and `taw`
+    in place on arrays broadcast once, where the "xarray" engine
+    selects and assigns each day of the DataArrays, which is slow on long records.
     Examples
     --------
     """
@@ -76,6 +99,22 @@ def water_balance(
         et,
         taw,
     )
+    _check_engine(engine)
+    if engine == "numpy":
+        soil_moisture = _water_balance_scan(
+            daily_rain, et, taw, soil_moisture, reduce, time_dim
+        )
+    else:
+        soil_moisture = _water_balance_loop(
+            daily_rain, et, taw, soil_moisture, reduce, time_dim
+        )
+    soil_moisture.attrs = dict(description="Soil Moisture", units="mm")
+    water_balance = xr.Dataset().merge(soil_moisture.rename("soil_moisture"))
+    return water_balance
+
+
+def _water_balance_loop(daily_rain, et, taw, sm_first, reduce, time_dim):
+    soil_moisture = sm_first
     if not reduce:
         soil_moisture = soil_moisture.broadcast_like(daily_rain[time_dim])
     # Looping on time_dim
@@ -90,9 +129,47 @@ def water_balance(
             soil_moisture = sm_t
         else:
             soil_moisture.loc[{time_dim: t}] = sm_t.squeeze(time_dim, drop=True)
-    soil_moisture.attrs = dict(description="Soil Moisture", units="mm")
-    water_balance = xr.Dataset().merge(soil_moisture.rename("soil_moisture"))
-    return water_balance
+    return soil_moisture
+
+
+def _water_balance_scan(daily_rain, et, taw, sm_first, reduce, time_dim):
+    if daily_rain[time_dim].size == 1:
+        return sm_first
+    # sm_first holds all the dims of the result:
+    # broadcast all inputs against it with time_dim as first axis
+    soil_moisture = sm_first.broadcast_like(daily_rain[time_dim])
+    dims = soil_moisture.dims
+    soil_moisture = soil_moisture.transpose(time_dim, ...)
+    rain, et, taw = (
+        _values_like(x, soil_moisture) for x in (daily_rain, et, taw)
+    )
+    rain = np.ascontiguousarray(rain)
+    sm_t = soil_moisture.values[0]
+    if reduce:
+        for t in range(1, rain.shape[0]):
+            sm_t = np.clip(sm_t + rain[t] - et[t], 0, taw[t])
+        soil_moisture = soil_moisture.isel({time_dim: [-1]}).copy(
+            data=sm_t[np.newaxis].astype(soil_moisture.dtype)
+        ).transpose(..., time_dim)
+    else:
+        sm = np.empty(soil_moisture.shape, dtype=soil_moisture.dtype)
+        sm[0] = sm_t
+        for t in range(1, rain.shape[0]):
+            sm[t] = np.clip(sm[t-1] + rain[t] - et[t], 0, taw[t])
+        soil_moisture = soil_moisture.copy(data=sm).transpose(*dims)
+    return soil_moisture
+
+
+def _values_like(x, like):
+    """Values of `x` aligned and broadcast against DataArray `like`,
+    with `like` 's dims order. Broadcasting is a view: no data is copied.
+    """
+    return (
+        xr.align(like, xr.DataArray(x), join="left")[1]
+        .broadcast_like(like)
+        .transpose(*like.dims)
+        .values
+    )
 
 
 def longest_run_length(flagged_data, dim):
@@ -115,16 +192,12 @@ def longest_run_length(flagged_data, dim):
         
     See Also
     --------
+    run_length.encode, run_length.longest
     
     Notes
     -----
-    The longest run is the maximum value of the discrete difference
-    of cumulative flags keeping only the unflagged data.
-    Because diff needs at least 2 points,
-    we need to keep (where) the unflagged and first and last
-    with the cumulative value for last and 0 for first.
-    Cumulative flags, where kept, need be propagated by bfill
-    so that diff returns 0 or the length of runs.
+    The longest run is found from the run-length encoding of the flags.
+    Missing values neither break nor extend runs.
     
     I believe that it works for unevenly spaced `dim`,
     only we then don't know what the units of the result are.
@@ -145,19 +218,16 @@ def longest_run_length(flagged_data, dim):
     # Special case coord.size = 1
     lrl = flagged_data
     if lrl[dim].size != 1:
-        # Points to apply diff to
-        unflagged_and_ends = (flagged_data == 0) * 1
-        unflagged_and_ends[{dim: [0, -1]}] = 1
-    
-        lrl = lrl.cumsum(dim=dim).where(unflagged_and_ends, other = np.nan).where(
-            # first cumul point must be set to 0
-            lambda x: x[dim] != lrl[dim][0], other=0
-        ).bfill(dim).diff(dim).max(dim=dim)
+        lrl = run_length.longest(
+            run_length.encode(flagged_data, dim, skipna=True)
+        ).astype(float).rename(flagged_data.name)
     lrl.attrs = dict(description="Longest Run Length")
     return lrl
 
 
-def following_dry_spell_length(daily_rain, wet_thresh, time_dim="T"):
+def following_dry_spell_length(
+    daily_rain, wet_thresh, time_dim="T", engine="numpy", time_block=None
+):
     """Compute the count of consecutive dry days (or dry spell length) after each day
 
     Parameters
@@ -168,17 +238,32 @@ def following_dry_spell_length(daily_rain, wet_thresh, time_dim="T"):
         a dry day is a day when `daily_rain` is lesser or equal to `wet_thresh`
     time_dim : str, optional             
         Daily time dimension of `daily_rain` (default `time_dim` = "T").
+    engine : str, optional
+        "numpy" counts dry days in a single backward scan of arrays,
+        "xarray" cumulates dry days on DataArrays
+        (default `engine` ="numpy").
+    time_block : int, optional
+        With the "numpy" engine, number of days of `daily_rain` to read at a time,
+        e.g. to scan data that doesn't fit in memory.
+        All of them at once if None (default).
  
     Returns
     -------
     DataArray
         Array of length of dry spell immediately following each day along `time_dim`
+        but the last one
         
     See Also
     --------
     
     Notes
     -----
+    The "numpy" engine scans days backwards,
+    updating the length of the dry spell starting each day from that of the next day,
+    and writes it in the result as the length following the previous day.
+    Only this length is carried from a block of days to the previous one.
+
+    The "xarray" engine works on whole DataArrays instead.
     Ideally we would want to cumulate count of dry days backwards
     and reset count to 0 each time a wet day occurs.
     But that is hard to do vectorially.
@@ -204,6 +289,12 @@ def following_dry_spell_length(daily_rain, wet_thresh, time_dim="T"):
       * T        (T) datetime64[ns] 2000-05-01 2000-05-02 ... 2000-05-13 2000-05-14
     """
 
+    _check_engine(engine)
+    if engine == "numpy":
+        return _following_dry_spell_length_scan(
+            daily_rain, wet_thresh, time_dim, time_block
+        )
+
     # Find dry days
     dry_day = ~(daily_rain > wet_thresh) * 1
     # Cumul dry days backwards and shift back to get the count to exclude day of
@@ -221,6 +312,37 @@ def following_dry_spell_length(daily_rain, wet_thresh, time_dim="T"):
     return dry_spell_length
 
 
+def _following_dry_spell_length_scan(daily_rain, wet_thresh, time_dim, time_block):
+    """Array version of following_dry_spell_length, reading `daily_rain`
+    by blocks of `time_block` days from the last one."""
+    n = daily_rain[time_dim].size
+    if time_block is None:
+        time_block = n
+    dims = daily_rain.transpose(time_dim, ...).dims
+    spell_length = np.zeros(
+        [daily_rain[dim].size for dim in dims[1:]], dtype=float
+    )
+    following = np.empty((n - 1,) + spell_length.shape)
+    for stop in range(n, 0, -time_block):
+        start = max(0, stop - time_block)
+        dry_day = ~(
+            daily_rain.isel({time_dim: slice(start, stop)}).transpose(*dims).values
+            > wet_thresh
+        )
+        for i in range(stop - 1, start - 1, -1):
+            # Length of the dry spell starting on day i
+            spell_length += 1
+            spell_length *= dry_day[i - start]
+            if i > 0:
+                following[i - 1] = spell_length
+    return xr.DataArray(
+        following,
+        dims=dims,
+        coords=daily_rain.isel({time_dim: slice(None, -1)}).coords,
+        name=daily_rain.name,
+    ).transpose(*daily_rain.dims)
+
+
 def onset_date(
     daily_rain,
     wet_thresh,
@@ -230,6 +352,8 @@ def onset_date(
     dry_spell_length,
     dry_spell_search,
     time_dim="T",
+    engine="numpy",
+    time_chunk=None,
 ):
     """Calculate onset date.
 
@@ -262,6 +386,15 @@ def onset_date(
         is found that would invalidate the wet spell as onset date.
     time_dim : str, optional
         Time coordinate in `daily_rain` (default `time_dim`="T").       
+    engine : str, optional
+        "numpy" counts wet and dry days in windows from cumulative sums on arrays,
+        "xarray" applies rolling windows on DataArrays
+        (default `engine` ="numpy").
+    time_chunk : int, optional
+        With the "numpy" engine, number of days (e.g. the length of a season)
+        of the blocks in which to search `daily_rain` , stopping at the first
+        block after which all onset dates are found.
+        The whole time series at once if None (default).
     Returns
     -------
     onset_delta : DataArray[np.timedelta64]
@@ -270,9 +403,26 @@ def onset_date(
     --------
     Notes
     -----
+    The "numpy" engine finds the first wet day of wet spells from
+    cumulative counts of wet days, where the "xarray" engine materializes
+    `wet_spell_length` values per day.
     Examples
     --------
     """
+    _check_engine(engine)
+    if engine == "numpy":
+        return _onset_date_scan(
+            daily_rain,
+            wet_thresh,
+            wet_spell_length,
+            wet_spell_thresh,
+            min_wet_days,
+            dry_spell_length,
+            dry_spell_search,
+            time_dim,
+            time_chunk,
+        )
+
     # Find wet days
     wet_day = daily_rain > wet_thresh
 
@@ -332,6 +482,122 @@ def onset_date(
     return onset_delta
 
 
+def _window_counts(flags, window):
+    """Counts of True `flags` in each `window` -day window along the first axis,
+    for the windows ending at day `window` - 1 and after."""
+    cumul = np.cumsum(flags, axis=0, dtype=np.int32)
+    counts = cumul[window - 1:].copy()
+    counts[1:] -= cumul[:-window]
+    return counts
+
+
+def _onset_mask(
+    rain,
+    wet_thresh,
+    wet_spell_length,
+    wet_spell_thresh,
+    min_wet_days,
+    dry_spell_length,
+    dry_spell_search,
+):
+    """Days of ndarray `rain` , with time on the first axis, that end a wet spell
+    not followed by a dry spell, as in onset_date.
+    """
+    n = rain.shape[0]
+    wet_day = rain > wet_thresh
+    wet_spell = np.zeros(rain.shape, dtype=bool)
+    if wet_spell_length <= n:
+        # Sums of windows of a view: no window is materialized
+        rain_sum = np.lib.stride_tricks.sliding_window_view(
+            rain, wet_spell_length, axis=0
+        ).sum(axis=-1)
+        wet_spell[wet_spell_length - 1:] = (rain_sum >= wet_spell_thresh) & (
+            _window_counts(wet_day, wet_spell_length) >= min_wet_days
+        )
+    if dry_spell_search == 0:
+        return wet_spell
+    dry_spell = np.zeros(rain.shape, dtype=bool)
+    if dry_spell_length <= n:
+        dry_spell[dry_spell_length - 1:] = (
+            _window_counts(~wet_day, dry_spell_length) == dry_spell_length
+        )
+    # Dry spells ending within the dry_spell_search days following each day,
+    # assumed when these days are past the end of the data
+    dry_spell_ahead = np.ones(rain.shape, dtype=bool)
+    if dry_spell_search < n:
+        cumul = np.cumsum(dry_spell, axis=0, dtype=np.int32)
+        dry_spell_ahead[:n - dry_spell_search] = (
+            cumul[dry_spell_search:] != cumul[:n - dry_spell_search]
+        )
+    return wet_spell & ~dry_spell_ahead
+
+
+def _onset_date_scan(
+    daily_rain,
+    wet_thresh,
+    wet_spell_length,
+    wet_spell_thresh,
+    min_wet_days,
+    dry_spell_length,
+    dry_spell_search,
+    time_dim,
+    time_chunk,
+):
+    """Array version of onset_date.
+
+    The time series is searched by blocks of `time_chunk` days, each extended
+    by the days its windows need before and after it, until all onset dates
+    are found.
+    """
+    rain = daily_rain.transpose(time_dim, ...).values
+    n = rain.shape[0]
+    if time_chunk is None:
+        time_chunk = n
+    before = max(wet_spell_length, dry_spell_length if dry_spell_search else 0) - 1
+    onset = np.zeros(rain.shape[1:], dtype=int)
+    found = np.zeros(rain.shape[1:], dtype=bool)
+    for start in range(0, n, time_chunk):
+        end = min(start + time_chunk, n)
+        first = max(0, start - before)
+        onset_mask = _onset_mask(
+            rain[first:min(n, end + dry_spell_search)],
+            wet_thresh,
+            wet_spell_length,
+            wet_spell_thresh,
+            min_wet_days,
+            dry_spell_length,
+            dry_spell_search,
+        )[start - first:end - first]
+        found_now = ~found & onset_mask.any(axis=0)
+        onset[found_now] = start + onset_mask.argmax(axis=0)[found_now]
+        found |= found_now
+        if found.all():
+            break
+    # Onset is the first wet day of the wet spell ending at onset
+    spell_start = onset - (wet_spell_length - 1)
+    spell_days = np.clip(
+        spell_start + np.arange(wet_spell_length).reshape((-1,) + (1,) * onset.ndim),
+        0,
+        n - 1,
+    )
+    onset = spell_start + (
+        np.take_along_axis(rain, spell_days, axis=0) > wet_thresh
+    ).argmax(axis=0)
+    time_values = daily_rain[time_dim].values
+    onset_delta = np.where(
+        found,
+        time_values[np.clip(onset, 0, n - 1)] - time_values[0],
+        np.timedelta64("NaT", "ns"),
+    )
+    first_day = daily_rain.isel({time_dim: 0})
+    return xr.DataArray(
+        onset_delta,
+        dims=daily_rain.transpose(time_dim, ...).dims[1:],
+        coords=first_day.coords,
+        name="onset_delta",
+    ).transpose(*first_day.dims)
+
+
 def cess_date_step(cess_yesterday, dry_spell_length, dry_spell_length_thresh):
     """Updates cessation date delta according to today's soil moisture spell length
 
@@ -371,6 +637,7 @@ def cess_date_from_sm(
     dry_thresh, 
     dry_spell_length_thresh,
     time_dim="T",
+    engine="numpy",
 ):
     """Calculate cessation date from daily soil moisture.
 
@@ -388,6 +655,10 @@ def cess_date_from_sm(
         A dry spell is at least `dry_spell_length_thresh` dry days.
     time_dim : str, optional
         Time coordinate in `daily_sm` (default `time_dim` ="T").   
+    engine : str, optional
+        "numpy" scans arrays and stops as soon as all cessation dates are found,
+        "xarray" applies cess_date_step day after day on DataArrays
+        (default `engine` ="numpy").
 
     Returns
     -------
@@ -398,6 +669,21 @@ def cess_date_from_sm(
     --------
     cess_date_step, cess_date_from_rain
     """
+    _check_engine(engine)
+    if engine == "numpy":
+        sm_values = daily_sm.transpose(time_dim, ...).values
+
+        def sm_func_np(_, i):
+            return sm_values[i]
+
+        return _cess_date_scan(
+            dry_thresh,
+            dry_spell_length_thresh,
+            sm_func_np,
+            daily_sm.isel({time_dim: 0}, drop=True),
+            daily_sm[time_dim],
+        )
+
     def sm_func(_, t):
         return daily_sm.sel({time_dim: t})
 
@@ -412,6 +698,7 @@ def cess_date_from_rain(
     taw,
     sminit,
     time_dim="T",
+    engine="numpy",
 ):
     """Calculate cessation date from daily rainfall.
 
@@ -438,6 +725,11 @@ def cess_date_from_rain(
         Soil moisture initialization. If DataArray, must not have `time_dim` dim.
     time_dim : str, optional
         Time coordinate in `daily_rain` (default `time_dim` ="T").   
+    engine : str, optional
+        "numpy" computes soil moisture, dry spells length and cessation
+        in a single scan of arrays that stops as soon as all cessation dates are found,
+        "xarray" applies water_balance_step and cess_date_step day after day on DataArrays
+        (default `engine` ="numpy").
 
     Returns
     -------
@@ -463,6 +755,27 @@ def cess_date_from_rain(
     et = xr.DataArray(et)
     taw = xr.DataArray(taw)
 
+    _check_engine(engine)
+    if engine == "numpy":
+        sm_first = water_balance_step(
+            sminit, daily_rain.isel({time_dim: 0}, drop=True), et, taw
+        )
+        like = sm_first.broadcast_like(daily_rain[time_dim]).transpose(time_dim, ...)
+        rain_values, et_values, taw_values = (
+            _values_like(x, like) for x in (daily_rain, et, taw)
+        )
+
+        def sm_func_np(sm, i):
+            return np.clip(sm + rain_values[i] - et_values[i], 0, taw_values[i])
+
+        return _cess_date_scan(
+            dry_thresh,
+            dry_spell_length_thresh,
+            sm_func_np,
+            sm_first,
+            daily_rain[time_dim],
+        )
+
     def sm_func(sm, t):
         if sm is None:
             sm = sminit
@@ -495,6 +808,49 @@ def _cess_date(dry_thresh, dry_spell_length_thresh, sm_func, time_coord):
     return cess_delta
 
 
+def _cess_date_scan(dry_thresh, dry_spell_length_thresh, sm_func, sm_first, time_coord):
+    """Array version of _cess_date.
+
+    `sm_func` (sm_yesterday, i) returns the soil moisture ndarray of the i-th day
+    of `time_coord` and `sm_first` is the soil moisture DataArray of the first day.
+    Soil moisture, dry spell length and cessation day are updated in place
+    day after day, until all cessation dates are found.
+    """
+    sm = sm_first.values
+    spell_length = np.zeros(sm.shape, dtype=int)
+    cess_index = np.zeros(sm.shape, dtype=int)
+    not_found = np.ones(sm.shape, dtype=bool)
+    for i in range(time_coord.size):
+        if i > 0:
+            sm = sm_func(sm, i)
+        dry_day = sm < dry_thresh
+        spell_length = (spell_length + 1) * dry_day
+        found_today = not_found & (spell_length >= dry_spell_length_thresh)
+        # Cessation is the first day of the dry spell
+        cess_index[found_today] = i + 1 - spell_length[found_today]
+        not_found &= ~found_today
+        if not not_found.any():
+            break
+    # Same reference as _cess_date's delta: the last time point
+    cess_delta = np.where(
+        not_found,
+        np.timedelta64("NaT", "D"),
+        (cess_index - (time_coord.size - 1)).astype("timedelta64[D]"),
+    )
+    cess_delta = xr.DataArray(
+        cess_delta,
+        dims=sm_first.dims,
+        coords={k: v for k, v in sm_first.coords.items() if k != time_coord.name},
+    )
+    # Delta reference (and coordinate) back to first time point of daily_data
+    cess_delta = (
+        time_coord[-1]
+        + cess_delta
+        - time_coord[0].expand_dims(dim=time_coord.name)
+    )
+    return cess_delta
+
+
 # Time functions
 def strftimeb2int(strftimeb):
     """Convert month values to integers (1-12) from strings.
@@ -532,6 +888,85 @@ def strftimeb2int(strftimeb):
     return strftimebint
 
 
+class CalendarIndex:
+    """Calendar components of the days of a time coordinate,
+    to look days up by day and month.
+
+    Parameters
+    ----------
+    dates : DatetimeIndex
+        Days of the time coordinate.
+
+    Attributes
+    ----------
+    year, month, day, dayofyear : ndarray[int]
+        Calendar components of each day.
+    """
+
+    def __init__(self, dates):
+        self.values = dates.values
+        self.year = dates.year.values
+        self.month = dates.month.values
+        self.day = dates.day.values
+        self.dayofyear = dates.dayofyear.values
+        # Days sorted by day-month code, by offset
+        self._lookups = {}
+
+    def _lookup(self, offset):
+        if offset not in self._lookups:
+            if offset == 0:
+                month, day = self.month, self.day
+            else:
+                shifted = pd.DatetimeIndex(self.values - np.timedelta64(offset, "D"))
+                month, day = shifted.month.values, shifted.day.values
+            codes = month * 32 + day
+            order = np.argsort(codes, kind="stable")
+            self._lookups[offset] = order, codes[order]
+        return self._lookups[offset]
+
+    def positions(self, day, month, offset=0):
+        """Positions, in time order, of all `day`/`month` + `offset` day(s)."""
+        order, codes = self._lookup(offset)
+        code = month * 32 + day
+        return order[
+            np.searchsorted(codes, code):np.searchsorted(codes, code, side="right")
+        ]
+
+
+# CalendarIndex by id of time index, while the index exists
+_CALENDAR_INDEXES = {}
+
+
+def calendar_index(daily_dim):
+    """CalendarIndex of time coordinate `daily_dim` .
+
+    It is computed once per time index, that is shared by all the DataArrays
+    read from, or selected along other dimensions of, the same data.
+
+    Parameters
+    ----------
+    daily_dim : DataArray[datetime64[ns]]
+        A daily time dimension.
+
+    Returns
+    -------
+    CalendarIndex
+    """
+    try:
+        dates = daily_dim.xindexes[daily_dim.name].index
+    except KeyError:
+        return CalendarIndex(pd.DatetimeIndex(daily_dim.values))
+    key = id(dates)
+    entry = _CALENDAR_INDEXES.get(key)
+    if entry is None or entry[0]() is not dates:
+        entry = (
+            weakref.ref(dates, lambda _: _CALENDAR_INDEXES.pop(key, None)),
+            CalendarIndex(dates),
+        )
+        _CALENDAR_INDEXES[key] = entry
+    return entry[1]
+
+
 def sel_day_and_month(daily_dim, day, month, offset=0):
     """Return a subset of `daily_dim` daily time dimension of corresponding
     `day`/`month` + `offset` day(s) for all years.
@@ -583,11 +1018,89 @@ def sel_day_and_month(daily_dim, day, month, offset=0):
     Coordinates:
         * T        (T) datetime64[ns] 2000-02-29 2001-02-28
     """
-    return daily_dim.where(
-        lambda x: ((x - np.timedelta64(offset, "D")).dt.day == day)
-            & ((x - np.timedelta64(offset, "D")).dt.month == month),
-        drop=True
+    return daily_dim.isel({
+        daily_dim.dims[0]: calendar_index(daily_dim).positions(day, month, offset)
+    })
+
+
+def season_index(daily_dim, start_day, start_month, end_day, end_month):
+    """Positions in `daily_dim` of the seasons defined by day-month edges.
+
+    Seasons are the complete ones in `daily_dim` , from a start edge to the
+    following end edge included, with the same conventions as
+    daily_tobegroupedby_season for 29-Feb edges.
+    Seasons are assumed to be shorter than a year.
+
+    Parameters
+    ----------
+    daily_dim : DataArray[datetime64[ns]]
+        A daily time dimension.
+    start_day : int
+        Day of the start date of the season.
+    start_month : int
+        Month of the start date of the season.
+    end_day : int
+        Day of the end date of the season.
+    end_month : int
+        Month of the end date of the season.
+
+    Returns
+    -------
+    starts, stops : ndarray[int]
+        Positions in `daily_dim` of the first day of each season
+        and of the day after its last day.
+    start_edges : DataArray[datetime64[ns]]
+        First day of each season.
+    end_edges : DataArray[datetime64[ns]]
+        Last day of each season, with `start_edges` as coordinate.
+    See Also
+    --------
+    daily_tobegroupedby_season
+    Notes
+    -----
+    Positions are found by binary search of the edges in `daily_dim` ,
+    so that days never need to be compared with all edges.
+    """
+    time_dim = daily_dim.name
+    # Deal with leap year cases
+    if start_day == 29 and start_month == 2:
+        start_day = 1
+        start_month = 3
+    # Find seasons edges
+    start_edges = sel_day_and_month(daily_dim, start_day, start_month)
+    if end_day == 29 and end_month == 2:
+        end_edges = sel_day_and_month(daily_dim, 1 , 3, offset=-1)
+    else:
+        end_edges = sel_day_and_month(daily_dim, end_day, end_month)
+    # Drop edges outside very first and very last edges
+    #  -- this ensures we get complete seasons
+    start_edges = start_edges.sel(**{time_dim: slice(start_edges[0], end_edges[-1])})
+    end_edges = end_edges.sel(
+        **{time_dim: slice(start_edges[0], end_edges[-1])}
+    ).assign_coords(**{time_dim: start_edges[time_dim]})
+    starts = np.searchsorted(daily_dim.values, start_edges.values)
+    stops = np.searchsorted(daily_dim.values, end_edges.values, side="right")
+    return starts, stops, start_edges, end_edges
+
+
+def _season_days(starts, stops):
+    """Positions of all the days of seasons from `starts` to `stops` ,
+    and the season of each of them."""
+    lengths = stops - starts
+    seasons = np.repeat(np.arange(starts.size), lengths)
+    days = np.arange(lengths.sum()) + np.repeat(
+        starts - np.cumsum(lengths) + lengths, lengths
     )
+    return days, seasons
+
+
+def _season_map(func, daily_data, starts, stops, time_dim="T", **kwargs):
+    """Applies `func` to the `daily_data` of each season, as a groupby by
+    season would, but slicing the seasons from their positions."""
+    return [
+        func(daily_data.isel({time_dim: slice(start, stop)}), time_dim=time_dim, **kwargs)
+        for start, stop in zip(starts, stops)
+    ]
 
 
 def daily_tobegroupedby_season(
@@ -635,39 +1148,19 @@ def daily_tobegroupedby_season(
     Examples
     --------
     """
-    # Deal with leap year cases
-    if start_day == 29 and start_month == 2:
-        start_day = 1
-        start_month = 3
-    # Find seasons edges
-    start_edges = sel_day_and_month(daily_data[time_dim], start_day, start_month)
-    if end_day == 29 and end_month == 2:
-        end_edges = sel_day_and_month(daily_data[time_dim], 1 , 3, offset=-1)
-    else:
-        end_edges = sel_day_and_month(daily_data[time_dim], end_day, end_month)
-    # Drop dates outside very first and very last edges
-    #  -- this ensures we get complete seasons with regards to edges, later on
-    daily_data = daily_data.sel(**{time_dim: slice(start_edges[0], end_edges[-1])})
-    start_edges = start_edges.sel(**{time_dim: slice(start_edges[0], end_edges[-1])})
-    end_edges = end_edges.sel(
-        **{time_dim: slice(start_edges[0], end_edges[-1])}
-    ).assign_coords(**{time_dim: start_edges[time_dim]})
-    # Drops daily data not in seasons of interest
-    days_in_season = (
-        daily_data[time_dim] >= start_edges.rename({time_dim: "group"})
-    ) & (daily_data[time_dim] <= end_edges.rename({time_dim: "group"}))
-    days_in_season = days_in_season.sum(dim="group")
-    daily_data = daily_data.where(days_in_season == 1, drop=True)
+    starts, stops, start_edges, end_edges = season_index(
+        daily_data[time_dim], start_day, start_month, end_day, end_month
+    )
+    # Keeps daily data of seasons of interest
+    days, seasons = _season_days(starts, stops)
+    daily_data = daily_data.isel(**{time_dim: days})
     # Creates seasons_starts that will be used for grouping
     # and seasons_ends that is one of the outputs
-    seasons_groups = (daily_data[time_dim].dt.day == start_day) & (
-        daily_data[time_dim].dt.month == start_month
-    )
-    seasons_groups = seasons_groups.cumsum() - 1
-    seasons_starts = (
-        start_edges.rename({time_dim: "toto"})[seasons_groups]
-        .drop_vars("toto")
-        .rename("seasons_starts")
+    seasons_starts = xr.DataArray(
+        start_edges.values[seasons],
+        dims=[time_dim],
+        coords={time_dim: daily_data[time_dim]},
+        name="seasons_starts",
     )
     seasons_ends = end_edges.rename({time_dim: "group"}).rename("seasons_ends")
     # Dataset output
@@ -689,11 +1182,12 @@ def seasonal_onset_date(
     dry_spell_length,
     dry_spell_search,
     time_dim="T",
+    engine="numpy",
 ):
     """ Compute yearly seasonal onset dates from daily rainfall.
 
-    Compute yearly dates by utilizing groupby function to group data by season 
-    and onset_date function to calculate onset date for each year of grouped data.
+    Compute yearly dates by slicing data by season with season_index
+    and onset_date function to calculate onset date for each year of sliced data.
 
     Parameters
     ----------
@@ -723,6 +1217,8 @@ def seasonal_onset_date(
         is found that would invalidate the wet spell as onset date. 
     time_dim : str, optional
         Time coordinate in `soil_moisture` (default `time_dim`="T").
+    engine : str, optional
+        Engine of onset_date (default `engine` ="numpy").
     Returns
     -------
     seasonal_onset_date : Dataset
@@ -762,29 +1258,33 @@ def seasonal_onset_date(
 
     end_month = first_end_date.dt.month.values
 
-    # Apply daily grouping by season
-    seasonally_labeled_daily_data = daily_tobegroupedby_season(
-        daily_rain, search_start_day, search_start_month, end_day, end_month
+    # Find the seasons
+    starts, stops, start_edges, end_edges = season_index(
+        daily_rain[time_dim], search_start_day, search_start_month, end_day, end_month
     )
     # Apply onset_date
-    seasonal_data = (
-        seasonally_labeled_daily_data[daily_rain.name]
-        .groupby(seasonally_labeled_daily_data["seasons_starts"])
-        .map(
-            onset_date,
-            wet_thresh=wet_thresh,
-            wet_spell_length=wet_spell_length,
-            wet_spell_thresh=wet_spell_thresh,
-            min_wet_days=min_wet_days,
-            dry_spell_length=dry_spell_length,
-            dry_spell_search=dry_spell_search,
-        )
-        # This was not needed when applying sum
-        .drop_vars(time_dim)
-        .rename({"seasons_starts": time_dim})
-    )
+    seasonal_data = xr.concat(
+        [
+            onset.drop_vars(time_dim)
+            for onset in _season_map(
+                onset_date,
+                daily_rain,
+                starts,
+                stops,
+                time_dim=time_dim,
+                wet_thresh=wet_thresh,
+                wet_spell_length=wet_spell_length,
+                wet_spell_thresh=wet_spell_thresh,
+                min_wet_days=min_wet_days,
+                dry_spell_length=dry_spell_length,
+                dry_spell_search=dry_spell_search,
+                engine=engine,
+            )
+        ],
+        pd.Index(start_edges.values, name=time_dim),
+    ).transpose(*daily_rain.dims)
     # Get the seasons ends
-    seasons_ends = seasonally_labeled_daily_data["seasons_ends"].rename({"group": time_dim})
+    seasons_ends = end_edges.rename("seasons_ends")
     seasonal_onset_date = xr.merge([seasonal_data, seasons_ends])
 
     # Tip to get dates from timedelta search_start_day
@@ -803,8 +1303,8 @@ def seasonal_cess_date_from_sm(
 ):
     """Use daily moisture data to compute yearly seasonal cessation dates.
 
-    Compute yearly cessation dates by utilizing groupby function to group 
-    data by season and cessation_date function to calculate cessation date for each year of data.
+    Compute yearly cessation dates by slicing data by season with season_index
+    and cessation_date function to calculate cessation date for each year of data.
 
     Parameters
     ----------
@@ -851,22 +1351,25 @@ def seasonal_cess_date_from_sm(
 
     end_month = first_end_date.dt.month.values
 
-    # Apply daily grouping by season
-    seasonally_labeled_daily_data = daily_tobegroupedby_season(
-        soil_moisture, search_start_day, search_start_month, end_day, end_month
+    # Find the seasons
+    starts, stops, start_edges, end_edges = season_index(
+        soil_moisture[time_dim], search_start_day, search_start_month, end_day, end_month
     )
     # Apply cess_date
-    seasonal_data = (
-        seasonally_labeled_daily_data[soil_moisture.name]
-        .groupby(seasonally_labeled_daily_data["seasons_starts"])
-        .map(
+    seasonal_data = xr.concat(
+        _season_map(
             cess_date_from_sm,
+            soil_moisture,
+            starts,
+            stops,
+            time_dim=time_dim,
             dry_thresh=dry_thresh,
             dry_spell_length_thresh=dry_spell_length_thresh,
-        )
-    ).rename("cess_delta")
+        ),
+        time_dim,
+    ).transpose(*soil_moisture.dims).rename("cess_delta")
     # Get the seasons ends
-    seasons_ends = seasonally_labeled_daily_data["seasons_ends"].rename({"group": time_dim})
+    seasons_ends = end_edges.rename("seasons_ends")
     seasonal_cess_date = xr.merge([seasonal_data, seasons_ends])
 
     # Tip to get dates from timedelta search_start_day
@@ -904,25 +1407,28 @@ def seasonal_cess_date_from_rain(
 
     end_month = first_end_date.dt.month.values
 
-    # Apply daily grouping by season
-    seasonally_labeled_daily_data = daily_tobegroupedby_season(
-        daily_rain, search_start_day, search_start_month, end_day, end_month
+    # Find the seasons
+    starts, stops, start_edges, end_edges = season_index(
+        daily_rain[time_dim], search_start_day, search_start_month, end_day, end_month
     )
     # Apply cess_date
-    seasonal_data = (
-        seasonally_labeled_daily_data[daily_rain.name]
-        .groupby(seasonally_labeled_daily_data["seasons_starts"])
-        .map(
+    seasonal_data = xr.concat(
+        _season_map(
             cess_date_from_rain,
+            daily_rain,
+            starts,
+            stops,
+            time_dim=time_dim,
             dry_thresh=dry_thresh,
             dry_spell_length_thresh=dry_spell_length_thresh,
             et=et,
             taw=taw,
             sminit=sminit,
-        )
-    ).rename("cess_delta")
+        ),
+        time_dim,
+    ).transpose(*daily_rain.dims).rename("cess_delta")
     # Get the seasons ends
-    seasons_ends = seasonally_labeled_daily_data["seasons_ends"].rename({"group": time_dim})
+    seasons_ends = end_edges.rename("seasons_ends")
     seasonal_cess_date = xr.merge([seasonal_data, seasons_ends])
 
     # Tip to get dates from timedelta search_start_day
@@ -942,8 +1448,11 @@ def seasonal_sum(
 ):
     """Calculate seasonal totals of daily data in season defined by day-month edges.
        
-    Compute totals  by utilizing groupby function to group data by season
-    and then sum the data over the time dimension.
+    Compute totals by summing the data over the time dimension
+    between the season edges found by season_index. The totals equal
+    those of grouping the data by season up to floating-point rounding,
+    since they are summed in a different order. Dask-backed data is
+    grouped by season instead, so that the totals stay lazy.
      
     Parameters
     ----------
@@ -973,16 +1482,47 @@ def seasonal_sum(
     Examples
     --------
     """
-    seasonally_labeled_daily_data = daily_tobegroupedby_season(
-        daily_data, start_day, start_month, end_day, end_month
-    )
-    seasonal_data = (
-        seasonally_labeled_daily_data[daily_data.name]
-        .groupby(seasonally_labeled_daily_data["seasons_starts"])
-        .sum(dim=time_dim, skipna=True, min_count=min_count)
-        #        .rename({"seasons_starts": time_dim})
+    if daily_data.chunks is not None:
+        seasonally_labeled_daily_data = daily_tobegroupedby_season(
+            daily_data, start_day, start_month, end_day, end_month
+        )
+        seasonal_data = (
+            seasonally_labeled_daily_data[daily_data.name]
+            .groupby(seasonally_labeled_daily_data["seasons_starts"])
+            .sum(dim=time_dim, skipna=True, min_count=min_count)
+        )
+        seasons_ends = seasonally_labeled_daily_data["seasons_ends"].rename({"group": time_dim})
+        return xr.merge([seasonal_data, seasons_ends])
+    starts, stops, start_edges, end_edges = season_index(
+        daily_data[time_dim], start_day, start_month, end_day, end_month
     )
-    seasons_ends = seasonally_labeled_daily_data["seasons_ends"].rename({"group": time_dim})
+    values = daily_data.transpose(time_dim, ...).values
+    if values.dtype.kind == "f":
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0)
+    else:
+        valid = np.ones(values.shape, dtype=bool)
+    # Sums from each season start to its stop, and from each stop to the
+    # next start, which are dropped
+    segments = np.stack([starts, stops], axis=1).ravel()
+    if segments[-1] == values.shape[0]:
+        segments = segments[:-1]
+    sums = np.add.reduceat(values, segments, axis=0)[::2]
+    if min_count is not None:
+        counts = np.add.reduceat(valid.astype(int), segments, axis=0)[::2]
+        sums = np.where(counts >= min_count, sums, np.nan)
+    seasonal_data = xr.DataArray(
+        sums,
+        dims=("seasons_starts",) + daily_data.transpose(time_dim, ...).dims[1:],
+        coords={
+            **daily_data.isel({time_dim: 0}, drop=True).coords,
+            "seasons_starts": start_edges.values,
+        },
+        name=daily_data.name,
+    ).transpose(*[
+        "seasons_starts" if dim == time_dim else dim for dim in daily_data.dims
+    ])
+    seasons_ends = end_edges.rename("seasons_ends")
     summed_seasons = xr.merge([seasonal_data, seasons_ends])
     return summed_seasons
 
@@ -184,7 +184,15 @@ def controls_layout(lat_min, lat_max, lon_min, lon_max, lat_label, lon_label, ye
                 ]+[
                     html.P([html.H6(val["menu_label"]), html.P(val["description"])])
                     for key, val in CONFIG["map_text"].items()
-                ],
+                ]+([
+                    html.P(
+                        """
+                        When zoomed out, the suitability map is computed from
+                        data averaged over blocks of grid cells, which only
+                        approximates the count of suitable conditions.
+                        """
+                    ),
+                ] if CONFIG["overview_analysis"] else []),
                 style={"position":"relative","height":"25%", "overflow":"scroll"},#box holding text
             ),
             html.H3("Controls Panel",style={"padding":".5rem"}),
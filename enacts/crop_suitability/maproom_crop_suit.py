@@ -24,42 +24,53 @@ import shapely
 from shapely import wkb
 from shapely.geometry.multipolygon import MultiPolygon
 import datetime
+from functools import partial
 import xarray as xr
 
-from globals_ import FLASK, GLOBAL_CONFIG
+from globals_ import FLASK, GLOBAL_CONFIG, TILE_CACHE, TILE_RENDERER
 
 CONFIG = GLOBAL_CONFIG["maprooms"]["crop_suitability"]
 
 PFX = f'{GLOBAL_CONFIG["url_path_prefix"]}/{CONFIG["core_path"]}'
 TILE_PFX = f"{PFX}/tile"
 
-with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-    s = sql.Composed([sql.SQL(GLOBAL_CONFIG["datasets"]['shapes_adm'][0]['sql'])])
-    df = pd.read_sql(s, conn)
-    clip_shape = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))[0]
+s = sql.Composed([sql.SQL(GLOBAL_CONFIG["datasets"]['shapes_adm'][0]['sql'])])
+df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
+clip_shape = df["the_geom"][0]
 
 # Reads daily data
 zarr_path_rr = GLOBAL_CONFIG["datasets"]["daily"]["vars"]["precip"][1]
 if zarr_path_rr is None:
     zarr_path_rr = GLOBAL_CONFIG["datasets"]["daily"]["vars"]["precip"][0]
-rr_mrg = calc.read_zarr_data(Path(
+zarr_path_rr = Path(
     f'{GLOBAL_CONFIG["datasets"]["daily"]["zarr_path"]}{zarr_path_rr}'
-))[GLOBAL_CONFIG["datasets"]["daily"]["vars"]["precip"][2]]
+)
+rr_mrg = calc.read_zarr_data(zarr_path_rr)[GLOBAL_CONFIG["datasets"]["daily"]["vars"]["precip"][2]]
 zarr_path_tmin = GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmin"][1]
 if zarr_path_tmin is None:
     zarr_path_tmin = GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmin"][0]
-tmin_mrg = calc.read_zarr_data(Path(
+zarr_path_tmin = Path(
     f'{GLOBAL_CONFIG["datasets"]["daily"]["zarr_path"]}{zarr_path_tmin}'
-))[GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmin"][2]]
+)
+tmin_mrg = calc.read_zarr_data(zarr_path_tmin)[GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmin"][2]]
 zarr_path_tmax = GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmax"][1]
 if zarr_path_tmax is None:
     zarr_path_tmax = GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmax"][0]
-tmax_mrg = calc.read_zarr_data(Path(
+zarr_path_tmax = Path(
     f'{GLOBAL_CONFIG["datasets"]["daily"]["zarr_path"]}{zarr_path_tmax}'
-))[GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmax"][2]]
+)
+tmax_mrg = calc.read_zarr_data(zarr_path_tmax)[GLOBAL_CONFIG["datasets"]["daily"]["vars"]["tmax"][2]]
 # Assumes that grid spacing is regular and cells are square. When we
 # generalize this, don't make those assumptions.
 RESOLUTION = rr_mrg['X'][1].item() - rr_mrg['X'][0].item()
+
+
+def read_timeseries(zarr_path, var):
+    # Chunked for point queries if enactstozarr wrote such a copy
+    return pingrid.open_timeseries(zarr_path)[
+        GLOBAL_CONFIG["datasets"]["daily"]["vars"][var][2]
+    ]
+
 # The longest possible distance between a point and the center of the
 # grid cell containing that point.
 
@@ -88,24 +99,21 @@ APP.layout = layout_crop_suit.app_layout()
 
 
 def adm_borders(shapes):
-    with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-        s = sql.Composed(
-            [
-                sql.SQL("with g as ("),
-                sql.SQL(shapes),
-                sql.SQL(
-                    """
-                    )
-                    select
-                        g.label, g.key, g.the_geom
-                    from g
-                    """
-                ),
-            ]
-        )
-        df = pd.read_sql(s, conn)
-
-    df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
+    s = sql.Composed(
+        [
+            sql.SQL("with g as ("),
+            sql.SQL(shapes),
+            sql.SQL(
+                """
+                )
+                select
+                    g.label, g.key, g.the_geom
+                from g
+                """
+            ),
+        ]
+    )
+    df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
     df["the_geom"] = df["the_geom"].apply(
         lambda x: x if isinstance(x, MultiPolygon) else MultiPolygon([x])
     )
@@ -355,12 +363,12 @@ def timeseries_plot(
     season_str = select_season(target_season)
     try:
         if data_choice == "precip":
-            data_var = pingrid.sel_snap(rr_mrg, lat1, lng1)
+            data_var = pingrid.sel_snap(read_timeseries(zarr_path_rr, "precip"), lat1, lng1)
             isnan = np.isnan(data_var).sum()
         elif data_choice == "suitability":
-            rr_mrg_sel = pingrid.sel_snap(rr_mrg, lat1, lng1)
-            tmax_mrg_sel = pingrid.sel_snap(tmax_mrg, lat1, lng1)
-            tmin_mrg_sel = pingrid.sel_snap(tmin_mrg, lat1, lng1)
+            rr_mrg_sel = pingrid.sel_snap(read_timeseries(zarr_path_rr, "precip"), lat1, lng1)
+            tmax_mrg_sel = pingrid.sel_snap(read_timeseries(zarr_path_tmax, "tmax"), lat1, lng1)
+            tmin_mrg_sel = pingrid.sel_snap(read_timeseries(zarr_path_tmin, "tmin"), lat1, lng1)
             data_var = crop_suitability(
                 rr_mrg_sel, int(min_wet_days), float(wet_day_def),
                 tmax_mrg_sel, tmin_mrg_sel,
@@ -370,10 +378,10 @@ def timeseries_plot(
             )
             isnan = np.isnan(data_var["crop_suit"]).sum()
         elif data_choice == "tmax":
-            data_var = pingrid.sel_snap(tmax_mrg, lat1, lng1)
+            data_var = pingrid.sel_snap(read_timeseries(zarr_path_tmax, "tmax"), lat1, lng1)
             isnan = np.isnan(data_var).sum()
         elif data_choice == "tmin":
-            data_var = pingrid.sel_snap(tmin_mrg, lat1, lng1)
+            data_var = pingrid.sel_snap(read_timeseries(zarr_path_tmin, "tmin"), lat1, lng1)
             isnan = np.isnan(data_var).sum()
         if isnan > 0:
             error_fig = pingrid.error_fig(error_msg="Data missing at this location")
@@ -454,8 +462,19 @@ def write_map_title(data_choice, target_year, target_season):
     return map_title
 
 @FLASK.route(f"{TILE_PFX}/<int:tz>/<int:tx>/<int:ty>")
+@pingrid.cached_tile(
+    TILE_CACHE,
+    stamp=lambda: pingrid.path_stamp(*[
+        p for zp in (zarr_path_rr, zarr_path_tmin, zarr_path_tmax)
+        for p in (zp, pingrid.overview_path(zp))
+    ]),
+)
 def cropSuit_layers(tz, tx, ty):
-    parse_arg = pingrid.parse_arg
+    return pingrid.render_tile(TILE_RENDERER, render_cropSuit_layers, tz, tx, ty)
+
+
+def render_cropSuit_layers(qstring, tz, tx, ty):
+    parse_arg = partial(pingrid.parse_arg, qstring=qstring)
     data_choice = parse_arg("data_choice")
     target_season = parse_arg("target_season")
     target_year = parse_arg("target_year", float)  
@@ -484,25 +503,45 @@ def cropSuit_layers(tz, tx, ty):
             y_min > rr_mrg['Y'].max() or
             y_max < rr_mrg['Y'].min()
     ):
-        return pingrid.image_resp(pingrid.empty_tile())
+        return pingrid.png_bytes(pingrid.empty_tile())
+
+    # Zoomed out tiles are computed from the coarsest overview that
+    # is still finer than the pixels, if all variables have overviews.
+    # That is exact for seasonal totals and means, but only approximates
+    # the suitability, which is done at the data's resolution unless
+    # overview_analysis is set.
+    overviews = [
+        pingrid.open_overviews(zp)
+        for zp in (zarr_path_rr, zarr_path_tmin, zarr_path_tmax)
+    ]
+    nlevels = min(len(levels) for levels in overviews)
+    if data_choice == "suitability" and not CONFIG["overview_analysis"]:
+        nlevels = 1
+    rr_tile, tmin_tile, tmax_tile = (
+        pingrid.select_overview(levels[:nlevels], tz)[
+            GLOBAL_CONFIG["datasets"]["daily"]["vars"][var][2]
+        ]
+        for levels, var in zip(overviews, ["precip", "tmin", "tmax"])
+    )
+    res = rr_tile['X'][1].item() - rr_tile['X'][0].item()
 
-    rr_mrg_year = rr_mrg.sel(T=rr_mrg['T.year']==target_year)
-    tmin_mrg_year = tmin_mrg.sel(T=tmin_mrg['T.year']==target_year)
-    tmax_mrg_year = tmax_mrg.sel(T=tmax_mrg['T.year']==target_year)
+    rr_mrg_year = rr_tile.sel(T=rr_tile['T.year']==target_year)
+    tmin_mrg_year = tmin_tile.sel(T=tmin_tile['T.year']==target_year)
+    tmax_mrg_year = tmax_tile.sel(T=tmax_tile['T.year']==target_year)
 
     rr_mrg_year_tile = rr_mrg_year.sel(
-        X=slice(x_min - x_min % RESOLUTION, x_max + RESOLUTION - x_max % RESOLUTION),
-        Y=slice(y_min - y_min % RESOLUTION, y_max + RESOLUTION - y_max % RESOLUTION),
+        X=slice(x_min - x_min % res, x_max + res - x_max % res),
+        Y=slice(y_min - y_min % res, y_max + res - y_max % res),
     )
 
     tmin_mrg_year_tile = tmin_mrg_year.sel(
-        X=slice(x_min - x_min % RESOLUTION, x_max + RESOLUTION - x_max % RESOLUTION),
-        Y=slice(y_min - y_min % RESOLUTION, y_max + RESOLUTION - y_max % RESOLUTION),
+        X=slice(x_min - x_min % res, x_max + res - x_max % res),
+        Y=slice(y_min - y_min % res, y_max + res - y_max % res),
     )
 
     tmax_mrg_year_tile = tmax_mrg_year.sel(
-        X=slice(x_min - x_min % RESOLUTION, x_max + RESOLUTION - x_max % RESOLUTION),
-        Y=slice(y_min - y_min % RESOLUTION, y_max + RESOLUTION - y_max % RESOLUTION),
+        X=slice(x_min - x_min % res, x_max + res - x_max % res),
+        Y=slice(y_min - y_min % res, y_max + res - y_max % res),
     )
 
     rr_mrg_season = rr_mrg_year_tile.sel(T=rr_mrg_year_tile["T.season"] == target_season)
@@ -545,7 +584,9 @@ def cropSuit_layers(tz, tx, ty):
     map = map.rename(X="lon", Y="lat")
     map.attrs["scale_min"] = map_min
     map.attrs["scale_max"] = map_max
-    result = pingrid.tile(map.astype('float64'), tx, ty, tz, clip_shape)
+    result = pingrid.tile_png(
+        map.astype('float64'), tx, ty, tz, clip_shape, resampling="block-mean"
+    )
 
     return result
 
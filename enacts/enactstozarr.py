@@ -1,7 +1,11 @@
+import json
 import os
+import shutil
 import sys
 import numpy as np
+import pandas as pd
 import xarray as xr
+import zarr
 import datetime as dt
 from pathlib import Path
 import pingrid
@@ -9,27 +13,6 @@ from functools import partial
 import calc
 
 
-CONFIG = pingrid.load_config(os.environ["CONFIG"])
-VARIABLE = sys.argv[1] #e.g. precip, tmax, tmin -- check your config 
-TIME_RES = sys.argv[2] #e.g. daily, or dekadal -- check in your config
-INPUT_PATH = (
-    f'{CONFIG["datasets"][TIME_RES]["nc_path"]}'
-    f'{CONFIG["datasets"][TIME_RES]["vars"][VARIABLE][0]}'
-)
-OUTPUT_PATH = (
-    (
-        f'{CONFIG["datasets"][TIME_RES]["zarr_path"]}'
-        f'{CONFIG["datasets"][TIME_RES]["vars"][VARIABLE][0]}'
-    ) if CONFIG['datasets'][TIME_RES]['vars'][VARIABLE][1] is None
-    else (
-        f'{CONFIG["datasets"][TIME_RES]["zarr_path"]}'
-        f'{CONFIG["datasets"][TIME_RES]["vars"][VARIABLE][1]}'
-    )
-)
-CHUNKS = CONFIG['datasets'][TIME_RES]['chunks']
-ZARR_RESOLUTION = CONFIG['datasets'][TIME_RES]["zarr_resolution"]
-
-
 def set_up_dims(xda, time_res="daily"):
     """Sets up spatial and temporal dimensions from a set of time-dependent netcdf
     ENACTS files.
@@ -130,7 +113,14 @@ def regridding(data, resolution):
     return data
 
 
-def nc2xr(paths, var_name, time_res="daily", zarr_resolution=None, chunks={}):
+def nc2xr(
+    paths,
+    var_name,
+    time_res="daily",
+    zarr_resolution=None,
+    chunks={},
+    parallel=False,
+):
     """Open mutiple daily or dekadal ENACTS files as a single dataset.
 
     Optionally spatially regrids and
@@ -151,6 +141,8 @@ def nc2xr(paths, var_name, time_res="daily", zarr_resolution=None, chunks={}):
         spatial resolution to regrid to.
     chunks : int, tuple of int, "auto" or mapping of hashable to int, optional
         Chunk sizes along each dimension X, Y and T.
+    parallel : bool, optional
+        If True, the files are opened in parallel with dask.
     
     Returns
     -------
@@ -163,7 +155,7 @@ def nc2xr(paths, var_name, time_res="daily", zarr_resolution=None, chunks={}):
     data = xr.open_mfdataset(
         paths,
         preprocess=partial(set_up_dims, time_res=time_res),
-        parallel=False,
+        parallel=parallel,
     )[var_name]
     if zarr_resolution != None:
         print("attempting regrid")
@@ -241,12 +233,507 @@ def convert(
     print(f"conversion for {var_name} complete.")
     return output_path
 
-convert(
-    INPUT_PATH,
-    OUTPUT_PATH,
-    VARIABLE,
-    time_res=TIME_RES,
-    zarr_resolution=ZARR_RESOLUTION,
-    chunks=CHUNKS,
-)
 
+def time_axis(start, end, time_res="daily"):
+    """All the dates of `time_res` from `start` to `end` included.
+
+    Parameters
+    ----------
+    start, end : numpy.datetime64
+        first and last dates
+    time_res : str, optional
+        "daily" (default) or "dekadal", in which case dates are first days
+        of dekads
+
+    Returns
+    -------
+    numpy.ndarray of numpy.datetime64[ns]
+    """
+    if time_res == "daily":
+        return pd.date_range(start, end, freq="D").values
+    elif time_res == "dekadal":
+        months = pd.date_range(
+            pd.Timestamp(start).to_period("M").to_timestamp(), end, freq="MS"
+        )
+        dekads = np.sort(np.concatenate([
+            (months + pd.Timedelta(days=d)).values for d in [0, 10, 20]
+        ]))
+        return dekads[(dekads >= start) & (dekads <= end)]
+    else:
+        raise Exception(
+            "time resolution must be 'daily' or 'dekadal' "
+        )
+
+
+# Number of changes of a store recorded in its manifest
+KEPT_CHANGES = 100
+
+
+def manifest_path(output_path):
+    """Path of the record of the files ingested in the zarr store."""
+    return f"{os.fspath(output_path).rstrip(os.sep)}.manifest.json"
+
+
+def read_manifest(output_path):
+    path = manifest_path(output_path)
+    if not Path(path).exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(output_path, manifest):
+    path = manifest_path(output_path)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def file_signature(file):
+    st = file.stat()
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def log_change(output_path, manifest, start):
+    """Records in the manifest that the store changed from position `start`
+    of T on, and writes it. The latest changes are kept, along with the
+    stamp of the store after each of them, so that the copies of the store
+    can be updated from where it changed since they were written. See
+    `changed_since` .
+    """
+    manifest["changes"] = manifest.get("changes", [])[-KEPT_CHANGES + 1:] + [
+        {"stamp": pingrid.path_stamp(output_path), "start": int(start)}
+    ]
+    write_manifest(output_path, manifest)
+
+
+def changed_since(output_path, stamp):
+    """Position of T from which the store changed since it had `stamp` , or
+    None if that is not known from its manifest, e.g. if it was rewritten
+    by `convert` , in which case its copies need to be rebuilt."""
+    changes = (read_manifest(output_path) or {}).get("changes", [])
+    stamps = [c["stamp"] for c in changes]
+    if stamp not in stamps or stamps[-1] != pingrid.path_stamp(output_path):
+        return None
+    return min(c["start"] for c in changes[stamps.index(stamp) + 1:])
+
+
+def chunks_from(start, size, t_chunk):
+    """Chunk sizes along T of `size` steps written from position `start` of
+    a zarr array chunked by `t_chunk` , such that each zarr chunk is written
+    by a single dask chunk."""
+    first = min(-start % t_chunk or t_chunk, size)
+    t_chunks = (first,) + (t_chunk,) * ((size - first) // t_chunk)
+    if sum(t_chunks) < size:
+        t_chunks += (size - sum(t_chunks),)
+    return t_chunks
+
+
+def write_from(data, path, start, group=None, attrs={}):
+    """Writes `data` from position `start` of T on in place into the zarr
+    store at `path` , whose T dimension ends up that of `data` , then
+    updates the group's `attrs` and the consolidated metadata.
+
+    Steps that the store already has are overwritten, the others appended.
+    """
+    root = zarr.open_group(os.fspath(path), mode="r+", path=group or "")
+    length = data["T"].size
+    chunks = {}
+    for name, array in root.arrays():
+        dims = array.attrs.get("_ARRAY_DIMENSIONS", [])
+        if "T" in dims:
+            old_length = array.shape[dims.index("T")]
+            if old_length > length:
+                shape = list(array.shape)
+                shape[dims.index("T")] = length
+                array.resize(*shape)
+        if len(dims) > 1:
+            chunks = dict(zip(dims, array.chunks))
+    zarr.consolidate_metadata(root.store)
+    t_chunk = chunks.get("T", 1)
+    data = data.drop_vars(
+        [name for name, var in data.variables.items() if "T" not in var.dims]
+    )
+    for var in data.variables.values():
+        var.encoding.pop("chunks", None)
+        var.encoding.pop("preferred_chunks", None)
+    end = min(old_length, length)
+    if start < end:
+        chunks["T"] = chunks_from(start, end - start, t_chunk)
+        data.isel(T=slice(start, end)).chunk(chunks).to_zarr(
+            os.fspath(path), group=group, region={"T": slice(start, end)},
+            safe_chunks=False,
+        )
+    if length > old_length:
+        chunks["T"] = chunks_from(old_length, length - old_length, t_chunk)
+        data.isel(T=slice(old_length, None)).chunk(chunks).to_zarr(
+            os.fspath(path), group=group, append_dim="T", safe_chunks=False,
+        )
+    root.attrs.update(attrs)
+    zarr.consolidate_metadata(root.store)
+
+
+def report_off_axis(names):
+    """Files are left out of the manifest when their date is not on the T
+    axis of the store (e.g. before its first date), so that they are
+    reported, and tried again, on every run."""
+    if names:
+        print(f"dates of {sorted(names)} are not on the store's T axis, "
+              "skipping them")
+
+
+def rollback(output_path, length):
+    """Truncates the T dimension of the zarr store to `length` , undoing an
+    append that didn't complete."""
+    group = zarr.open_group(os.fspath(output_path), mode="r+")
+    for name, array in group.arrays():
+        dims = array.attrs.get("_ARRAY_DIMENSIONS", [])
+        if "T" in dims and array.shape[dims.index("T")] > length:
+            shape = list(array.shape)
+            shape[dims.index("T")] = length
+            array.resize(*shape)
+    zarr.consolidate_metadata(os.fspath(output_path))
+
+
+def ingest(
+    input_path,
+    output_path,
+    var_name,
+    time_res="daily",
+    zarr_resolution=None,
+    chunks={},
+):
+    """Incrementally updates a zarr store from a set of ENACTS files.
+
+    Only the files whose date isn't in the store yet, or that changed since
+    they were ingested, are read, in parallel. The T dimension of the store
+    is kept complete: dates without a file are missing values, which are
+    filled in place if their file shows up later. Files are tracked in a
+    manifest next to the store, which also makes an append that was
+    interrupted be rolled back on the next run, so that running `ingest`
+    again is always safe.
+
+    Parameters
+    ----------
+    input_path : str
+        path where the ENACTS nc files are
+    output_path : str
+        path of the zarr store, created if it doesn't exist
+    var_name : str
+        name of the ENACTS variable in the nc files
+    time_res : str, optional
+        indicates the time resolution of the set of files.
+        Default is "daily" and other option is "dekadal"
+    zarr_resolution : real, optional
+        spatial resolution to regrid to.
+    chunks : int, tuple of int, "auto" or mapping of hashable to int, optional
+        Chunk sizes along each dimension X, Y and T.
+
+    Returns
+    -------
+    output_path : where the zarr store has been written
+
+    See Also
+    --------
+    convert, filename2datetime64, time_axis
+    """
+    print(f"ingesting files for: {time_res} {var_name}")
+    netcdf = {
+        f.name: f for f in sorted(Path(input_path).glob("*.nc"))
+    }
+    dates = {
+        name: filename2datetime64(f, time_res=time_res)
+        for name, f in netcdf.items()
+    }
+    manifest = read_manifest(output_path)
+
+    if not Path(output_path).is_dir():
+        data = nc2xr(
+            list(netcdf.values()), var_name, time_res=time_res,
+            zarr_resolution=zarr_resolution, parallel=True,
+        )
+        axis = time_axis(data["T"][0].values, data["T"][-1].values, time_res)
+        data = data.reindex(T=axis).chunk(chunks=chunks)
+        data.to_zarr(store=output_path)
+        done = [n for n in netcdf if np.datetime64(dates[n], "ns") in axis]
+        report_off_axis(set(netcdf) - set(done))
+        log_change(output_path, {
+            "length": data["T"].size,
+            "pending": None,
+            "files": {n: file_signature(netcdf[n]) for n in done},
+        }, 0)
+        print(f"created store with {len(done)} files.")
+        return output_path
+
+    if manifest is None:
+        # Store from `convert` : assume the files of its dates are ingested
+        store_T = set(calc.read_zarr_data(output_path)["T"].values)
+        manifest = {
+            "length": len(store_T),
+            "pending": None,
+            "files": {
+                name: file_signature(netcdf[name]) for name, d in dates.items()
+                if np.datetime64(d, "ns") in store_T
+            },
+            "changes": [
+                {"stamp": pingrid.path_stamp(output_path), "start": 0}
+            ],
+        }
+    if manifest["pending"] is not None:
+        print(f"rolling back interrupted append to {manifest['length']} steps")
+        rollback(output_path, manifest["length"])
+        manifest["pending"] = None
+        log_change(output_path, manifest, manifest["length"])
+
+    store = calc.read_zarr_data(output_path)
+    store_T = pd.Index(store["T"].values)
+    todo = sorted(
+        (name for name, f in netcdf.items()
+         if manifest["files"].get(name) != file_signature(f)),
+        key=lambda name: dates[name],
+    )
+    fill = [n for n in todo if np.datetime64(dates[n], "ns") <= store_T[-1]]
+    append = [n for n in todo if np.datetime64(dates[n], "ns") > store_T[-1]]
+    off_axis = {
+        n for n in fill if np.datetime64(dates[n], "ns") not in store_T
+    }
+    fill = [n for n in fill if n not in off_axis]
+    if append:
+        axis = time_axis(store_T[-1], dates[append[-1]], time_res)[1:]
+        off_axis |= {
+            n for n in append if np.datetime64(dates[n], "ns") not in axis
+        }
+        append = [n for n in append if n not in off_axis]
+    report_off_axis(off_axis)
+    if not fill and not append:
+        print("Not changing existing zarr")
+        return output_path
+
+    if fill:
+        # Rewrite whole chunks of T, so that concurrent readers never see
+        # a chunk half written.
+        new = nc2xr(
+            [netcdf[n] for n in fill], var_name, time_res=time_res,
+            zarr_resolution=zarr_resolution, parallel=True,
+        ).load()
+        t_chunk = store[var_name].encoding["chunks"][
+            store[var_name].dims.index("T")
+        ]
+        positions = store_T.get_indexer(new["T"].values)
+        for c in np.unique(positions // t_chunk):
+            region = slice(c * t_chunk, min((c + 1) * t_chunk, store_T.size))
+            block = store.isel(T=region).load()
+            in_block = (positions >= region.start) & (positions < region.stop)
+            patch = new.isel(T=np.flatnonzero(in_block))
+            block[var_name].loc[{"T": patch["T"]}] = patch[var_name]
+            block[[var_name]].drop_vars(["X", "Y"]).to_zarr(
+                store=output_path, region={"T": region}
+            )
+        zarr.consolidate_metadata(os.fspath(output_path))
+        manifest["files"].update(
+            {n: file_signature(netcdf[n]) for n in fill}
+        )
+        write_manifest(output_path, manifest)
+        print(f"filled {len(fill)} dates in place")
+
+    if append:
+        new = nc2xr(
+            [netcdf[n] for n in append], var_name, time_res=time_res,
+            zarr_resolution=zarr_resolution, parallel=True,
+        )
+        axis = time_axis(store_T[-1], new["T"][-1].values, time_res)[1:]
+        # The first chunk of new data completes the last chunk of the store,
+        # so that each chunk of the store is written by a single task.
+        t_chunk = store[var_name].encoding["chunks"][
+            store[var_name].dims.index("T")
+        ]
+        new = new.reindex(T=axis).chunk(chunks=chunks).chunk(
+            {"T": chunks_from(store_T.size, axis.size, t_chunk)}
+        )
+        manifest["pending"] = {
+            "length": manifest["length"] + axis.size,
+            "files": {n: file_signature(netcdf[n]) for n in append},
+        }
+        write_manifest(output_path, manifest)
+        new.to_zarr(store=output_path, append_dim="T", safe_chunks=False)
+        manifest["length"] = manifest["pending"]["length"]
+        manifest["files"].update(manifest["pending"]["files"])
+        manifest["pending"] = None
+        write_manifest(output_path, manifest)
+        print(f"appended {len(append)} files, from {axis[0]} to {axis[-1]}")
+    log_change(output_path, manifest, min(
+        [store_T.get_loc(np.datetime64(dates[n], "ns")) for n in fill]
+        + ([store_T.size] if append else [])
+    ))
+    return output_path
+
+
+def write_overviews(output_path, levels, chunks={}):
+    """Writes coarsened overviews of a zarr store, for map tiles at low zoom.
+
+    Level k, in group k of the store at `pingrid.overview_path(output_path)`,
+    is the block average of 2**k by 2**k cells of the store, for k from 1 to
+    `levels` . Each level is computed from the previous one, so that the full
+    resolution data is read only once. If the store has changed since the
+    overviews were written, and its manifest tells from where along T (see
+    `ingest` ), only that part of the overviews is recomputed, in place.
+    Otherwise they are rebuilt, and swapped in place once complete.
+
+    Parameters
+    ----------
+    output_path : str
+        path of the zarr store
+    levels : int
+        number of overview levels
+    chunks : int, tuple of int, "auto" or mapping of hashable to int, optional
+        Chunk sizes along each dimension X, Y and T.
+
+    Returns
+    -------
+    path where the overviews have been written
+
+    See Also
+    --------
+    pingrid.coarsen_overview, pingrid.open_overviews
+    """
+    overview_path = pingrid.overview_path(output_path)
+    data = calc.read_zarr_data(output_path)
+    stamp = pingrid.path_stamp(output_path)
+    start = None
+    if Path(overview_path).is_dir():
+        attrs = xr.open_zarr(overview_path, group="1").attrs
+        if attrs.get("levels") == levels + 1:
+            if attrs.get("stamp") == stamp:
+                print("overviews up to date")
+                return overview_path
+            start = changed_since(output_path, attrs.get("stamp"))
+    if start is not None:
+        print(f"updating {levels} overview levels from {data['T'].size - start}"
+              " steps before the end")
+        previous = data
+        for k in range(1, levels + 1):
+            write_from(
+                pingrid.coarsen_overview(previous, 2), overview_path, start,
+                group=str(k), attrs={"stamp": stamp},
+            )
+            previous = xr.open_zarr(overview_path, group=str(k))
+        return overview_path
+    print(f"writing {levels} overview levels")
+    tmp_path = f"{overview_path}.tmp"
+    old_path = f"{overview_path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    previous = data
+    for k in range(1, levels + 1):
+        level = pingrid.coarsen_overview(previous, 2)
+        level.attrs.update(levels=levels + 1, stamp=stamp)
+        for var in level.data_vars.values():
+            var.encoding.pop("chunks", None)
+        level.chunk(chunks=chunks).to_zarr(tmp_path, group=str(k))
+        previous = xr.open_zarr(tmp_path, group=str(k))
+    if Path(overview_path).exists():
+        os.replace(overview_path, old_path)
+    os.replace(tmp_path, overview_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return overview_path
+
+
+def write_timeseries(output_path, chunks):
+    """Writes a copy of a zarr store chunked for reading time series.
+
+    Each chunk of the copy, at `pingrid.timeseries_path(output_path)`, holds
+    the whole T dimension of a few grid cells, so that the time series at a
+    point is a single read, where the store, chunked for maps, would need one
+    per T chunk. The copy records the stamp of the store, so that maprooms
+    fall back on the store while the copy is out of date. If the store has
+    changed since the copy was written, and its manifest tells from where
+    along T (see `ingest` ), only that part is written again, in place.
+    Otherwise the copy is rebuilt, and swapped in place once complete.
+
+    Parameters
+    ----------
+    output_path : str
+        path of the zarr store
+    chunks : mapping of hashable to int
+        Chunk sizes along X and Y. T is not chunked when the copy is built,
+        and updates add chunks of T of that length.
+
+    Returns
+    -------
+    path where the copy has been written
+
+    See Also
+    --------
+    pingrid.open_timeseries
+    """
+    timeseries_path = pingrid.timeseries_path(output_path)
+    data = calc.read_zarr_data(output_path)
+    stamp = pingrid.path_stamp(output_path)
+    if Path(timeseries_path).is_dir():
+        copy_stamp = xr.open_zarr(timeseries_path).attrs.get("stamp")
+        if copy_stamp == stamp:
+            print("time series copy up to date")
+            return timeseries_path
+        start = changed_since(output_path, copy_stamp)
+        if start is not None:
+            print(f"updating time series copy from {data['T'].size - start}"
+                  " steps before the end")
+            write_from(data, timeseries_path, start, attrs={"stamp": stamp})
+            return timeseries_path
+    print("writing time series copy")
+    tmp_path = f"{timeseries_path}.tmp"
+    old_path = f"{timeseries_path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    data.attrs["stamp"] = stamp
+    for var in data.variables.values():
+        var.encoding.pop("chunks", None)
+        var.encoding.pop("preferred_chunks", None)
+    data.chunk({"T": -1, "X": chunks["X"], "Y": chunks["Y"]}).to_zarr(tmp_path)
+    if Path(timeseries_path).exists():
+        os.replace(timeseries_path, old_path)
+    os.replace(tmp_path, timeseries_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return timeseries_path
+
+
+if __name__ == "__main__":
+    CONFIG = pingrid.load_config(os.environ["CONFIG"])
+    VARIABLE = sys.argv[1] #e.g. precip, tmax, tmin -- check your config 
+    TIME_RES = sys.argv[2] #e.g. daily, or dekadal -- check in your config
+    INPUT_PATH = (
+        f'{CONFIG["datasets"][TIME_RES]["nc_path"]}'
+        f'{CONFIG["datasets"][TIME_RES]["vars"][VARIABLE][0]}'
+    )
+    OUTPUT_PATH = (
+        (
+            f'{CONFIG["datasets"][TIME_RES]["zarr_path"]}'
+            f'{CONFIG["datasets"][TIME_RES]["vars"][VARIABLE][0]}'
+        ) if CONFIG['datasets'][TIME_RES]['vars'][VARIABLE][1] is None
+        else (
+            f'{CONFIG["datasets"][TIME_RES]["zarr_path"]}'
+            f'{CONFIG["datasets"][TIME_RES]["vars"][VARIABLE][1]}'
+        )
+    )
+    CHUNKS = CONFIG['datasets'][TIME_RES]['chunks']
+    # With --incremental, only the files of dates not yet in the store (or
+    # changed since they were ingested) are read. See `ingest` .
+    INCREMENTAL = "--incremental" in sys.argv[3:]
+    ZARR_RESOLUTION = CONFIG['datasets'][TIME_RES]["zarr_resolution"]
+    # Number of 2x coarsened overview levels to write next to the store, for
+    # zoomed out map tiles. None or 0 for none.
+    OVERVIEW_LEVELS = CONFIG['datasets'][TIME_RES].get("overview_levels")
+    # X and Y chunk sizes of a copy of the store holding the whole time series
+    # in each chunk, for point queries. None for no copy.
+    TIMESERIES_CHUNKS = CONFIG['datasets'][TIME_RES].get("timeseries_chunks")
+
+    (ingest if INCREMENTAL else convert)(
+        INPUT_PATH,
+        OUTPUT_PATH,
+        VARIABLE,
+        time_res=TIME_RES,
+        zarr_resolution=ZARR_RESOLUTION,
+        chunks=CHUNKS,
+    )
+    if OVERVIEW_LEVELS:
+        write_overviews(OUTPUT_PATH, OVERVIEW_LEVELS, chunks=CHUNKS)
+    if TIMESERIES_CHUNKS:
+        write_timeseries(OUTPUT_PATH, TIMESERIES_CHUNKS)
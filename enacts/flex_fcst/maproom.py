@@ -18,7 +18,7 @@ from psycopg2 import sql
 import shapely
 from shapely import wkb
 from shapely.geometry.multipolygon import MultiPolygon
-from globals_ import FLASK, GLOBAL_CONFIG
+from globals_ import FLASK, GLOBAL_CONFIG, TILE_CACHE, TILE_RENDERER
 
 def register(FLASK, config):
     PFX = f"{GLOBAL_CONFIG['url_path_prefix']}/{config['core_path']}"
@@ -43,24 +43,21 @@ def register(FLASK, config):
     APP.layout = layout.app_layout()
 
     def adm_borders(shapes):
-        with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-            s = sql.Composed(
-                [
-                    sql.SQL("with g as ("),
-                    sql.SQL(shapes),
-                    sql.SQL(
-                        """
-                        )
-                        select
-                            g.label, g.key, g.the_geom
-                        from g
-                        """
-                    ),
-                ]
-            )
-            df = pd.read_sql(s, conn)
-
-        df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
+        s = sql.Composed(
+            [
+                sql.SQL("with g as ("),
+                sql.SQL(shapes),
+                sql.SQL(
+                    """
+                    )
+                    select
+                        g.label, g.key, g.the_geom
+                    from g
+                    """
+                ),
+            ]
+        )
+        df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
         df["the_geom"] = df["the_geom"].apply(
             lambda x: x if isinstance(x, MultiPolygon) else MultiPolygon([x])
         )
@@ -729,7 +726,20 @@ def register(FLASK, config):
         f"{TILE_PFX}/<int:tz>/<int:tx>/<int:ty>/<proba>/<variable>/<float:percentile>/<float(signed=True):threshold>/<start_date>/<lead_time>",
         endpoint=f"{config['core_path']}"
     )
+    @pingrid.cached_tile(
+        TILE_CACHE, stamp=lambda: pingrid.path_stamp(config["forecast_path"])
+    )
     def fcst_tiles(tz, tx, ty, proba, variable, percentile, threshold, start_date, lead_time):
+        # Rendered in the request's thread, as a closure can't be sent
+        # to a worker process, but still coalesced with identical
+        # requests.
+        return pingrid.render_tile(
+            TILE_RENDERER, render_fcst_tile,
+            tz, tx, ty, proba, variable, percentile, threshold, start_date, lead_time,
+            inline=True,
+        )
+
+    def render_fcst_tile(qstring, tz, tx, ty, proba, variable, percentile, threshold, start_date, lead_time):
         # Reading
         
         if config["forecast_mu_file_pattern"] is None:
@@ -790,10 +800,8 @@ def register(FLASK, config):
         # probabilities symmetry around percentile threshold
         # choice of colorscale (dry to wet, wet to dry, or correlation)
         fcst_cdf = to_flexible(fcst_cdf, proba, variable, percentile,)
-        with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-            s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
-            df = pd.read_sql(s, conn)
-            clip_shape = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))[0]
+        s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
+        df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
+        clip_shape = df["the_geom"][0]
 
-        resp = pingrid.tile(fcst_cdf, tx, ty, tz, clip_shape)
-        return resp
+        return pingrid.tile_png(fcst_cdf, tx, ty, tz, clip_shape)
@@ -16,6 +16,16 @@ for k, v in appconfig['maprooms'].items():
         GLOBAL_CONFIG['maprooms'][k] = pingrid.deep_merge(defaultconfig['maprooms'][k], v)
 
 
+if GLOBAL_CONFIG.get("tile_cache") is None:
+    TILE_CACHE = None
+else:
+    TILE_CACHE = pingrid.TileCache(**GLOBAL_CONFIG["tile_cache"])
+
+if GLOBAL_CONFIG.get("tile_renderer") is None:
+    TILE_RENDERER = None
+else:
+    TILE_RENDERER = pingrid.TileRenderer(**GLOBAL_CONFIG["tile_renderer"])
+
 FLASK = flask.Flask(
     "enactsmaproom",
     static_url_path=f'{GLOBAL_CONFIG["url_path_prefix"]}/static',
@@ -30,11 +30,8 @@ from globals_ import GLOBAL_CONFIG
 CONFIG = GLOBAL_CONFIG["maprooms"]["monthly"]
 
 def get_shapes(query):
-    with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-        s = sql.SQL(query)
-        df = pd.read_sql(s, conn)
-
-    df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
+    s = sql.SQL(query)
+    df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
     df["the_geom"] = df["the_geom"].apply(
         # lambda x: ((x if isinstance(x, MultiPolygon) else MultiPolygon([x]))
         lambda x: (x
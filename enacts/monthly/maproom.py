@@ -33,10 +33,8 @@ import math
 import urllib
 import xarray as xr
 
-import calc
-
 from . import layout
-from globals_ import FLASK, GLOBAL_CONFIG
+from globals_ import FLASK, GLOBAL_CONFIG, TILE_CACHE
 
 CONFIG = GLOBAL_CONFIG["maprooms"]["monthly"]
 
@@ -44,21 +42,51 @@ DATA_DIR = f"{GLOBAL_CONFIG['datasets']['dekadal']['zarr_path']}"
 PREFIX = f'{GLOBAL_CONFIG["url_path_prefix"]}/{CONFIG["core_path"]}' # Prefix used at the end of the maproom url
 TILE_PFX = f"{PREFIX}/tile"
 
-with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-    s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
-    df = pd.read_sql(s, conn)
-    clip_shape = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))[0]
-
-def read_data(name):
+s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
+df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
+clip_shape = df["the_geom"][0]
 
+def data_path(name):
     dr_path = GLOBAL_CONFIG['datasets']['dekadal']['vars'][name][1]
     if dr_path is None:
         dr_path = GLOBAL_CONFIG['datasets']['dekadal']['vars'][name][0]
     dr_path = f"{DATA_DIR}{dr_path}"
-    dr_path = Path(dr_path)
-    data = calc.read_zarr_data(dr_path)[GLOBAL_CONFIG['datasets']['dekadal']['vars'][name][2]]
+    return Path(dr_path)
+
+def read_data(name):
+    data = pingrid.DATASETS.open_zarr(data_path(name))[GLOBAL_CONFIG['datasets']['dekadal']['vars'][name][2]]
     return data
 
+def read_timeseries(name):
+    # Chunked for point queries if enactstozarr wrote such a copy
+    data = pingrid.open_timeseries(data_path(name))[GLOBAL_CONFIG['datasets']['dekadal']['vars'][name][2]]
+    return data
+
+def climatology_path(name):
+    return Path(CONFIG['climatology_path']) / f"{name}.zarr"
+
+def read_climatology(name, tz):
+    # Precomputed by monthlyclimtozarr.py, with coarser overviews
+    # for lower zoom levels.
+    path = climatology_path(name)
+    pyramid = pingrid.DATASETS.open_zarr(path)
+    if 'resolution' not in pyramid.attrs:
+        # Written before the root group held the pyramid's attrs
+        pyramid = pingrid.DATASETS.open_zarr(path, group="0")
+        pyramid.attrs['resolution'] = pyramid['X'][1].item() - pyramid['X'][0].item()
+    level = pingrid.pyramid_level(
+        pyramid.attrs['resolution'], tz, pyramid.attrs['levels']
+    )
+    clim = pingrid.DATASETS.open_zarr(path, group=str(level))
+    return clim[GLOBAL_CONFIG['datasets']['dekadal']['vars'][name][2]]
+
+def data_stamp():
+    if CONFIG['climatology_path'] is None:
+        path = data_path
+    else:
+        path = climatology_path
+    return pingrid.path_stamp(*(path(v['id']) for v in CONFIG['vars'].values()))
+
 APP = dash.Dash(
     __name__,
     server=FLASK,
@@ -110,7 +138,7 @@ def create_plot(marker_loc, variable): # Callback that creates bar plot to displ
     months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
               "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
     try:
-        DATA = read_data(var['id'])
+        DATA = read_timeseries(var['id'])
         data = pingrid.sel_snap(DATA,marker_loc[0], marker_loc[1])
         base = data.resample(T="1M")
         if var['id'] == "precip":
@@ -192,6 +220,7 @@ def select_colormap(var):
         return temp
 
 @FLASK.route(f"{TILE_PFX}/<int:tz>/<int:tx>/<int:ty>")
+@pingrid.cached_tile(TILE_CACHE, stamp=data_stamp)
 def tile(tz, tx, ty):
     parse_arg = pingrid.parse_arg
     var = parse_arg("variable")
@@ -204,8 +233,11 @@ def tile(tz, tx, ty):
     y_min = pingrid.tile_top_mercator(ty + 1, tz)
 
     varobj = CONFIG['vars'][var]
-    data = read_data(varobj['id'])
-    
+    if CONFIG['climatology_path'] is None:
+        data = read_data(varobj['id'])
+    else:
+        data = read_climatology(varobj['id'], tz)
+
     if (
             x_min > data['X'].max() or
             x_max < data['X'].min() or
@@ -219,18 +251,20 @@ def tile(tz, tx, ty):
         return x.sel(
             X=slice(x_min - x_min % res, x_max + res - x_max % res),
             Y=slice(y_min - y_min % res, y_max + res - y_max % res),
-            T=x['T'].dt.month == month,
         )
-        
-    tile = clip(data)
 
-    groups = tile.groupby('T.year')
-    if var == "Rainfall":
-        tile = groups.sum('T')
-    else:
-        tile = groups.mean('T')
+    if CONFIG['climatology_path'] is None:
+        tile = clip(data.sel(T=data['T'].dt.month == month))
+
+        groups = tile.groupby('T.year')
+        if var == "Rainfall":
+            tile = groups.sum('T')
+        else:
+            tile = groups.mean('T')
 
-    tile = tile.mean('year')
+        tile = tile.mean('year')
+    else:
+        tile = clip(data.sel(month=month))
 
     colormap = select_colormap(varobj['id'])
     
@@ -240,7 +274,9 @@ def tile(tz, tx, ty):
     tile.attrs["scale_min"] = varobj['min']
     tile.attrs["scale_max"] = varobj['max']
     
-    result = pingrid.tile(tile, tx, ty, tz, clip_shape)
+    # Rainfall and temperature fields are averaged rather than sampled
+    # when zoomed out.
+    result = pingrid.tile(tile, tx, ty, tz, clip_shape, resampling="block-mean")
 
 
     return result
@@ -0,0 +1,165 @@
+"""Precomputes the maps of the Monthly Climatology maproom.
+
+For each variable of the maproom, writes the 12 monthly climatologies of the
+dekadal data, together with coarser overviews of them, to a Zarr store in the
+maproom's `climatology_path`. Run it after each update of the dekadal Zarr
+stores, e.g.:
+
+    CONFIG=config.yaml python monthlyclimtozarr.py [variable ...]
+
+where the optional variables are ids of the maproom's `vars` (e.g. precip),
+all of them by default.
+"""
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+import xarray as xr
+import zarr
+
+import calc
+import pingrid
+
+
+def monthly_climatology(data, accumulate):
+    """Climatology of each calendar month of dekadal `data` .
+
+    Parameters
+    ----------
+    data : DataArray
+        dekadal data with time dimension T
+    accumulate : bool
+        if True, the monthly values are the sums of the dekads of the month
+        (e.g. rainfall), otherwise their means (e.g. temperature)
+
+    Returns
+    -------
+    DataArray of `data` averaged over years, with a month dimension (1 to 12)
+    in place of T
+    """
+    clims = []
+    for month in range(1, 13):
+        groups = data.sel(T=data["T"].dt.month == month).groupby("T.year")
+        if accumulate:
+            clim = groups.sum("T")
+        else:
+            clim = groups.mean("T")
+        clims.append(clim.mean("year"))
+    return xr.concat(clims, pd.Index(range(1, 13), name="month"))
+
+
+def overview_pyramid(data, max_size=256):
+    """Successive 2x coarsenings of `data` , by block averages over X and Y.
+
+    Level k has a grid spacing of 2**k times that of `data` . Levels are added
+    until the coarsest one is at most `max_size` cells wide and tall, which is
+    about a tile.
+
+    Parameters
+    ----------
+    data : DataArray
+        data on a regular X and Y grid
+    max_size : int, optional
+        maximum number of cells along X and Y of the coarsest level
+
+    Returns
+    -------
+    list of DataArray, the first one being `data`
+
+    See Also
+    --------
+    pingrid.pyramid_level, pingrid.coarsen_overview
+    """
+    levels = [data]
+    while max(levels[-1]["X"].size, levels[-1]["Y"].size) > max_size:
+        levels.append(pingrid.coarsen_overview(data, 2 ** len(levels)))
+    return levels
+
+
+def write_pyramid(levels, output_path):
+    """Writes the levels of an overview pyramid in the groups 0, 1... of a
+    Zarr store.
+
+    `output_path` is a symbolic link to the current version of the store.
+    Each version is written in its own directory next to it, and the link is
+    then switched to it atomically, so that readers never see a partially
+    written store, nor no store at all. The previous version is kept for
+    readers that still have it open, and older ones are removed. The number
+    of levels and the resolution of level 0 are in the attrs of the root
+    group.
+
+    Parameters
+    ----------
+    levels : list of DataArray
+        named DataArray of each level, as returned by `overview_pyramid`
+    output_path : str or Path
+        path of the Zarr store, replaced if it exists
+
+    Returns
+    -------
+    output_path : where the zarr store has been written
+    """
+    output_path = Path(output_path)
+    version = output_path.with_name(f"{output_path.name}.{time.time_ns()}")
+    for k, level in enumerate(levels):
+        ds = level.to_dataset()
+        ds.attrs["levels"] = len(levels)
+        ds.chunk({"month": 1, "X": 256, "Y": 256}).to_zarr(version, group=str(k))
+    root = zarr.open_group(os.fspath(version), mode="r+")
+    root.attrs.update(
+        levels=len(levels),
+        resolution=levels[0]["X"][1].item() - levels[0]["X"][0].item(),
+    )
+    zarr.consolidate_metadata(os.fspath(version))
+    link = output_path.with_name(f"{output_path.name}.link")
+    if link.is_symlink():
+        link.unlink()
+    os.symlink(version.name, link)
+    if output_path.is_dir() and not output_path.is_symlink():
+        # Store written before stores were versioned
+        os.replace(output_path, output_path.with_name(f"{output_path.name}.0"))
+    os.replace(link, output_path)
+    versions = sorted(
+        (
+            p for p in output_path.parent.glob(f"{output_path.name}.*")
+            if p.suffix[1:].isdigit()
+        ),
+        key=lambda p: int(p.suffix[1:]),
+    )
+    for p in versions[:-2]:
+        shutil.rmtree(p, ignore_errors=True)
+    return output_path
+
+
+def build(datasets_config, monthly_config, var_id):
+    dekadal = datasets_config["dekadal"]
+    zarr_name = dekadal["vars"][var_id][1]
+    if zarr_name is None:
+        zarr_name = dekadal["vars"][var_id][0]
+    data = calc.read_zarr_data(
+        Path(f'{dekadal["zarr_path"]}{zarr_name}')
+    )[dekadal["vars"][var_id][2]]
+    # Same convention as the maproom's on-the-fly computation
+    accumulate = any(
+        label == "Rainfall" and v["id"] == var_id
+        for label, v in monthly_config["vars"].items()
+    )
+    print(f"computing monthly climatology of {var_id}")
+    clim = monthly_climatology(data, accumulate).rename(data.name).load()
+    output_path = Path(monthly_config["climatology_path"]) / f"{var_id}.zarr"
+    write_pyramid(overview_pyramid(clim), output_path)
+    print(f"wrote {output_path}")
+    return output_path
+
+
+if __name__ == "__main__":
+    CONFIG = pingrid.load_config(f'config-defaults.yaml:{os.environ["CONFIG"]}')
+    MONTHLY_CONFIG = CONFIG["maprooms"]["monthly"]
+    if MONTHLY_CONFIG.get("climatology_path") is None:
+        raise Exception("maprooms.monthly.climatology_path is not configured")
+    var_ids = sys.argv[1:] or [v["id"] for v in MONTHLY_CONFIG["vars"].values()]
+    for var_id in var_ids:
+        build(CONFIG["datasets"], MONTHLY_CONFIG, var_id)
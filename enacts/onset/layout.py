@@ -27,6 +27,24 @@ if DATA_PATH is None:
 DR_PATH = f"{GLOBAL_CONFIG['datasets']['daily']['zarr_path']}{DATA_PATH}"
 RR_MRG_ZARR = Path(DR_PATH)
 
+# Default values of the analysis controls, by map tile argument name
+DEFAULTS = {
+    "search_start_day": 1,
+    "search_start_month": CONFIG["default_search_month"],
+    "search_days": 90,
+    "wet_thresh": 1,
+    "wet_spell_length": CONFIG["default_running_days"],
+    "wet_spell_thresh": 20,
+    "min_wet_days": CONFIG["default_min_rainy_days"],
+    "dry_spell_length": 7,
+    "dry_spell_search": 21,
+    "cess_start_day": 1,
+    "cess_start_month": CONFIG["default_search_month_cess"],
+    "cess_search_days": 90,
+    "cess_soil_moisture": 5,
+    "cess_dry_spell": 3,
+}
+
 IRI_BLUE = "rgb(25,57,138)"
 IRI_GRAY = "rgb(113,112,116)"
 LIGHT_GRAY = "#eeeeee"
@@ -312,16 +330,16 @@ def controls_layout(lat_min, lat_max, lon_min, lon_max, lat_label, lon_label):
                         "Onset Date Search Period",
                         Sentence(
                             "From Early Start date of",
-                            DateNoYear("search_start_", 1, CONFIG["default_search_month"]),
+                            DateNoYear("search_start_", DEFAULTS["search_start_day"], DEFAULTS["search_start_month"]),
                             "and within the next",
-                            Number("search_days", 90, min=0, max=9999), "days",
+                            Number("search_days", DEFAULTS["search_days"], min=0, max=9999), "days",
                         ),
                     ),
                     Block(
                         "Wet Day Definition",
                         Sentence(
                             "Rainfall amount greater than",
-                            Number("wet_threshold", 1, min=0, max=99999),
+                            Number("wet_threshold", DEFAULTS["wet_thresh"], min=0, max=99999),
                             "mm",
                         ),
                     ),
@@ -329,15 +347,15 @@ def controls_layout(lat_min, lat_max, lon_min, lon_max, lat_label, lon_label):
                         "Onset Date Definition",
                         Sentence(
                             "First spell of",
-                            Number("running_days", CONFIG["default_running_days"], min=0, max=999),
+                            Number("running_days", DEFAULTS["wet_spell_length"], min=0, max=999),
                             "days that totals",
-                            Number("running_total", 20, min=0, max=99999),
+                            Number("running_total", DEFAULTS["wet_spell_thresh"], min=0, max=99999),
                             "mm or more and with at least",
-                            Number("min_rainy_days", CONFIG["default_min_rainy_days"], min=0, max=999),
+                            Number("min_rainy_days", DEFAULTS["min_wet_days"], min=0, max=999),
                             "wet day(s) that is not followed by a",
-                            Number("dry_days", 7, min=0, max=999),
+                            Number("dry_days", DEFAULTS["dry_spell_length"], min=0, max=999),
                             "-day dry spell within the next",
-                            Number("dry_spell", 21, min=0, max=9999),
+                            Number("dry_spell", DEFAULTS["dry_spell_search"], min=0, max=9999),
                             "days",
                         ),
                     ),
@@ -345,13 +363,13 @@ def controls_layout(lat_min, lat_max, lon_min, lon_max, lat_label, lon_label):
                         "Cessation Date Definition",
                         Sentence(
                             "First date after",
-                            DateNoYear("cess_start_", 1, CONFIG["default_search_month_cess"]),
+                            DateNoYear("cess_start_", DEFAULTS["cess_start_day"], DEFAULTS["cess_start_month"]),
                             "in",
-                            Number("cess_search_days", 90, min=0, max=99999),
+                            Number("cess_search_days", DEFAULTS["cess_search_days"], min=0, max=99999),
                             "days when the soil moisture falls below",
-                            Number("cess_soil_moisture", 5, min=0, max=999),
+                            Number("cess_soil_moisture", DEFAULTS["cess_soil_moisture"], min=0, max=999),
                             "mm for a period of",
-                            Number("cess_dry_spell", 3, min=0, max=999),
+                            Number("cess_dry_spell", DEFAULTS["cess_dry_spell"], min=0, max=999),
                             "days",
                         ),
                         is_on=CONFIG["ison_cess_date_hist"]
@@ -1,3 +1,4 @@
+import flask
 import dash
 from dash import dcc
 from dash import html
@@ -22,18 +23,29 @@ import shapely
 from shapely import wkb
 from shapely.geometry.multipolygon import MultiPolygon
 import datetime
+from functools import partial
+import xarray as xr
 
-from globals_ import FLASK, GLOBAL_CONFIG
+from globals_ import FLASK, GLOBAL_CONFIG, TILE_CACHE, TILE_RENDERER
 
 CONFIG = GLOBAL_CONFIG["maprooms"]["onset"]
 
 PFX = f'{GLOBAL_CONFIG["url_path_prefix"]}/{CONFIG["core_path"]}'
 TILE_PFX = f"{PFX}/tile"
 
-with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-    s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
-    df = pd.read_sql(s, conn)
-    clip_shape = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))[0]
+# Maps of metatiles, from which their tiles are cut
+METATILES = pingrid.FieldCache()
+
+# Onset and cessation dates over the whole domain, by analysis parameters
+RESULTS = pingrid.ResultStore(
+    CONFIG["results_cache_size"], CONFIG["results_path"], CONFIG["results_prefetch"]
+)
+# Maps derived from them, by tile arguments
+RESULT_MAPS = pingrid.FieldCache()
+
+s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
+df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
+clip_shape = df["the_geom"][0]
 
 # Reads daily data
 
@@ -73,24 +85,21 @@ APP.layout = layout.app_layout()
 
 
 def adm_borders(shapes):
-    with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-        s = sql.Composed(
-            [
-                sql.SQL("with g as ("),
-                sql.SQL(shapes),
-                sql.SQL(
-                    """
-                    )
-                    select
-                        g.label, g.key, g.the_geom
-                    from g
-                    """
-                ),
-            ]
-        )
-        df = pd.read_sql(s, conn)
-
-    df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
+    s = sql.Composed(
+        [
+            sql.SQL("with g as ("),
+            sql.SQL(shapes),
+            sql.SQL(
+                """
+                )
+                select
+                    g.label, g.key, g.the_geom
+                from g
+                """
+            ),
+        ]
+    )
+    df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
     df["the_geom"] = df["the_geom"].apply(
         lambda x: x if isinstance(x, MultiPolygon) else MultiPolygon([x])
     )
@@ -345,7 +354,13 @@ def write_map_title(search_start_day, search_start_month, map_choice, pet_onset,
     Input("map_choice", "value"),
 )
 def write_map_description(map_choice):
-    return CONFIG["map_text"][map_choice]["description"]    
+    description = CONFIG["map_text"][map_choice]["description"]
+    if CONFIG["overview_analysis"]:
+        description += (
+            " When zoomed out, the map may be computed from rainfall averaged"
+            " over blocks of grid cells, which only approximates the analysis."
+        )
+    return description
 
 
 @APP.callback(
@@ -408,7 +423,7 @@ def onset_plots(
     lat = marker_pos[0]
     lng = marker_pos[1]
     try:
-        precip = pingrid.sel_snap(rr_mrg.precip, lat, lng)
+        precip = pingrid.sel_snap(pingrid.open_timeseries(RR_MRG_ZARR).precip, lat, lng)
         isnan = np.isnan(precip).any()
         if isnan:
             error_fig = pingrid.error_fig(error_msg="Data missing at this location")
@@ -420,8 +435,7 @@ def onset_plots(
         return error_fig, error_fig, germ_sentence
     precip.load()
     try:
-        onset_delta = calc.seasonal_onset_date(
-            precip,
+        onset_delta = point_onset_dates(precip, lat, lng, (
             int(search_start_day),
             calc.strftimeb2int(search_start_month),
             int(search_days),
@@ -431,8 +445,7 @@ def onset_plots(
             int(min_rainy_days),
             int(dry_days),
             int(dry_spell),
-            time_dim="T",
-        )
+        ))
         isnan = np.isnan(onset_delta["onset_delta"]).all()
         if isnan:
             error_fig = pingrid.error_fig(error_msg="No onset dates were found")
@@ -544,7 +557,7 @@ def cess_plots(
         lat = marker_pos[0]
         lng = marker_pos[1]
         try:
-            precip = pingrid.sel_snap(rr_mrg.precip, lat, lng)
+            precip = pingrid.sel_snap(pingrid.open_timeseries(RR_MRG_ZARR).precip, lat, lng)
             isnan = np.isnan(precip).any()
             if isnan:
                 error_fig = pingrid.error_fig(error_msg="Data missing at this location")
@@ -554,18 +567,13 @@ def cess_plots(
             return error_fig, error_fig, tab_style
         precip.load()
         try:
-            cess_delta = calc.seasonal_cess_date_from_rain(
-                precip,
+            cess_delta = point_cess_dates(precip, lat, lng, (
                 int(cess_start_day),
                 calc.strftimeb2int(cess_start_month),
                 int(cess_search_days),
                 int(cess_soil_moisture),
                 int(cess_dry_spell),
-                5,
-                60,
-                60./3.,
-                time_dim="T",
-            )
+            ))
             isnan = np.isnan(cess_delta["cess_delta"]).all()
             if isnan:
                 error_fig = pingrid.error_fig(error_msg="No cessation dates were found")
@@ -665,7 +673,7 @@ def length_plots(
         lat = marker_pos[0]
         lng = marker_pos[1]
         try:
-            precip = pingrid.sel_snap(rr_mrg.precip, lat, lng)
+            precip = pingrid.sel_snap(pingrid.open_timeseries(RR_MRG_ZARR).precip, lat, lng)
             isnan = np.isnan(precip).any()
             if isnan:
                 error_fig = pingrid.error_fig(error_msg="Data missing at this location")
@@ -677,8 +685,7 @@ def length_plots(
             return error_fig, error_fig, tab_style
         precip.load()
         try:
-            onset_delta = calc.seasonal_onset_date(
-                precip,
+            onset_delta = point_onset_dates(precip, lat, lng, (
                 int(search_start_day),
                 calc.strftimeb2int(search_start_month),
                 int(search_days),
@@ -688,8 +695,7 @@ def length_plots(
                 int(min_rainy_days),
                 int(dry_days),
                 int(dry_spell),
-                time_dim="T",
-            )
+            ))
             isnan = np.isnan(onset_delta["onset_delta"]).all()
             if isnan:
                 error_fig = pingrid.error_fig(error_msg="No onset dates were found")
@@ -700,18 +706,13 @@ def length_plots(
             )
             return error_fig, error_fig, tab_style
         try:
-            cess_delta = calc.seasonal_cess_date_from_rain(
-                precip,
+            cess_delta = point_cess_dates(precip, lat, lng, (
                 int(cess_start_day),
                 calc.strftimeb2int(cess_start_month),
                 int(cess_search_days),
                 int(cess_soil_moisture),
                 int(cess_dry_spell),
-                5,
-                60,
-                60./3.,
-                time_dim="T",
-            )
+            ))
             isnan = np.isnan(cess_delta["cess_delta"]).all()
             if isnan:
                 error_fig = pingrid.error_fig(error_msg="No cessation dates were found")
@@ -719,15 +720,9 @@ def length_plots(
         except TypeError:
             error_fig = pingrid.error_fig(error_msg="Please ensure all cessation input boxes are filled")
             return error_fig, error_fig, tab_style
-        if cess_delta["T"][0] < onset_delta["T"][0]:
-            cess_delta = cess_delta.isel({"T": slice(1, None)})
-        if cess_delta["T"].size != onset_delta["T"].size:
-            onset_delta = onset_delta.isel({"T": slice(None, -1)})
+        onset_delta, cess_delta = align_seasons(onset_delta, cess_delta)
         try:
-            seasonal_length = (
-                (cess_delta["T"] + cess_delta["cess_delta"]).drop_indexes("T")
-                - (onset_delta["T"] + onset_delta["onset_delta"]).drop_indexes("T")
-            )
+            seasonal_length = season_length(onset_delta, cess_delta)
             isnan = np.isnan(seasonal_length).all()
             if isnan:
                 error_fig = pingrid.error_fig(error_msg="Onset or cessation not found for any season")
@@ -773,9 +768,83 @@ def length_plots(
         return length_graph, cdf_graph, tab_style
 
 
+def uses_results(qstring):
+    """Whether the tile arguments in `qstring` are those of a map that can
+    be sampled from stored results."""
+    return RESULTS.maxsize and (
+        pingrid.parse_arg("map_choice", qstring=qstring) != "monit"
+    )
+
+
+def tile_stamp():
+    """Stamp of the cached tiles. Unless the analysis is done at the data's
+    resolution, tiles sampled from stored results differ from those
+    computed by metatiles."""
+    stamp = pingrid.path_stamp(RR_MRG_ZARR, pingrid.overview_path(RR_MRG_ZARR))
+    req = flask.request
+    qstring = "?" + req.query_string.decode() if req.query_string else ""
+    if (
+        CONFIG["overview_analysis"] and uses_results(qstring)
+        and results_stored(qstring)
+    ):
+        stamp += ":results"
+    return stamp
+
+
 @FLASK.route(f"{TILE_PFX}/<int:tz>/<int:tx>/<int:ty>")
+@pingrid.cached_tile(TILE_CACHE, stamp=tile_stamp)
 def onset_tile(tz, tx, ty):
-    parse_arg = pingrid.parse_arg
+    req = flask.request
+    qstring = "?" + req.query_string.decode() if req.query_string else ""
+    if uses_results(qstring):
+        if results_stored(qstring):
+            # Maps of the stored results only need to be sampled.
+            key = pingrid.tile_cache_key(
+                req.endpoint, "results", req.args,
+                pingrid.path_stamp(RR_MRG_ZARR),
+            )
+            map_data = RESULT_MAPS.get(key, lambda: results_map(qstring))
+            return pingrid.tile(
+                map_data, tx, ty, tz, clip_shape, resampling="block-mean"
+            )
+        # Computed in the background for the next tiles of the map
+        prefetch_results(qstring)
+    if not CONFIG.get("metatile"):
+        return pingrid.render_tile(TILE_RENDERER, render_onset_tile, tz, tx, ty)
+    # The map is computed once for the whole metatile, and each of its
+    # tiles is cut from it.
+    tx0, ty0, tx1, ty1 = pingrid.metatile_extents(tx, ty, tz, CONFIG["metatile"])
+    key = pingrid.tile_cache_key(
+        req.endpoint, f"{tz}/{tx0}/{ty0}/{tx1}/{ty1}", req.args,
+        pingrid.path_stamp(RR_MRG_ZARR, pingrid.overview_path(RR_MRG_ZARR)),
+    )
+
+    def compute():
+        if TILE_RENDERER is None:
+            return onset_map(qstring, tz, tx0, ty0, tx1, ty1)
+        return TILE_RENDERER.render(
+            key, onset_map, qstring, tz, tx0, ty0, tx1, ty1
+        )
+
+    map_data = METATILES.get(key, compute)
+    if map_data is None:
+        return pingrid.image_resp(pingrid.empty_tile())
+    return pingrid.tile(map_data, tx, ty, tz, clip_shape, resampling="block-mean")
+
+
+def render_onset_tile(qstring, tz, tx, ty):
+    map_data = onset_map(qstring, tz, tx, ty, tx + 1, ty + 1)
+    if map_data is None:
+        return pingrid.png_bytes(pingrid.empty_tile())
+    return pingrid.tile_png(
+        map_data, tx, ty, tz, clip_shape, resampling="block-mean"
+    )
+
+
+def onset_map(qstring, tz, tx0, ty0, tx1, ty1):
+    """Map of the tiles from (tx0, ty0) to (tx1, ty1) excluded, at zoom
+    level tz, or None if they are out of the data domain."""
+    parse_arg = partial(pingrid.parse_arg, qstring=qstring)
     map_choice = parse_arg("map_choice")
     search_start_day = parse_arg("search_start_day", int)
     search_start_month1 = parse_arg("search_start_month", calc.strftimeb2int)
@@ -795,13 +864,21 @@ def onset_tile(tz, tx, ty):
     prob_exc_thresh_length = parse_arg("prob_exc_thresh_length", int)
     prob_exc_thresh_tot = parse_arg("prob_exc_thresh_tot", int)
 
-    x_min = pingrid.tile_left(tx, tz)
-    x_max = pingrid.tile_left(tx + 1, tz)
+    x_min = pingrid.tile_left(tx0, tz)
+    x_max = pingrid.tile_left(tx1, tz)
     # row numbers increase as latitude decreases
-    y_max = pingrid.tile_top_mercator(ty, tz)
-    y_min = pingrid.tile_top_mercator(ty + 1, tz)
+    y_max = pingrid.tile_top_mercator(ty0, tz)
+    y_min = pingrid.tile_top_mercator(ty1, tz)
 
-    precip = rr_mrg.precip
+    # Zoomed out tiles are approximated from the coarsest overview that
+    # is still finer than the pixels, if there are overviews and
+    # overview_analysis is set. Otherwise the analysis is done at the
+    # data's resolution and the tiles average it over their pixels.
+    levels = pingrid.open_overviews(RR_MRG_ZARR)
+    if not CONFIG["overview_analysis"]:
+        levels = levels[:1]
+    precip = pingrid.select_overview(levels, tz).precip
+    res = precip['X'][1].item() - precip['X'][0].item()
 
     if (
             # When we generalize this to other datasets, remember to
@@ -812,37 +889,43 @@ def onset_tile(tz, tx, ty):
             y_min > precip['Y'].max() or
             y_max < precip['Y'].min()
     ):
-        return pingrid.image_resp(pingrid.empty_tile())
+        return None
 
     if map_choice == "monit":
-        precip_tile = rr_mrg.precip.isel({"T": slice(-366, None)})
+        precip_tile = precip.isel({"T": slice(-366, None)})
         search_start_dm = calc.sel_day_and_month(precip_tile["T"], search_start_day, search_start_month1)
         precip_tile = precip_tile.sel({"T": slice(search_start_dm.values[0], None)})
     else:
-        precip_tile = rr_mrg.precip
+        precip_tile = precip
 
     precip_tile = precip_tile.sel(
-        X=slice(x_min - x_min % RESOLUTION, x_max + RESOLUTION - x_max % RESOLUTION),
-        Y=slice(y_min - y_min % RESOLUTION, y_max + RESOLUTION - y_max % RESOLUTION),
-    ).compute()
-
-    map_min = np.timedelta64(0) if map_choice in ["monit", "mean"] else 0
-    colormap = CMAPS["rainbow"]
+        X=slice(x_min - x_min % res, x_max + res - x_max % res),
+        Y=slice(y_min - y_min % res, y_max + res - y_max % res),
+    )
 
+    # At low zoom, a metatile at the data's resolution can span the whole
+    # domain, so its rainfall is read and analyzed by blocks.
     if map_choice == "monit":
-        map_data = calc.onset_date(
+        map_data = by_blocks(
+            lambda precip_block: calc.onset_date(
+                precip_block,
+                wet_thresh,
+                wet_spell_length,
+                wet_spell_thresh,
+                min_wet_days,
+                dry_spell_length,
+                0
+            ),
             precip_tile,
-            wet_thresh,
-            wet_spell_length,
-            wet_spell_thresh,
-            min_wet_days,
-            dry_spell_length,
-            0
         )
         map_max = np.timedelta64((precip_tile["T"][-1] - precip_tile["T"][0]).values, 'D')
-    else:
-        onset_dates = calc.seasonal_onset_date(
-            precip_tile,
+        map_data.attrs["colormap"] = CMAPS["rainbow"]
+        map_data.attrs["scale_min"] = np.timedelta64(0)
+        map_data.attrs["scale_max"] = map_max
+        return map_data.rename(X="lon", Y="lat")
+    onset_dates = by_blocks(
+        lambda precip_block: calc.seasonal_onset_date(
+            precip_block,
             search_start_day,
             search_start_month1,
             search_days,
@@ -852,10 +935,14 @@ def onset_tile(tz, tx, ty):
             min_wet_days,
             dry_spell_length,
             dry_spell_search,
-        )
-        if ("length" in map_choice) | ("total" in map_choice):
-            cess_dates = calc.seasonal_cess_date_from_rain(
-                precip_tile,
+        ),
+        precip_tile,
+    )
+    cess_dates = None
+    if ("length" in map_choice) | ("total" in map_choice):
+        cess_dates = by_blocks(
+            lambda precip_block: calc.seasonal_cess_date_from_rain(
+                precip_block,
                 cess_start_day,
                 cess_start_month1,
                 cess_search_days,
@@ -864,48 +951,281 @@ def onset_tile(tz, tx, ty):
                 5,
                 60,
                 60./3.,
-            )
-            if "length" in map_choice:
-                if cess_dates["T"][0] < onset_dates["T"][0]:
-                    cess_dates = cess_dates.isel({"T": slice(1, None)})
-                if cess_dates["T"].size != onset_dates["T"].size:
-                    onset_dates = onset_dates.isel({"T": slice(None, -1)})
-                seasonal_length = (
-                    (cess_dates["T"] + cess_dates["cess_delta"]).drop_indexes("T")
-                    - (onset_dates["T"] + onset_dates["onset_delta"]).drop_indexes("T")
-                ) #.astype("timedelta64[D]")
-        if map_choice == "mean":
+            ),
+            precip_tile,
+        )
+    return seasonal_map(
+        map_choice, onset_dates, cess_dates, search_days,
+        prob_exc_thresh_onset, prob_exc_thresh_length,
+    )
+
+
+def seasonal_map(
+    map_choice, onset_dates, cess_dates, search_days,
+    prob_exc_thresh_onset, prob_exc_thresh_length,
+):
+    """Map of `map_choice` , other than monit, from seasonal onset and
+    cessation dates, with its color scale in attrs."""
+    map_min = np.timedelta64(0) if map_choice == "mean" else 0
+    colormap = CMAPS["rainbow"]
+    if "length" in map_choice:
+        onset_dates, cess_dates = align_seasons(onset_dates, cess_dates)
+        seasonal_length = season_length(onset_dates, cess_dates)
+    if map_choice == "mean":
+        if "onset_mean" in onset_dates:
+            map_data = onset_dates.onset_mean
+        else:
             map_data = onset_dates.onset_delta.mean("T")
-            map_max = np.timedelta64(search_days, 'D')
-        if map_choice == "stddev":
+        map_max = np.timedelta64(search_days, 'D')
+    if map_choice == "stddev":
+        if "onset_stddev" in onset_dates:
+            map_data = onset_dates.onset_stddev
+        else:
             map_data = onset_dates.onset_delta.dt.days.std(dim="T", skipna=True)
-            map_max = int(search_days/3)
-        if map_choice == "pe":
-            map_data = (
-                onset_dates.onset_delta.fillna(
-                    np.timedelta64(search_days+1, 'D')
-                ) > np.timedelta64(prob_exc_thresh_onset, 'D')
-            ).mean("T") * 100
-            map_max = 100
-            colormap = CMAPS["correlation"]
-        if map_choice == "length_mean":
-            map_data = seasonal_length.mean("T")
-            map_max = np.timedelta64(int(CONFIG["map_text"][map_choice]["map_max"]), 'D')
-        if map_choice == "length_stddev":
-            map_data = seasonal_length.dt.days.std(dim="T", skipna=True)
-            map_max = CONFIG["map_text"][map_choice]["map_max"]
-        if map_choice == "length_pe":
-            map_data = (seasonal_length < np.timedelta64(prob_exc_thresh_length, 'D')).mean("T") * 100
-            map_max = 100
-            colormap = CMAPS["correlation"]
+        map_max = int(search_days/3)
+    if map_choice == "pe":
+        map_data = (
+            onset_dates.onset_delta.fillna(
+                np.timedelta64(search_days+1, 'D')
+            ) > np.timedelta64(prob_exc_thresh_onset, 'D')
+        ).mean("T") * 100
+        map_max = 100
+        colormap = CMAPS["correlation"]
+    if map_choice == "length_mean":
+        map_data = seasonal_length.mean("T")
+        map_max = np.timedelta64(int(CONFIG["map_text"][map_choice]["map_max"]), 'D')
+    if map_choice == "length_stddev":
+        map_data = seasonal_length.dt.days.std(dim="T", skipna=True)
+        map_max = CONFIG["map_text"][map_choice]["map_max"]
+    if map_choice == "length_pe":
+        map_data = (seasonal_length < np.timedelta64(prob_exc_thresh_length, 'D')).mean("T") * 100
+        map_max = 100
+        colormap = CMAPS["correlation"]
     map_data.attrs["colormap"] = colormap
     map_data = map_data.rename(X="lon", Y="lat")
     map_data.attrs["scale_min"] = map_min
     map_data.attrs["scale_max"] = map_max
-    result = pingrid.tile(map_data, tx, ty, tz, clip_shape)
+    return map_data
+
+
+def align_seasons(onset_dates, cess_dates):
+    """Drops the cessation date preceding the first onset date, and the
+    onset date of a last season that has no cessation date yet."""
+    if cess_dates["T"][0] < onset_dates["T"][0]:
+        cess_dates = cess_dates.isel({"T": slice(1, None)})
+    if cess_dates["T"].size != onset_dates["T"].size:
+        onset_dates = onset_dates.isel({"T": slice(None, -1)})
+    return onset_dates, cess_dates
+
+
+def season_length(onset_dates, cess_dates):
+    """Length of the seasons of aligned onset and cessation dates."""
+    return (
+        (cess_dates["T"] + cess_dates["cess_delta"]).drop_indexes("T")
+        - (onset_dates["T"] + onset_dates["onset_delta"]).drop_indexes("T")
+    ) #.astype("timedelta64[D]")
+
+
+def by_blocks(func, data, size=None):
+    """Applies `func` to blocks of `size` x `size` cells of `data` , loaded
+    one at a time, and mosaics the results back together. By default, blocks
+    are as large as the results_block_mb configuration allows."""
+    if size is None:
+        size = max(1, int(np.sqrt(
+            CONFIG["results_block_mb"] * 2**20
+            / (data["T"].size * data.dtype.itemsize)
+        )))
+    if data["X"].size == 0 or data["Y"].size == 0:
+        return func(data.load())
+    rows = []
+    for y in range(0, data["Y"].size, size):
+        rows.append(xr.concat([
+            func(data.isel(Y=slice(y, y + size), X=slice(x, x + size)).load())
+            for x in range(0, data["X"].size, size)
+        ], "X", data_vars="minimal"))
+    return xr.concat(rows, "Y", data_vars="minimal")
+
+
+def onset_results(params, compute=True):
+    """Onset dates over the whole domain, with their mean and standard
+    deviation over the seasons.
+
+    Parameters
+    ----------
+    params : tuple
+        Arguments of `calc.seasonal_onset_date` after the daily rainfall.
+    compute : bool or "background", optional
+        If False, returns None rather than computing them when they are not
+        stored. If "background", also starts computing them in the
+        background.
+
+    Returns
+    -------
+    Dataset or None
+    """
+    key = {"onset": [float(p) for p in params]}
+    stamp = pingrid.path_stamp(RR_MRG_ZARR)
+    def compute_results():
+        onset_dates = by_blocks(
+            lambda precip: calc.seasonal_onset_date(precip, *params),
+            pingrid.DATASETS.open_zarr(RR_MRG_ZARR).precip,
+        )
+        onset_dates["onset_mean"] = onset_dates.onset_delta.mean("T")
+        onset_dates["onset_stddev"] = onset_dates.onset_delta.dt.days.std(
+            dim="T", skipna=True
+        )
+        return onset_dates
+
+    if compute is True:
+        return RESULTS.get(key, stamp, compute_results)
+    result = RESULTS.peek(key, stamp)
+    if result is None and compute == "background":
+        RESULTS.prefetch(key, stamp, compute_results)
     return result
 
 
+def cess_results(params, compute=True):
+    """Cessation dates over the whole domain.
+
+    Parameters
+    ----------
+    params : tuple
+        Arguments of `calc.seasonal_cess_date_from_rain` after the daily
+        rainfall, up to the dry spell length.
+    compute : bool or "background", optional
+        If False, returns None rather than computing them when they are not
+        stored. If "background", also starts computing them in the
+        background.
+
+    Returns
+    -------
+    Dataset or None
+    """
+    key = {"cess": [float(p) for p in params]}
+    stamp = pingrid.path_stamp(RR_MRG_ZARR)
+    def compute_results():
+        return by_blocks(
+            lambda precip: calc.seasonal_cess_date_from_rain(
+                precip, *params, 5, 60, 60./3.
+            ),
+            pingrid.DATASETS.open_zarr(RR_MRG_ZARR).precip,
+        )
+
+    if compute is True:
+        return RESULTS.get(key, stamp, compute_results)
+    result = RESULTS.peek(key, stamp)
+    if result is None and compute == "background":
+        RESULTS.prefetch(key, stamp, compute_results)
+    return result
+
+
+def point_onset_dates(precip, lat, lng, params):
+    """Onset dates at the grid cell of (`lat` , `lng` ), read from the
+    stored results if there are any, otherwise computed from its `precip` ."""
+    results = onset_results(params, compute=False)
+    if results is not None:
+        return pingrid.sel_snap(results[["onset_delta"]], lat, lng).load()
+    return calc.seasonal_onset_date(precip, *params, time_dim="T")
+
+
+def point_cess_dates(precip, lat, lng, params):
+    """Cessation dates at the grid cell of (`lat` , `lng` ), read from the
+    stored results if there are any, otherwise computed from its `precip` ."""
+    results = cess_results(params, compute=False)
+    if results is not None:
+        return pingrid.sel_snap(results, lat, lng).load()
+    return calc.seasonal_cess_date_from_rain(
+        precip, *params, 5, 60, 60./3., time_dim="T"
+    )
+
+
+def results_params(qstring):
+    """Parameters of `onset_results` and `cess_results` from the tile
+    arguments in `qstring` , the latter being None if the map doesn't need
+    cessation dates."""
+    parse_arg = partial(pingrid.parse_arg, qstring=qstring)
+    map_choice = parse_arg("map_choice")
+    onset_params = (
+        parse_arg("search_start_day", int),
+        parse_arg("search_start_month", calc.strftimeb2int),
+        parse_arg("search_days", int),
+        parse_arg("wet_thresh", float),
+        parse_arg("wet_spell_length", int),
+        parse_arg("wet_spell_thresh", float),
+        parse_arg("min_wet_days", int),
+        parse_arg("dry_spell_length", int),
+        parse_arg("dry_spell_search", int),
+    )
+    cess_params = None
+    if ("length" in map_choice) | ("total" in map_choice):
+        cess_params = (
+            parse_arg("cess_start_day", int),
+            parse_arg("cess_start_month", calc.strftimeb2int),
+            parse_arg("cess_search_days", int),
+            parse_arg("cess_soil_moisture", float),
+            parse_arg("cess_dry_spell", int),
+        )
+    return onset_params, cess_params
+
+
+def results_stored(qstring):
+    """Whether the results the map of the tile arguments in `qstring`
+    needs are stored."""
+    onset_params, cess_params = results_params(qstring)
+    return onset_results(onset_params, compute=False) is not None and (
+        cess_params is None or cess_results(cess_params, compute=False) is not None
+    )
+
+
+def prefetch_results(qstring):
+    """Computes in the background the results the map of the tile
+    arguments in `qstring` needs."""
+    onset_params, cess_params = results_params(qstring)
+    onset_results(onset_params, compute="background")
+    if cess_params is not None:
+        cess_results(cess_params, compute="background")
+
+
+def results_map(qstring):
+    """Map of the tile arguments in `qstring` over the whole domain, from
+    the stored onset and cessation dates."""
+    parse_arg = partial(pingrid.parse_arg, qstring=qstring)
+    onset_params, cess_params = results_params(qstring)
+    onset_dates = onset_results(onset_params)
+    cess_dates = None if cess_params is None else cess_results(cess_params)
+    return seasonal_map(
+        parse_arg("map_choice"), onset_dates, cess_dates, onset_params[2],
+        parse_arg("prob_exc_thresh_onset", int),
+        parse_arg("prob_exc_thresh_length", int),
+    ).load()
+
+
+def precompute_defaults():
+    """Computes and stores the results of the default analysis parameters,
+    so that the server processes read them rather than compute them. See
+    precompute_onset.py."""
+    defaults = layout.DEFAULTS
+    onset_results((
+        defaults["search_start_day"],
+        calc.strftimeb2int(defaults["search_start_month"]),
+        defaults["search_days"],
+        defaults["wet_thresh"],
+        defaults["wet_spell_length"],
+        defaults["wet_spell_thresh"],
+        defaults["min_wet_days"],
+        defaults["dry_spell_length"],
+        defaults["dry_spell_search"],
+    ))
+    if CONFIG["ison_cess_date_hist"]:
+        cess_results((
+            defaults["cess_start_day"],
+            calc.strftimeb2int(defaults["cess_start_month"]),
+            defaults["cess_search_days"],
+            defaults["cess_soil_moisture"],
+            defaults["cess_dry_spell"],
+        ))
+
+
 @APP.callback(
     Output("colorbar", "colorscale"),
     Output("colorbar", "max"),
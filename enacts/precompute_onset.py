@@ -0,0 +1,19 @@
+"""Precomputes the results of the Growing Season maproom.
+
+Computes the onset dates, and the cessation dates if the maproom shows them,
+of the maproom's default analysis parameters, and stores them in its
+`results_path`, where all the server processes find them. Run it after each
+update of the daily rainfall Zarr store, e.g.:
+
+    CONFIG=config.yaml python precompute_onset.py
+"""
+from globals_ import GLOBAL_CONFIG
+
+
+if __name__ == "__main__":
+    ONSET_CONFIG = GLOBAL_CONFIG["maprooms"].get("onset")
+    if ONSET_CONFIG is None or ONSET_CONFIG.get("results_path") is None:
+        raise Exception("maprooms.onset.results_path is not configured")
+    from onset import maproom
+    maproom.precompute_defaults()
+    print(f"stored results in {ONSET_CONFIG['results_path']}")
@@ -0,0 +1,244 @@
+"""Run-length encoding of flagged data.
+
+A flagged DataArray (e.g. dry days) is encoded once into its runs, that is
+the series of consecutive equal flags along a dimension, each described by
+its grid cell, start and length. Run statistics are then computed from the
+runs only, and runs of both flag values (e.g. dry and wet spells) come from
+the same encoding. The data are encoded by blocks of cells, so that
+temporaries scale with the block; the runs take 13 bytes each, which is less
+than the data for typical spells of days, but as much for flags alternating
+at every point.
+"""
+import numpy as np
+import xarray as xr
+
+
+def encode(flagged_data, dim="T", skipna=False, block_size=2**22):
+    """Encode the runs of flags of `flagged_data` along `dim` .
+
+    Parameters
+    ----------
+    flagged_data : DataArray
+        Array of flags (booleans, or 0s and 1s).
+    dim : str, optional
+        Dimension of `flagged_data` along which to find runs (default `dim` ="T").
+    skipna : bool, optional
+        If True, missing values neither break nor extend runs, as if they
+        were dropped. Otherwise (default) they are unflagged.
+    block_size : int, optional
+        Approximate number of values of `flagged_data` loaded and encoded at
+        once.
+
+    Returns
+    -------
+    runs : Dataset
+        Runs sorted by grid cell and start, along a run dimension, with variables:
+        cell, the flat index of the grid cell of the run (over the dims of
+        `flagged_data` other than `dim` , in their order);
+        start, the position along `dim` of the first point of the run;
+        length, the number of points of the run;
+        flag, the flag of the run.
+        Coordinates of `flagged_data` are kept to build the results of queries.
+
+    See Also
+    --------
+    longest, count, mean_length, first_after
+
+    Examples
+    --------
+    >>> import pandas as pd
+    >>> import xarray as xr
+    >>> t = pd.date_range(start="2000-05-01", end="2000-05-08", freq="1D")
+    >>> flags = xr.DataArray([0, 1, 1, 0, 1, 1, 1, 0], dims=["T"], coords={"T": t})
+    >>> runs = encode(flags)
+    >>> runs["length"].values.tolist()
+    [1, 2, 1, 3, 1]
+    >>> int(longest(runs))
+    3
+    """
+    cell_dims = [d for d in flagged_data.dims if d != dim]
+    data = flagged_data.transpose(*cell_dims, dim)
+    cell_shape = data.shape[:-1]
+    n = data.shape[-1]
+    # Blocks are rows of the first cell dimension
+    rows = cell_shape[0] if cell_dims else 1
+    row_cells = int(np.prod(cell_shape[1:], dtype=int))
+    step = max(1, block_size // max(row_cells * n, 1))
+    blocks = []
+    for row in range(0, rows, step):
+        block = data[row:row + step] if cell_dims else data
+        blocks.append(_encode_block(
+            np.asarray(block.values).reshape(-1, n), row * row_cells, skipna
+        ))
+    cell, start, length, flag = (np.concatenate(b) for b in zip(*blocks))
+    return xr.Dataset(
+        {
+            "cell": ("run", cell),
+            "start": ("run", start),
+            "length": ("run", length),
+            "flag": ("run", flag),
+        },
+        coords=flagged_data.coords,
+        attrs={"dim": dim, "cell_dims": cell_dims, "cell_shape": cell_shape},
+    )
+
+
+def _encode_block(values, first_cell, skipna):
+    """Runs of `values` , flags of cells along rows, numbering cells from
+    `first_cell` ."""
+    ncells, n = values.shape
+    missing = np.isnan(values) if values.dtype.kind == "f" else None
+    flags = values != 0
+    if missing is not None:
+        flags &= ~missing
+    if skipna and missing is not None:
+        cell, position = np.nonzero(~missing)
+        flags = flags[~missing]
+    else:
+        cell = np.repeat(np.arange(ncells), n)
+        position = np.tile(np.arange(n), ncells)
+        flags = flags.reshape(-1)
+    # Points of all cells one after the other, in order along the dimension
+    run_start = np.ones(flags.shape, dtype=bool)
+    run_start[1:] = (flags[1:] != flags[:-1]) | (cell[1:] != cell[:-1])
+    first = np.flatnonzero(run_start)
+    return (
+        (cell[first] + first_cell).astype(np.int32),
+        position[first].astype(np.int32),
+        np.diff(first, append=flags.size).astype(np.int32),
+        flags[first],
+    )
+
+
+def _selected(runs, flag, min_length):
+    """Mask of the runs of `flag` at least `min_length` long."""
+    return (runs["flag"].values == flag) & (runs["length"].values >= min_length)
+
+
+def _cell_array(runs, values, name):
+    """DataArray of `values` by flat cell index, on the grid of `runs` ."""
+    cell_dims = runs.attrs["cell_dims"]
+    return xr.DataArray(
+        values.reshape(runs.attrs["cell_shape"]),
+        dims=cell_dims,
+        coords={
+            k: v for k, v in runs.coords.items()
+            if set(v.dims) <= set(cell_dims)
+        },
+        name=name,
+    )
+
+
+def _ncells(runs):
+    return int(np.prod(runs.attrs["cell_shape"], dtype=int))
+
+
+def longest(runs, flag=True):
+    """Length of the longest run of `flag` of each grid cell, 0 if none.
+
+    Parameters
+    ----------
+    runs : Dataset
+        Runs as returned by `encode` .
+    flag : bool, optional
+        Flag of the runs (default `flag` =True).
+
+    Returns
+    -------
+    DataArray
+    """
+    selected = _selected(runs, flag, 1)
+    cell = runs["cell"].values[selected]
+    values = np.zeros(_ncells(runs), dtype=int)
+    if cell.size != 0:
+        # Runs are sorted by cell
+        cells, first = np.unique(cell, return_index=True)
+        values[cells] = np.maximum.reduceat(runs["length"].values[selected], first)
+    return _cell_array(runs, values, "longest")
+
+
+def count(runs, flag=True, min_length=1):
+    """Number of runs of `flag` at least `min_length` long of each grid cell.
+
+    Parameters
+    ----------
+    runs : Dataset
+        Runs as returned by `encode` .
+    flag : bool, optional
+        Flag of the runs (default `flag` =True).
+    min_length : int, optional
+        Minimum length of the runs to count (default `min_length` =1).
+
+    Returns
+    -------
+    DataArray
+    """
+    selected = _selected(runs, flag, min_length)
+    values = np.bincount(runs["cell"].values[selected], minlength=_ncells(runs))
+    return _cell_array(runs, values, "count")
+
+
+def mean_length(runs, flag=True, min_length=1):
+    """Mean length of the runs of `flag` at least `min_length` long
+    of each grid cell, NaN if none.
+
+    Parameters
+    ----------
+    runs : Dataset
+        Runs as returned by `encode` .
+    flag : bool, optional
+        Flag of the runs (default `flag` =True).
+    min_length : int, optional
+        Minimum length of the runs to average (default `min_length` =1).
+
+    Returns
+    -------
+    DataArray
+    """
+    selected = _selected(runs, flag, min_length)
+    cell = runs["cell"].values[selected]
+    total = np.bincount(
+        cell, weights=runs["length"].values[selected], minlength=_ncells(runs)
+    )
+    number = np.bincount(cell, minlength=_ncells(runs))
+    values = np.full(total.shape, np.nan)
+    np.divide(total, number, out=values, where=number != 0)
+    return _cell_array(runs, values, "mean_length")
+
+
+def first_after(runs, date, flag=True, min_length=1):
+    """First run of `flag` at least `min_length` long starting on or after
+    `date` of each grid cell.
+
+    Parameters
+    ----------
+    runs : Dataset
+        Runs as returned by `encode` , along a datetime dimension.
+    date : datetime-like
+        Date from which to search runs.
+    flag : bool, optional
+        Flag of the runs (default `flag` =True).
+    min_length : int, optional
+        Minimum length of the runs (default `min_length` =1).
+
+    Returns
+    -------
+    Dataset
+        start, the date of the first point of the run, NaT if none,
+        and length, the length of the run, 0 if none.
+    """
+    dim_values = runs[runs.attrs["dim"]].values
+    selected = _selected(runs, flag, min_length) & (
+        runs["start"].values >= np.searchsorted(dim_values, np.datetime64(date))
+    )
+    cell = runs["cell"].values[selected]
+    # Runs are sorted by cell and start
+    cells, first = np.unique(cell, return_index=True)
+    start = np.full(_ncells(runs), np.datetime64("NaT"), dtype=dim_values.dtype)
+    start[cells] = dim_values[runs["start"].values[selected][first]]
+    length = np.zeros(_ncells(runs), dtype=int)
+    length[cells] = runs["length"].values[selected][first]
+    return xr.merge([
+        _cell_array(runs, start, "start"),
+        _cell_array(runs, length, "length"),
+    ])
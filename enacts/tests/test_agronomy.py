@@ -178,6 +178,44 @@ def test_spwba_findpd():
     assert (p_d[1] == precip["T"][0])
 
 
+def test_spwba_engines_match():
+    kc_periods = pd.TimedeltaIndex([0, 4, 5, 10, 10], unit="D")
+    kc_params = xr.DataArray(
+        data=[0.1, 0.5, 1., 1., 0.25], dims=["kc_periods"], coords=[kc_periods]
+    )
+    planting_date = xr.DataArray(
+        pd.DatetimeIndex(data=["2000-05-02", "2000-05-20"]),
+        dims=["X"], coords={"X": [0, 1]}
+    )
+    t = pd.date_range(start="2000-05-01", end="2000-06-30", freq="1D")
+    precip = xr.DataArray(
+        np.abs(np.sin(np.arange(t.size * 2)) * 15).reshape(2, t.size),
+        dims=["X", "T"], coords={"X": [0, 1], "T": t},
+    )
+    taw = xr.DataArray([60, 40], dims=["Y"], coords={"Y": [0, 1]})
+    # planting date search needs sminit to have all dims
+    sminit = (taw / 6).broadcast_like(precip.isel(T=0, drop=True))
+    for params in [
+        {},
+        {"rho_crop": 1/3},
+        {"kc_params": kc_params, "planting_date": planting_date},
+        {"kc_params": kc_params, "planting_date": planting_date, "rho_crop": 1/3},
+        {"kc_params": kc_params, "planting_date": planting_date, "rho_crop": 0.7, "rho_adj": True},
+        {"kc_params": kc_params, "sm_threshold": 30, "rho_crop": 0.7, "rho_adj": True},
+    ]:
+        spwb_xarray = agronomy.soil_plant_water_balance(
+            precip, et=5, taw=taw, sminit=sminit, engine="xarray", **params
+        )
+        spwb_numpy = agronomy.soil_plant_water_balance(
+            precip, et=5, taw=taw, sminit=sminit, engine="numpy", n_workers=2, **params
+        )
+        for var_xarray, var_numpy in zip(spwb_xarray, spwb_numpy):
+            if var_xarray is None:
+                assert var_numpy is None
+            else:
+                xr.testing.assert_identical(var_xarray, var_numpy)
+
+
 def test_antedecedent_precip_ind():
     t = pd.date_range(start="2000-05-01", end="2000-05-07", freq="1D")
     x = xr.DataArray(
@@ -192,6 +230,24 @@ def test_antedecedent_precip_ind():
     assert np.allclose(api, [[7, 1/6 + 1/5 + 1/4 + 1/3 + 1/2 + 1 + 1/2 ]])
 
 
+def test_api_time_blocks():
+    t = pd.date_range(start="2000-05-01", end="2000-05-20", freq="1D")
+    precip = xr.DataArray(
+        np.random.default_rng(0).gamma(0.6, 12, (2, t.size)),
+        dims=["X", "T"],
+        coords={"X": [0, 1], "T": t},
+    )
+    precip[0, 5] = np.nan
+    api = agronomy.antecedent_precip_ind(precip, 5)
+
+    assert (api["T"] == t[4:]).all()
+    assert np.isnan(api[0, 1:6]).all()
+    for time_block in [1, 3, 7]:
+        xr.testing.assert_allclose(
+            agronomy.antecedent_precip_ind(precip, 5, time_block=time_block), api
+        )
+
+
 def test_api_runoff():
     t = pd.date_range(start="2000-05-01", end="2000-05-05", freq="1D")
     precip = xr.DataArray(np.arange(5), dims=["T"], coords={"T": t})
@@ -208,6 +264,37 @@ def test_api_runoff():
     assert np.allclose(runoff, [0, 1 + 1*2 + 1*2**2, 1 + 2*3 + 3*3**2, -2 + 0*4 + 1*4**2])
 
 
+def test_api_runoff_aligns_api():
+    t = pd.date_range(start="2000-05-01", end="2000-06-30", freq="1D")
+    precip = xr.DataArray(np.arange(t.size) % 30., dims=["T"], coords={"T": t})
+    api = agronomy.antecedent_precip_ind(precip, 5)
+    runoff = agronomy.api_runoff(precip[35:], api)
+
+    xr.testing.assert_identical(runoff["T"], precip["T"][35:])
+    xr.testing.assert_equal(runoff, agronomy.api_runoff(precip[35:], api[31:]))
+
+
+def test_api_runoff_keeps_coords():
+    t = pd.date_range(start="2000-05-01", end="2000-05-06", freq="1D")
+    precip = xr.DataArray(
+        [[0., 20, 30, 40, np.nan, 50], [10, 10, 20, 20, 20, 20]],
+        dims=["X", "T"],
+        coords={"X": [1, 2], "T": t},
+    )
+    api = agronomy.antecedent_precip_ind(precip, 2)
+    runoff = agronomy.api_runoff(precip[:, 1:], api)
+    expected = np.polynomial.polynomial.polyval(
+        precip[:, 1:], agronomy.DEFAULT_API_POLYNOMIALS[2]
+    )
+
+    xr.testing.assert_identical(runoff["T"], precip["T"][1:])
+    assert (runoff["X"] == [1, 2]).all()
+    # API of 20 falls in the third category
+    assert np.isclose(runoff[1, 1], expected[1, 1])
+    assert np.isnan(runoff[0, 3])
+    assert runoff[1, 0] == 0
+
+
 def test_solar_radiation():
     t = xr.DataArray(
         pd.date_range(start="2000-06-21", end="2000-12-21", freq="7D"),
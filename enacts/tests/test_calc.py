@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 import pandas as pd
 import xarray as xr
 import calc
@@ -64,6 +65,20 @@ def test_longest_run_length_where_first_is_flagged():
     assert lds == 55
 
 
+def test_longest_run_length_missing_values():
+
+    t = pd.date_range(start="2000-05-01", end="2000-05-07", freq="1D")
+    data_cond = xr.DataArray(
+        [[1, 1, np.nan, 1, 1, 0, 0],
+         [1, np.nan, np.nan, np.nan, np.nan, np.nan, 1]],
+        dims=["X", "T"],
+        coords={"X": [0, 1], "T": t},
+    )
+    lds = calc.longest_run_length(data_cond, "T")
+
+    assert (lds == [4, 2]).all()
+
+
 def test_longest_run_length_coord_size_1():
 
     data_cond = (precip_sample()[0] > 0) * 1
@@ -106,6 +121,24 @@ def test_following_dry_spell_length_heading_wet_and_tailing_dry():
     assert np.array_equal(dsl, expected)
 
 
+def test_calendar_index():
+
+    t = pd.date_range(start="2000-01-01", end="2002-12-31", freq="1D")
+    precip = xr.DataArray(np.arange(t.size), dims=["T"], coords={"T": t})
+    calendar = calc.calendar_index(precip["T"])
+
+    # Memoized for the time index of precip
+    assert calc.calendar_index(precip["T"]) is calendar
+    assert calc.calendar_index(precip.to_dataset(name="p")["T"]) is calendar
+    assert (calendar.dayofyear[[0, 365, 366]] == [1, 366, 1]).all()
+    assert (t[calendar.positions(1, 3)] == pd.to_datetime(
+        ["2000-03-01", "2001-03-01", "2002-03-01"]
+    )).all()
+    assert (t[calendar.positions(1, 3, offset=-1)] == pd.to_datetime(
+        ["2000-02-29", "2001-02-28", "2002-02-28"]
+    )).all()
+
+
 def test_sel_day_and_month_1yr():
 
     precip = precip_sample()
@@ -311,6 +344,48 @@ def test_daily_tobegroupedby_season_picks_right_end_dates():
     ).all()
 
 
+def test_season_index():
+
+    precip = data_test_calc.multi_year_data_sample()
+    starts, stops, start_edges, end_edges = calc.season_index(
+        precip["T"], 29, 11, 29, 2
+    )
+    dts = calc.daily_tobegroupedby_season(precip, 29, 11, 29, 2)
+
+    assert (precip["T"][starts] == start_edges).all()
+    assert (precip["T"][stops - 1] == end_edges).all()
+    assert (stops - starts).sum() == dts["T"].size
+
+
+def test_seasonal_sum_matches_groupby():
+
+    precip = data_test_calc.multi_year_data_sample()
+    precip[10:40] = np.nan
+    dts = calc.daily_tobegroupedby_season(precip, 29, 11, 29, 2)
+    for min_count in [None, 60]:
+        expected = (
+            dts[precip.name]
+            .groupby(dts["seasons_starts"])
+            .sum(dim="T", skipna=True, min_count=min_count)
+        )
+        summed = calc.seasonal_sum(precip, 29, 11, 29, 2, min_count=min_count)
+
+        xr.testing.assert_allclose(summed[precip.name], expected)
+
+
+def test_seasonal_sum_stays_lazy():
+
+    precip = data_test_calc.multi_year_data_sample()
+    precip[10:40] = np.nan
+    summed = calc.seasonal_sum(precip, 29, 11, 29, 2, min_count=60)
+    lazy = calc.seasonal_sum(
+        precip.chunk({"T": 100}), 29, 11, 29, 2, min_count=60
+    )
+
+    assert lazy[precip.name].chunks is not None
+    xr.testing.assert_allclose(lazy.compute(), summed)
+
+
 def test_seasonal_onset_date_keeps_returning_same_outputs():
 
     precip = data_test_calc.multi_year_data_sample()
@@ -870,3 +945,79 @@ def test_probExceed():
         0.000000,
     ]
     assert np.allclose(cumsum.probExceed, probExceed_values)
+
+
+def precip_cells():
+    """Two cells of rainfall, the second one being that of `precip_sample`
+    reversed in time, and the first one having missing values."""
+    precip = xr.concat(
+        [precip_sample(), precip_sample()[::-1].assign_coords(T=precip_sample()["T"])],
+        dim="X",
+    )
+    precip[0, 10:20] = np.nan
+    return precip
+
+
+ET = xr.DataArray([5, 4], dims=["X"])
+TAW = xr.DataArray([60, 30, 45], dims=["Y"])
+
+
+@pytest.mark.parametrize("func, numpy_kwargs", [
+    pytest.param(
+        lambda precip, **kwargs: calc.following_dry_spell_length(
+            precip, 1, **kwargs
+        ),
+        [{"time_block": time_block} for time_block in [None, 1, 7]],
+        id="following_dry_spell_length",
+    ),
+    pytest.param(
+        lambda precip, **kwargs: calc.water_balance(
+            precip.transpose("X", "T"), ET, TAW, 10, **kwargs
+        ),
+        [{}],
+        id="water_balance",
+    ),
+    pytest.param(
+        lambda precip, **kwargs: calc.water_balance(
+            precip.transpose("X", "T"), ET, TAW, 10, reduce=True, **kwargs
+        ),
+        [{}],
+        id="water_balance_reduce",
+    ),
+    pytest.param(
+        lambda precip, **kwargs: calc.cess_date_from_rain(
+            precip, 5, 3, ET, TAW, 10, **kwargs
+        ),
+        [{}],
+        id="cess_date_from_rain",
+    ),
+    pytest.param(
+        lambda precip, **kwargs: calc.cess_date_from_sm(
+            calc.water_balance(precip, ET, TAW, 10).soil_moisture, 5, 3, **kwargs
+        ),
+        [{}],
+        id="cess_date_from_sm",
+    ),
+] + [
+    pytest.param(
+        lambda precip, dry_spell_search=dry_spell_search, **kwargs: calc.onset_date(
+            precip, 1, 3, 20, 1, 7, dry_spell_search, **kwargs
+        ),
+        [{"time_chunk": time_chunk} for time_chunk in [None, 1, 10]],
+        id=f"onset_date_{dry_spell_search}",
+    )
+    for dry_spell_search in [0, 5, 21]
+])
+def test_engines_match(func, numpy_kwargs):
+
+    expected = func(precip_cells(), engine="xarray")
+    for kwargs in numpy_kwargs:
+        xr.testing.assert_identical(
+            func(precip_cells(), engine="numpy", **kwargs), expected
+        )
+
+
+def test_unknown_engine():
+
+    with pytest.raises(ValueError, match="engine must be numpy or xarray"):
+        calc.following_dry_spell_length(precip_sample(), 1, engine="dask")
@@ -0,0 +1,168 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import calc
+import enactstozarr
+import pingrid
+
+
+X = np.arange(33, 33.15, 0.0375)
+Y = np.arange(3, 3.1125, 0.0375)
+CHUNKS = {"T": 4, "X": 2, "Y": 2}
+
+
+def write_file(input_path, date, value):
+    """Writes an ENACTS-like daily file of `value` plus the cell number."""
+    values = value + np.arange(Y.size * X.size, dtype=float).reshape(Y.size, X.size)
+    xr.Dataset(
+        {"precip": (["Lat", "Lon"], values)},
+        coords={"Lat": Y, "Lon": X},
+    ).to_netcdf(
+        input_path / f"rr_mrg_{pd.Timestamp(date):%Y%m%d}_ALL.nc", engine="scipy"
+    )
+
+
+def expected(values):
+    """Store content for dates: values (None for no file)."""
+    t = pd.DatetimeIndex(list(values))
+    return xr.DataArray(
+        [
+            np.full((Y.size, X.size), np.nan) if v is None
+            else v + np.arange(Y.size * X.size, dtype=float).reshape(Y.size, X.size)
+            for v in values.values()
+        ],
+        dims=["T", "Y", "X"],
+        coords={"T": t, "Y": Y, "X": X},
+        name="precip",
+    )
+
+
+def ingest(input_path, output_path):
+    return enactstozarr.ingest(input_path, output_path, "precip", chunks=CHUNKS)
+
+
+def test_ingest(tmp_path):
+    input_path = tmp_path / "nc"
+    input_path.mkdir()
+    output_path = tmp_path / "precip.zarr"
+    days = pd.date_range("2000-01-01", "2000-01-11")
+    values = {d: None for d in days[:6]}
+    for d in days[:6]:
+        if d != days[3]:
+            write_file(input_path, d, d.day)
+            values[d] = d.day
+    ingest(input_path, output_path)
+    store = calc.read_zarr_data(output_path).precip
+    xr.testing.assert_equal(store, expected(values))
+    assert store.encoding["chunks"] == (4, 2, 2)
+
+    # Fills the missing date in place, and appends from the middle of the
+    # last chunk
+    for d in [days[3], *days[6:]]:
+        write_file(input_path, d, 100 + d.day)
+        values[d] = 100 + d.day
+    ingest(input_path, output_path)
+    xr.testing.assert_equal(calc.read_zarr_data(output_path).precip, expected(values))
+
+    # A file that changed is ingested again
+    write_file(input_path, days[1], 200)
+    values[days[1]] = 200
+    st = os.stat(input_path / "rr_mrg_20000102_ALL.nc")
+    os.utime(
+        input_path / "rr_mrg_20000102_ALL.nc",
+        ns=(st.st_atime_ns, st.st_mtime_ns + 10**9),
+    )
+    ingest(input_path, output_path)
+    xr.testing.assert_equal(calc.read_zarr_data(output_path).precip, expected(values))
+    manifest = enactstozarr.read_manifest(output_path)
+    assert manifest["length"] == days.size
+    assert len(manifest["files"]) == days.size
+
+
+def test_ingest_off_axis(tmp_path, capsys):
+    input_path = tmp_path / "nc"
+    input_path.mkdir()
+    output_path = tmp_path / "precip.zarr"
+    for d in pd.date_range("2000-01-10", "2000-01-15"):
+        write_file(input_path, d, d.day)
+    ingest(input_path, output_path)
+    write_file(input_path, "2000-01-05", 5)
+    ingest(input_path, output_path)
+    ingest(input_path, output_path)
+    out = capsys.readouterr().out
+    assert out.count("rr_mrg_20000105_ALL.nc") == 2
+    assert "rr_mrg_20000105_ALL.nc" not in (
+        enactstozarr.read_manifest(output_path)["files"]
+    )
+    assert calc.read_zarr_data(output_path)["T"].size == 6
+
+
+def test_ingest_append_chunks(tmp_path):
+    input_path = tmp_path / "nc"
+    input_path.mkdir()
+    output_path = tmp_path / "precip.zarr"
+    days = pd.date_range("2000-01-01", "2000-01-20")
+    for d in days[:5]:
+        write_file(input_path, d, d.day)
+    ingest(input_path, output_path)
+    for d in days[5:]:
+        write_file(input_path, d, d.day)
+    ingest(input_path, output_path)
+    xr.testing.assert_equal(
+        calc.read_zarr_data(output_path).precip,
+        expected({d: d.day for d in days}),
+    )
+
+
+def test_copies_updated_in_place(tmp_path, capsys):
+    input_path = tmp_path / "nc"
+    input_path.mkdir()
+    output_path = tmp_path / "precip.zarr"
+    days = pd.date_range("2000-01-01", "2000-01-12")
+    for d in days[:6]:
+        if d != days[2]:
+            write_file(input_path, d, d.day)
+    ingest(input_path, output_path)
+    enactstozarr.write_overviews(output_path, 2, chunks=CHUNKS)
+    enactstozarr.write_timeseries(output_path, {"X": 2, "Y": 2})
+    for d in [days[2], *days[6:]]:
+        write_file(input_path, d, 100 + d.day)
+    ingest(input_path, output_path)
+    capsys.readouterr()
+    enactstozarr.write_overviews(output_path, 2, chunks=CHUNKS)
+    enactstozarr.write_timeseries(output_path, {"X": 2, "Y": 2})
+    out = capsys.readouterr().out
+    assert "updating 2 overview levels from 10 steps" in out
+    assert "updating time series copy from 10 steps" in out
+
+    store = calc.read_zarr_data(output_path)
+    level = store
+    for k in [1, 2]:
+        level = pingrid.coarsen_overview(level, 2)
+        overview = xr.open_zarr(pingrid.overview_path(output_path), group=str(k))
+        xr.testing.assert_allclose(overview.precip, level.precip)
+        assert overview.attrs["stamp"] == pingrid.path_stamp(output_path)
+    timeseries = xr.open_zarr(pingrid.timeseries_path(output_path))
+    xr.testing.assert_equal(timeseries.precip, store.precip)
+    assert timeseries.precip.encoding["chunks"] == (6, 2, 2)
+    assert pingrid.open_timeseries(output_path).attrs["stamp"] == (
+        pingrid.path_stamp(output_path)
+    )
+
+    # Without a record of the changes, the copies are rebuilt
+    os.remove(enactstozarr.manifest_path(output_path))
+    shutil.rmtree(output_path)
+    write_file(input_path, days[0], 300)
+    enactstozarr.convert(input_path, output_path, "precip", chunks=CHUNKS)
+    capsys.readouterr()
+    enactstozarr.write_timeseries(output_path, {"X": 2, "Y": 2})
+    assert "writing time series copy" in capsys.readouterr().out
+    xr.testing.assert_equal(
+        xr.open_zarr(pingrid.timeseries_path(output_path)).precip,
+        calc.read_zarr_data(output_path).precip,
+    )
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+import run_length
+
+
+def flags_sample():
+    t = pd.date_range(start="2000-05-01", end="2000-05-10", freq="1D")
+    return xr.DataArray(
+        [[0, 1, 1, 0, 1, 1, 1, 0, 0, 1],
+         [1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+         [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]],
+        dims=["X", "T"],
+        coords={"X": [10, 20, 30], "T": t},
+    )
+
+
+def test_encode():
+
+    runs = run_length.encode(flags_sample())
+
+    assert (runs["cell"] == [0, 0, 0, 0, 0, 0, 1, 2]).all()
+    assert (runs["start"] == [0, 1, 3, 4, 7, 9, 0, 0]).all()
+    assert (runs["length"] == [1, 2, 1, 3, 2, 1, 10, 10]).all()
+    assert (runs["flag"] == [0, 1, 0, 1, 0, 1, 1, 0]).all()
+
+
+def test_encode_missing_values():
+
+    flags = flags_sample().astype(float)
+    flags[0, 3] = np.nan
+    runs = run_length.encode(flags)
+    runs_skipna = run_length.encode(flags, skipna=True)
+
+    assert (run_length.longest(runs) == [3, 10, 0]).all()
+    assert (run_length.longest(runs_skipna) == [5, 10, 0]).all()
+    assert (runs_skipna["length"].sum() == flags.count()).all()
+
+
+def test_encode_blocks():
+
+    runs = run_length.encode(flags_sample())
+    runs_blocks = run_length.encode(flags_sample(), block_size=10)
+
+    xr.testing.assert_identical(runs, runs_blocks)
+    assert runs["length"].dtype == np.int32
+
+
+def test_longest():
+
+    runs = run_length.encode(flags_sample())
+
+    assert (run_length.longest(runs) == [3, 10, 0]).all()
+    assert (run_length.longest(runs, flag=False) == [2, 0, 10]).all()
+    assert (run_length.longest(runs)["X"] == [10, 20, 30]).all()
+
+
+def test_count():
+
+    runs = run_length.encode(flags_sample())
+
+    assert (run_length.count(runs) == [3, 1, 0]).all()
+    assert (run_length.count(runs, min_length=2) == [2, 1, 0]).all()
+    assert (run_length.count(runs, flag=False, min_length=2) == [1, 0, 1]).all()
+
+
+def test_mean_length():
+
+    runs = run_length.encode(flags_sample())
+    mean_length = run_length.mean_length(runs)
+
+    assert np.array_equal(mean_length, [2, 10, np.nan], equal_nan=True)
+
+
+def test_first_after():
+
+    runs = run_length.encode(flags_sample())
+    first = run_length.first_after(runs, "2000-05-03", min_length=2)
+
+    assert np.array_equal(
+        first["start"],
+        pd.to_datetime(["2000-05-05", "NaT", "NaT"]),
+        equal_nan=True,
+    )
+    assert (first["length"] == [3, 0, 0]).all()
+
+
+def test_encode_2d():
+
+    flags = xr.concat([flags_sample(), 1 - flags_sample()], dim="Y")
+    runs = run_length.encode(flags)
+    longest = run_length.longest(runs)
+
+    assert longest.dims == ("Y", "X")
+    assert (longest == [[3, 10, 0], [2, 0, 10]]).all()
@@ -15,6 +15,7 @@ import pandas as pd
 import numpy as np
 import urllib
 import datetime
+from functools import partial
 
 import xarray as xr
 import agronomy as ag
@@ -25,17 +26,16 @@ import shapely
 from shapely import wkb
 from shapely.geometry.multipolygon import MultiPolygon
 
-from globals_ import GLOBAL_CONFIG, FLASK
+from globals_ import GLOBAL_CONFIG, FLASK, TILE_CACHE, TILE_RENDERER
 CONFIG = GLOBAL_CONFIG["maprooms"]["wat_bal"]
 
 PFX = f'{GLOBAL_CONFIG["url_path_prefix"]}/{CONFIG["core_path"]}'
 
 TILE_PFX = f"{PFX}/tile"
 
-with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-    s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
-    df = pd.read_sql(s, conn)
-    clip_shape = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))[0]
+s = sql.Composed([sql.SQL(GLOBAL_CONFIG['datasets']['shapes_adm'][0]['sql'])])
+df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
+clip_shape = df["the_geom"][0]
 
 # Reads daily data
 
@@ -52,6 +52,9 @@ RESOLUTION = rr_mrg['X'][1].item() - rr_mrg['X'][0].item()
 # The longest possible distance between a point and the center of the
 # grid cell containing that point.
 
+# TAW on the grid of the daily data or of its overviews, by coarsening factor
+TAW_LEVELS = pingrid.FieldCache()
+
 API_WINDOW = 7
 STD_TIME_FORMAT = "%Y-%m-%d"
 HUMAN_TIME_FORMAT = "%-d %b %Y"
@@ -74,24 +77,21 @@ APP.layout = layout_monit.app_layout()
 
 
 def adm_borders(shapes):
-    with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-        s = sql.Composed(
-            [
-                sql.SQL("with g as ("),
-                sql.SQL(shapes),
-                sql.SQL(
-                    """
-                    )
-                    select
-                        g.label, g.key, g.the_geom
-                    from g
-                    """
-                ),
-            ]
-        )
-        df = pd.read_sql(s, conn)
-
-    df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
+    s = sql.Composed(
+        [
+            sql.SQL("with g as ("),
+            sql.SQL(shapes),
+            sql.SQL(
+                """
+                )
+                select
+                    g.label, g.key, g.the_geom
+                from g
+                """
+            ),
+        ]
+    )
+    df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
     df["the_geom"] = df["the_geom"].apply(
         lambda x: x if isinstance(x, MultiPolygon) else MultiPolygon([x])
     )
@@ -276,7 +276,13 @@ def write_map_title(map_choice, crop_name):
     Input("map_choice", "value"),
 )
 def write_map_description(map_choice):
-    return CONFIG["map_text"][map_choice]["description"]    
+    description = CONFIG["map_text"][map_choice]["description"]
+    if CONFIG["overview_analysis"]:
+        description += (
+            " When zoomed out, the map is computed from rainfall averaged"
+            " over blocks of grid cells, which only approximates the water balance."
+        )
+    return description
 
 
 @APP.callback(
@@ -502,10 +508,10 @@ def wat_bal_plots(
     lat = marker_pos[0]
     lng = marker_pos[1]
     try:
-        taw = pingrid.sel_snap(xr.open_dataarray(Path(CONFIG["taw_file"])), lat, lng)
+        taw = pingrid.sel_snap(pingrid.DATASETS.open_dataarray(Path(CONFIG["taw_file"])), lat, lng)
     except KeyError:
         return pingrid.error_fig(error_msg="Grid box out of data domain")
-    precip = pingrid.sel_snap(rr_mrg.precip, lat, lng)
+    precip = pingrid.sel_snap(pingrid.open_timeseries(RR_MRG_ZARR).precip, lat, lng)
     if np.isnan(precip).all():
         return pingrid.error_fig(error_msg="Data missing at this location")
 
@@ -600,8 +606,18 @@ def wat_bal_plots(
 
 
 @FLASK.route(f"{TILE_PFX}/<int:tz>/<int:tx>/<int:ty>")
+@pingrid.cached_tile(
+    TILE_CACHE,
+    stamp=lambda: pingrid.path_stamp(
+        RR_MRG_ZARR, pingrid.overview_path(RR_MRG_ZARR), CONFIG["taw_file"]
+    ),
+)
 def wat_bal_tile(tz, tx, ty):
-    parse_arg = pingrid.parse_arg
+    return pingrid.render_tile(TILE_RENDERER, render_wat_bal_tile, tz, tx, ty)
+
+
+def render_wat_bal_tile(qstring, tz, tx, ty):
+    parse_arg = partial(pingrid.parse_arg, qstring=qstring)
     map_choice = parse_arg("map_choice")
     the_date = parse_arg("the_date", str)
     planting_day = parse_arg("planting_day", int)
@@ -616,7 +632,15 @@ def wat_bal_tile(tz, tx, ty):
     kc_late_length = parse_arg("kc_late_length", int)
     kc_end = parse_arg("kc_end", float)
 
-    precip = rr_mrg.precip
+    # Zoomed out tiles are approximated from the coarsest overview that
+    # is still finer than the pixels, if there are overviews and
+    # overview_analysis is set. Otherwise the water balance is done at the
+    # data's resolution and the tiles average it over their pixels.
+    levels = pingrid.open_overviews(RR_MRG_ZARR)
+    if not CONFIG["overview_analysis"]:
+        levels = levels[:1]
+    precip = pingrid.select_overview(levels, tz).precip
+    res = precip['X'][1].item() - precip['X'][0].item()
 
     x_min = pingrid.tile_left(tx, tz)
     x_max = pingrid.tile_left(tx + 1, tz)
@@ -633,22 +657,17 @@ def wat_bal_tile(tz, tx, ty):
             y_min > precip['Y'].max() or
             y_max < precip['Y'].min()
     ):
-        return pingrid.image_resp(pingrid.empty_tile())
+        return pingrid.png_bytes(pingrid.empty_tile())
 
-    _, taw = xr.align(
-        precip,
-        xr.open_dataarray(Path(CONFIG["taw_file"])),
-        join="override",
-        exclude="T",
-    )
+    taw = taw_level(round(res / RESOLUTION))
     taw_tile = taw.sel(
-        X=slice(x_min - x_min % RESOLUTION, x_max + RESOLUTION - x_max % RESOLUTION),
-        Y=slice(y_min - y_min % RESOLUTION, y_max + RESOLUTION - y_max % RESOLUTION),
+        X=slice(x_min - x_min % res, x_max + res - x_max % res),
+        Y=slice(y_min - y_min % res, y_max + res - y_max % res),
     ).compute()
 
     precip_tile = precip.sel(
-        X=slice(x_min - x_min % RESOLUTION, x_max + RESOLUTION - x_max % RESOLUTION),
-        Y=slice(y_min - y_min % RESOLUTION, y_max + RESOLUTION - y_max % RESOLUTION),
+        X=slice(x_min - x_min % res, x_max + res - x_max % res),
+        Y=slice(y_min - y_min % res, y_max + res - y_max % res),
     ).compute()
 
     sm, drainage, et_crop, et_crop_red, planting_date = wat_bal(
@@ -699,7 +718,26 @@ def wat_bal_tile(tz, tx, ty):
     map = map.rename(X="lon", Y="lat")
     map.attrs["scale_min"] = 0
     map.attrs["scale_max"] = map_max
-    return pingrid.tile(map, tx, ty, tz, clip_shape)
+    return pingrid.tile_png(map, tx, ty, tz, clip_shape, resampling="block-mean")
+
+
+def taw_level(factor):
+    """TAW on the grid of the daily data coarsened by `factor` , as its
+    overviews are, computed once per level."""
+    def compute():
+        _, taw = xr.align(
+            rr_mrg.precip,
+            pingrid.DATASETS.open_dataarray(Path(CONFIG["taw_file"])),
+            join="override",
+            exclude="T",
+        )
+        if factor > 1:
+            taw = pingrid.coarsen_overview(taw, factor)
+        return taw.load()
+
+    return TAW_LEVELS.get(
+        (factor, pingrid.path_stamp(CONFIG["taw_file"])), compute
+    )
 
 
 @APP.callback(
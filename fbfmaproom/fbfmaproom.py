@@ -5,6 +5,7 @@ import threading
 import time
 import io
 import datetime
+from functools import partial
 import urllib.parse
 import json
 import numpy as np
@@ -245,7 +246,7 @@ def open_data_array(
 ):
     path = data_path(cfg.path)
     try:
-        ds = xr.open_zarr(path, consolidated=False)
+        ds = pingrid.DATASETS.open_zarr(path, consolidated=False)
     except Exception as e:
         raise Exception(f"Couldn't open {path}") from e
     ds = ds.rename({
@@ -305,74 +306,91 @@ def year_label(midpoint, season_length):
     return label
 
 
+def shapes_query(country_key: str, mode: str) -> sql.Composed:
+    sc = CONFIG["countries"][country_key]["shapes"][int(mode)]
+    return sql.Composed(
+        [
+            sql.SQL("with g as ("),
+            sql.SQL(sc["sql"]),
+            sql.SQL(") select g.label, g.key, g.the_geom from g"),
+        ]
+    )
+
+
+def shapes_index(country_key: str, mode: str) -> pingrid.ShapeIndex:
+    return pingrid.SHAPES.index(CONFIG["db"], shapes_query(country_key, mode))
+
+
+def region_zones(country_key: str, mode: str, da: xr.DataArray) -> pingrid.Zones:
+    """Zones of the regions of a level on the grid of `da`, keyed by
+    region key."""
+    return pingrid.SHAPES.zones(
+        CONFIG["db"], shapes_query(country_key, mode),
+        da["lon"].values, da["lat"].values, all_touched=True,
+    )
+
+
 def geometry_containing_point(
     country_key: str, point: Tuple[float, float], mode: str
 ):
-    df = retrieve_vulnerability(country_key, mode, 2020)  # arbitrary year
     x, y = point
-    p = Point(x, y)
-    geom, attrs = None, None
-    for _, r in df.iterrows():
-        minx, miny, maxx, maxy = r["the_geom"].bounds
-        if minx <= x <= maxx and miny <= y <= maxy and r["the_geom"].contains(p):
-            geom = r["the_geom"]
-            attrs = {k: v for k, v in r.items() if k not in ("the_geom")}
-            break
+    r = shapes_index(country_key, mode).containing(x, y)
+    if r is None:
+        return None, None
+    geom = r["the_geom"]
+    attrs = {k: v for k, v in r.items() if k not in ("the_geom")}
     return geom, attrs
 
 
 def retrieve_vulnerability(
     country_key: str, mode: str, year: int
 ) -> pd.DataFrame:
+    s = vulnerability_query(country_key, mode)
+    df = pingrid.read_shapes(CONFIG["db"], s, params=dict(year=year))
+    return df
+
+
+def vulnerability_query(country_key: str, mode: str) -> sql.Composed:
     config = CONFIG["countries"][country_key]
     sc = config["shapes"][int(mode)]
     vuln_sql = sc.get(
         "vuln_sql",
         "select cast(null as int) as key, 0 as year, 0 as vuln where 1 = 2"
     )
-    with psycopg2.connect(**CONFIG["db"]) as conn:
-        s = sql.Composed(
-            [
-                sql.SQL("with v as ("),
-                sql.SQL(vuln_sql),
-                sql.SQL("), g as ("),
-                sql.SQL(sc["sql"]),
-                sql.SQL(
-                    """
-                    ), a as (
-                        select
-                            key,
-                            avg(vuln) as mean,
-                            stddev_pop(vuln) as stddev
-                        from v
-                        group by key
-                    )
+    s = sql.Composed(
+        [
+            sql.SQL("with v as ("),
+            sql.SQL(vuln_sql),
+            sql.SQL("), g as ("),
+            sql.SQL(sc["sql"]),
+            sql.SQL(
+                """
+                ), a as (
                     select
-                        g.label, g.key, g.the_geom,
-                        v.year,
-                        v.vuln as vulnerability,
-                        a.mean as mean,
-                        a.stddev as stddev,
-                        v.vuln / a.mean as normalized,
-                        coalesce(to_char(v.vuln,'999,999,999,999'),'N/A') as "Vulnerability",
-                        coalesce(to_char(a.mean,'999,999,999,999'),'N/A') as "Mean",
-                        coalesce(to_char(a.stddev,'999,999,999,999'),'N/A') as "Stddev",
-                        coalesce(to_char(v.vuln / a.mean,'999,990D999'),'N/A') as "Normalized"
-                    from (g left outer join a using (key))
-                        left outer join v on(g.key=v.key and v.year=%(year)s)
-                    """
-                ),
-            ]
-        )
-        # print(s.as_string(conn))
-        df = pd.read_sql(
-            s,
-            conn,
-            params=dict(year=year),
-        )
-    # print("bytes: ", sum(df.the_geom.apply(lambda x: len(x.tobytes()))))
-    df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
-    return df
+                        key,
+                        avg(vuln) as mean,
+                        stddev_pop(vuln) as stddev
+                    from v
+                    group by key
+                )
+                select
+                    g.label, g.key, g.the_geom,
+                    v.year,
+                    v.vuln as vulnerability,
+                    a.mean as mean,
+                    a.stddev as stddev,
+                    v.vuln / a.mean as normalized,
+                    coalesce(to_char(v.vuln,'999,999,999,999'),'N/A') as "Vulnerability",
+                    coalesce(to_char(a.mean,'999,999,999,999'),'N/A') as "Mean",
+                    coalesce(to_char(a.stddev,'999,999,999,999'),'N/A') as "Stddev",
+                    coalesce(to_char(v.vuln / a.mean,'999,990D999'),'N/A') as "Normalized"
+                from (g left outer join a using (key))
+                    left outer join v on(g.key=v.key and v.year=%(year)s)
+                """
+            ),
+        ]
+    )
+    return s
 
 
 def generate_tables(
@@ -407,8 +425,7 @@ def region_shape(mode, country_key, geom_key):
     else:
         config = CONFIG["countries"][country_key]
         base_query = config["shapes"][int(mode)]["sql"]
-        response = subquery_unique(base_query, geom_key, "the_geom")
-        shape = wkb.loads(response.tobytes())
+        shape = subquery_unique(base_query, geom_key, "the_geom")
     return shape
 
 
@@ -434,8 +451,7 @@ def subquery_unique(base_query, key, field):
             ).format(sql.Identifier(field)),
         ]
     )
-    with psycopg2.connect(**CONFIG["db"]) as conn:
-        df = pd.read_sql(query, conn, params={"key": key})
+    df = pingrid.read_shapes(CONFIG["db"], query, params={"key": key})
     if len(df) == 0:
         raise InvalidRequestError(f"invalid region {key}")
     assert len(df) == 1
@@ -531,27 +547,32 @@ def fundamental_table_data(country_key, table_columns,
     season_length = season_config["length"]
     target_month0 = season_config["target_month"]
 
+    shape = region_shape(mode, country_key, geom_key)
+
+    # Reduce each variable on its own grid, before combining them.
     forecast_ds = xr.Dataset(
         data_vars={
-            forecast_key: select_forecast(
-                country_key, forecast_key, issue_month0, target_month0,
-                freq=freq
-            ).rename({'target_date':"time"})
+            forecast_key: value_for_geom(
+                select_forecast(
+                    country_key, forecast_key, issue_month0, target_month0,
+                    freq=freq
+                ).rename({'target_date':"time"}),
+                country_key, mode, geom_key, shape,
+            )
             for forecast_key, col in table_columns.items()
             if col["type"] is ColType.FORECAST
         }
     )
-    shape = region_shape(mode, country_key, geom_key)
-
-    forecast_ds = value_for_geom(forecast_ds, country_key, geom_key, shape)
 
     obs_keys = [key for key, col in table_columns.items()
                 if col["type"] is ColType.OBS]
-    obs_ds = select_obs(country_key, obs_keys, target_month0)
     obs_ds = xr.merge(
         [
-            value_for_geom(da, country_key, geom_key, shape)
-            for da in obs_ds.data_vars.values()
+            value_for_geom(
+                select_obs(country_key, [obs_key], target_month0)[obs_key],
+                country_key, mode, geom_key, shape,
+            )
+            for obs_key in obs_keys
         ]
     )
 
@@ -570,8 +591,12 @@ def fundamental_table_data(country_key, table_columns,
     return main_ds
 
 
-def value_for_geom(ds, country_key, geom_key, shape):
-    if 'lon' in ds.coords:
+def value_for_geom(ds, country_key, mode, geom_key, shape):
+    if 'lon' in ds.coords and mode != "pixel":
+        zones = region_zones(country_key, mode, ds)
+        result = pingrid.zonal_stats(ds, zones, keys=[geom_key])["mean"]
+        result = result.squeeze("region", drop=True).rename(ds.name)
+    elif 'lon' in ds.coords:
         result = pingrid.average_over(ds, shape, all_touched=True)
     elif 'geom_key' in ds.coords:
         if geom_key in ds['geom_key']:
@@ -1269,11 +1294,8 @@ def borders(pathname, mode):
         shapes = []
     else:
         country_key = country(pathname)
-        # TODO We don't actually need vuln data, just reusing an existing
-        # query function as an expediency. Year is arbitrary. Optimize
-        # later.
         shapes = (
-            retrieve_vulnerability(country_key, mode, 2020)
+            shapes_index(country_key, mode).df
             ["the_geom"]
             .apply(shapely.geometry.mapping)
         )
@@ -1359,7 +1381,16 @@ def obs_tile(obs_key, tz, tx, ty, country_key, season_id, target_year):
 def vuln_tiles(tz, tx, ty, country_key, mode, year):
     im = produce_bkg_tile(Color(0, 0, 0, 0))
     if mode != "pixel":
-        df = retrieve_vulnerability(country_key, mode, year)
+        # Only draw the regions that intersect the tile
+        tile_box = box(
+            pingrid.tile_left(tx, tz), pingrid.tile_top_mercator(ty + 1, tz),
+            pingrid.tile_left(tx + 1, tz), pingrid.tile_top_mercator(ty, tz),
+        )
+        df = pingrid.SHAPES.index(
+            CONFIG["db"],
+            vulnerability_query(country_key, mode),
+            params=dict(year=year),
+        ).intersecting(tile_box)
         cfg = CONFIG["countries"][country_key]["datasets"]["vuln"]
         scale_min, scale_max = cfg["range"]
         shapes = [
@@ -1434,6 +1465,121 @@ def yaml_resp(data):
 
 @SERVER.route(f"{PFX}/trigger_check")
 def trigger_check():
+    check = parse_trigger_check(parse_arg)
+    shape = region_shape(check["mode"], check["country_key"], check["geom_key"])
+    data = select_trigger_data(check)
+    if 'lon' in data.coords:
+        data = value_for_geom(
+            data, check["country_key"], check["mode"], check["geom_key"], shape
+        )
+
+    return trigger_result(data.item(), check)
+
+
+@SERVER.route(f"{PFX}/trigger_check_batch", methods=["POST"])
+def trigger_check_batch():
+    """Evaluates many trigger checks in one request. The body is a JSON
+    object {"checks": [...]} where each check has the same fields as the
+    query arguments of trigger_check. Checks that share a dataset
+    selection are averaged over all their regions at once, with zonal
+    statistics for admin regions. The response
+    has one result per check, in order, which is either like the
+    response of trigger_check or {"error": ...}.
+    """
+    body = flask.request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("checks"), list):
+        raise InvalidRequestError(
+            'Request body must be a JSON object {"checks": [...]}'
+        )
+
+    results = [None] * len(body["checks"])
+    groups = {}
+    for i, c in enumerate(body["checks"]):
+        try:
+            check = parse_trigger_check(partial(pingrid.parse_json_arg, c))
+        except Exception as e:
+            results[i] = trigger_error(e)
+            continue
+        groups.setdefault(trigger_data_key(check), []).append((i, check))
+
+    for group in groups.values():
+        by_mode = {}
+        for i, check in group:
+            by_mode.setdefault(check["mode"], []).append((i, check))
+        try:
+            data = select_trigger_data(group[0][1])
+        except Exception as e:
+            error = trigger_error(e)
+            for i, _ in group:
+                results[i] = error
+            continue
+        for mode, mode_group in by_mode.items():
+            try:
+                values = iter(trigger_values(data, mode, mode_group, results))
+            except Exception as e:
+                error = trigger_error(e)
+                for i, _ in mode_group:
+                    if results[i] is None:
+                        results[i] = error
+                continue
+            for i, check in mode_group:
+                if results[i] is None:
+                    results[i] = trigger_result(float(next(values)), check)
+
+    return {"results": results}
+
+
+def trigger_values(data, mode, checks, results):
+    """Values of `data` over the regions of the (index, check) pairs
+    `checks` of `mode`, in order, skipping the checks whose region is
+    invalid, for which an error is set in `results` instead."""
+    valid = []
+    if mode == "pixel":
+        shapes = []
+        for i, check in checks:
+            try:
+                shapes.append(region_shape(mode, None, check["geom_key"]))
+            except Exception as e:
+                results[i] = trigger_error(e)
+                continue
+            valid.append(check)
+    else:
+        country_key = checks[0][1]["country_key"]
+        if "lon" in data.coords:
+            zones = region_zones(country_key, mode, data)
+            keys = set(zones.keys)
+        else:
+            keys = set(shapes_index(country_key, mode).df["key"])
+        for i, check in checks:
+            if check["geom_key"] in keys:
+                valid.append(check)
+            else:
+                results[i] = trigger_error(
+                    InvalidRequestError(f"invalid region {check['geom_key']}")
+                )
+    if len(valid) == 0:
+        return []
+    if "lon" not in data.coords:
+        return [data.item()] * len(valid)
+    if mode == "pixel":
+        return list(pingrid.average_over_many(data, shapes, all_touched=True).values)
+    return list(pingrid.zonal_stats(
+        data, zones, keys=[check["geom_key"] for check in valid]
+    )["mean"].values)
+
+
+def trigger_error(e):
+    """Result of a trigger check of trigger_check_batch that failed with
+    `e`. Errors that aren't the client's are logged."""
+    if isinstance(e, ClientSideError):
+        return {"error": e.to_dict()}
+    traceback.print_exc()
+    return {"error": {
+        "status": 500, "name": type(e).__name__, "message": str(e),
+    }}
+
+
+def parse_trigger_check(parse_arg):
     var = parse_arg("variable")
     country_key = parse_arg("country_key")
     mode = parse_arg("mode")
@@ -1445,7 +1591,9 @@ def trigger_check():
     bounds = parse_arg("bounds", default=None)
     region = parse_arg("region", default=None)
 
-    config = CONFIG["countries"][country_key]
+    config = CONFIG["countries"].get(country_key)
+    if config is None:
+        raise InvalidRequestError(f"Unknown country {country_key}")
     if var in config["datasets"]["forecasts"]:
         var_is_forecast = True
         lower_is_worse = False
@@ -1466,31 +1614,60 @@ def trigger_check():
         if region is None:
             raise InvalidRequestError("If mode is {mode} then region must be provided")
 
+    if season not in config["seasons"]:
+        raise InvalidRequestError(f"Unknown season {season}")
     target_month0 = config["seasons"][season]["target_month"]
 
     if mode == "pixel":
         geom_key = bounds
     else:
         geom_key = region
-    shape = region_shape(mode, country_key, geom_key)
 
-    if var_is_forecast:
-        data = select_forecast(country_key, var, issue_month0,
-                               target_month0, season_year, freq)
+    return dict(
+        var=var,
+        country_key=country_key,
+        mode=mode,
+        issue_month0=issue_month0,
+        target_month0=target_month0,
+        season_year=season_year,
+        freq=freq,
+        thresh=thresh,
+        geom_key=geom_key,
+        var_is_forecast=var_is_forecast,
+        lower_is_worse=lower_is_worse,
+    )
+
+
+def trigger_data_key(check):
+    """Checks with the same key select the same data."""
+    if check["var_is_forecast"]:
+        return (
+            True, check["country_key"], check["var"], check["issue_month0"],
+            check["target_month0"], check["season_year"], check["freq"],
+        )
     else:
-        data = select_obs(
-            country_key, [var], target_month0, season_year
-        )[var]
-    if 'lon' in data.coords:
-        data = pingrid.average_over(data, shape, all_touched=True)
+        return (
+            False, check["country_key"], check["var"], check["target_month0"],
+            check["season_year"],
+        )
+
 
+def select_trigger_data(check):
+    if check["var_is_forecast"]:
+        data = select_forecast(check["country_key"], check["var"], check["issue_month0"],
+                               check["target_month0"], check["season_year"], check["freq"])
+    else:
+        data = select_obs(
+            check["country_key"], [check["var"]], check["target_month0"], check["season_year"]
+        )[check["var"]]
+    return data
 
 
-    value = data.item()
-    if lower_is_worse:
-        triggered = bool(value <= thresh)
+def trigger_result(value, check):
+    if check["lower_is_worse"]:
+        triggered = bool(value <= check["thresh"])
     else:
-        triggered = bool(value >= thresh)
+        triggered = bool(value >= check["thresh"])
     response = {
         "value": value,
         "triggered": triggered,
@@ -1600,12 +1777,87 @@ def regions_endpoint():
         sql.SQL(shapes_config["sql"]),
         sql.SQL(") select key, label from a"),
     ])
-    with psycopg2.connect(**CONFIG["db"]) as conn:
-        df = pd.read_sql(query, conn)
+    df = pingrid.read_shapes(CONFIG["db"], query)
     d = {'regions': df.to_dict(orient="records")}
     return flask.jsonify(d)
 
 
+@SERVER.route(f"{PFX}/<country_key>/regions_export")
+def regions_export(country_key):
+    """Statistics of a variable for one season over every region of a
+    level, computed in one pass over the grid."""
+    var = parse_arg("variable")
+    mode = parse_arg("mode", int) # pixel mode makes no sense here
+    season = parse_arg("season")
+    issue_month0 = parse_arg("issue_month", int, default=None)
+    season_year = parse_arg("season_year", int)
+    freq = parse_arg("freq", float, default=None)
+    quantiles = parse_arg(
+        "quantiles", lambda s: [float(q) for q in s.split(",")], default=[]
+    )
+
+    config = CONFIG["countries"].get(country_key)
+    if config is None:
+        raise InvalidRequestError(f"Unknown country {country_key}")
+    if var in config["datasets"]["forecasts"]:
+        var_is_forecast = True
+        if issue_month0 is None or freq is None:
+            raise InvalidRequestError(
+                "issue_month and freq must be provided for a forecast"
+            )
+    elif var in config["datasets"]["observations"]:
+        var_is_forecast = False
+    else:
+        raise InvalidRequestError(f"Unknown variable {var}")
+    if season not in config["seasons"]:
+        raise InvalidRequestError(f"Unknown season {season}")
+    if not 0 <= mode < len(config["shapes"]):
+        raise InvalidRequestError(f"Unknown mode {mode}")
+    if not all(0 <= q <= 1 for q in quantiles):
+        raise InvalidRequestError("quantiles must be between 0 and 1")
+
+    data = select_trigger_data(dict(
+        var=var,
+        country_key=country_key,
+        issue_month0=issue_month0,
+        target_month0=config["seasons"][season]["target_month"],
+        season_year=season_year,
+        freq=freq,
+        var_is_forecast=var_is_forecast,
+    ))
+    if 'lon' not in data.coords:
+        raise InvalidRequestError(f"{var} is not gridded")
+
+    zones = region_zones(country_key, str(mode), data)
+    ds = pingrid.zonal_stats(
+        data, zones, stats=("mean", "min", "max", "count"), quantiles=quantiles
+    )
+    shapes_df = shapes_index(country_key, str(mode)).df
+    labels = dict(zip(shapes_df["key"].astype(str), shapes_df["label"]))
+
+    def value(x):
+        x = float(x)
+        return None if np.isnan(x) else x
+
+    regions = []
+    for key in ds["region"].values:
+        d = ds.sel(region=key)
+        r = {
+            "key": key,
+            "label": labels[key],
+            "mean": value(d["mean"]),
+            "min": value(d["min"]),
+            "max": value(d["max"]),
+            "count": int(d["count"]),
+        }
+        if len(quantiles) > 0:
+            r["quantiles"] = dict(zip(
+                map(str, quantiles), map(value, d["quantiles"].values)
+            ))
+        regions.append(r)
+    return flask.jsonify({"regions": regions})
+
+
 if __name__ == "__main__":
     if CONFIG["mode"] != "prod":
         import warnings
@@ -256,6 +256,67 @@ def test_trigger_check_straddle():
     assert d["triggered"] is True
 
 
+def test_trigger_check_batch():
+    common = dict(
+        country_key="ethiopia",
+        variable="pnep",
+        season="season1",
+        issue_month=1,
+        season_year=2021,
+        freq=15,
+    )
+    with fbfmaproom.SERVER.test_client() as client:
+        r = client.post(
+            "/fbfmaproom/trigger_check_batch",
+            json={"checks": [
+                dict(common, mode="pixel", thresh=10, bounds="[[6.75, 43.75], [7, 44]]"),
+                dict(common, mode="2", thresh=20, region="(ET05,ET0505,ET050501)"),
+                dict(common, mode="pixel", thresh=20, bounds="[[6.75, 43.75], [7, 44]]"),
+                dict(common, variable="bogus", mode="pixel", thresh=20, bounds="[[6.75, 43.75], [7, 44]]"),
+            ]},
+        )
+    print(r.data)
+    assert r.status_code == 200
+    results = r.json["results"]
+    assert np.isclose(results[0]["value"], 10.7093)
+    assert results[0]["triggered"] is True
+    assert np.isclose(results[1]["value"], 9.333)
+    assert results[1]["triggered"] is False
+    assert np.isclose(results[2]["value"], 10.7093)
+    assert results[2]["triggered"] is False
+    assert results[3]["error"]["status"] == 400
+
+def test_trigger_check_batch_check_fails(monkeypatch):
+    select_trigger_data = fbfmaproom.select_trigger_data
+    def failing_select(check):
+        if check["thresh"] == 20:
+            raise KeyError("bad slice")
+        return select_trigger_data(check)
+    monkeypatch.setattr(fbfmaproom, "select_trigger_data", failing_select)
+    common = dict(
+        country_key="ethiopia",
+        variable="pnep",
+        season="season1",
+        issue_month=1,
+        season_year=2021,
+        freq=15,
+    )
+    with fbfmaproom.SERVER.test_client() as client:
+        r = client.post(
+            "/fbfmaproom/trigger_check_batch",
+            json={"checks": [
+                dict(common, mode="pixel", thresh=10, bounds="[[6.75, 43.75], [7, 44]]"),
+                dict(common, mode="pixel", thresh=20, bounds="[[6.75, 43.75], [7, 44]]"),
+                dict(common, mode="2", thresh=10, region="bogus"),
+            ]},
+        )
+    assert r.status_code == 200
+    results = r.json["results"]
+    assert np.isclose(results[0]["value"], 10.7093)
+    assert results[1]["error"]["status"] == 500
+    assert results[1]["error"]["name"] == "KeyError"
+    assert results[2]["error"]["status"] == 400
+
 def test_trigger_check_obs_pixel_trigger():
     with fbfmaproom.SERVER.test_client() as client:
         r = client.get(
@@ -492,3 +553,23 @@ def test_regions_endpoint():
         assert len(regions) == 11
         assert regions[0]['key'] == '(ET05,ET0508)'
         assert regions[0]['label'] == 'Afder'
+
+def test_regions_export():
+    with fbfmaproom.SERVER.test_client() as client:
+        r = client.get(
+            "/fbfmaproom/ethiopia/regions_export"
+            "?variable=pnep"
+            "&mode=2"
+            "&season=season1"
+            "&issue_month=1"
+            "&season_year=2021"
+            "&freq=15"
+            "&quantiles=0.5"
+        )
+    print(r.data)
+    assert r.status_code == 200
+    regions = {x["key"]: x for x in r.json["regions"]}
+    region = regions["(ET05,ET0505,ET050501)"]
+    assert np.isclose(region["mean"], 9.333)
+    assert region["min"] <= region["quantiles"]["0.5"] <= region["max"]
+    assert region["count"] > 0
@@ -3,9 +3,14 @@ import contextlib
 import io
 import numpy as np
 import os
+import pandas as pd
 import pytest
 import shapely
+import sys
 import tempfile
+import threading
+import time
+import types
 import xarray as xr
 
 import pingrid
@@ -160,6 +165,83 @@ def test_average_over_nans():
     v = pingrid.average_over(da, shape, all_touched=True)
     assert np.isclose(v.item(), 1.5)
 
+def test_average_over_many():
+    rng = np.random.default_rng(0)
+    data = rng.random((3, 10, 12))
+    data[0, 2, 3] = np.nan
+    da = xr.DataArray(
+        data=data,
+        coords={
+            'time': [0, 1, 2],
+            'lat': np.arange(10.) / 2,
+            'lon': np.arange(12.) / 2,
+        },
+    )
+    shapes = [
+        shapely.geometry.box(0.2, 0.2, 2.3, 1.8),
+        shapely.geometry.box(1., 0.5, 5., 3.),
+        shapely.geometry.Polygon([(3., 3.), (5., 4.), (4., 2.)]),
+    ]
+    v = pingrid.average_over_many(da, shapes, all_touched=True)
+    assert v.dims == ('time', 'shape')
+    for i, s in enumerate(shapes):
+        expected = pingrid.average_over(da, s, all_touched=True)
+        assert np.allclose(v.isel(shape=i), expected)
+
+def test_zonal_stats():
+    rng = np.random.default_rng(0)
+    data = rng.random((3, 10, 12))
+    data[0, 2, 3] = np.nan
+    data[:, 8:, 10:] = np.nan
+    da = xr.DataArray(
+        data=data,
+        coords={
+            'time': [0, 1, 2],
+            'lat': np.arange(10.) / 2,
+            'lon': np.arange(12.) / 2,
+        },
+    )
+    shapes = [
+        shapely.geometry.box(0.2, 0.2, 2.3, 1.8),
+        shapely.geometry.box(1., 0.5, 5., 3.),
+        shapely.geometry.box(5.1, 4.1, 5.4, 4.4),  # all missing
+        shapely.geometry.box(20., 20., 21., 21.),  # off the grid
+    ]
+    zones = pingrid.Zones(shapes, da['lon'], da['lat'], keys=list("abcd"), all_touched=True)
+    ds = pingrid.zonal_stats(
+        da, zones, stats=["mean", "min", "max", "count"], quantiles=[0.5]
+    )
+    assert ds['mean'].dims == ('time', 'region')
+    assert list(ds['region'].values) == list("abcd")
+    for i, s in enumerate(shapes[:2]):
+        expected = pingrid.average_over(da, s, all_touched=True)
+        assert np.allclose(ds['mean'].isel(region=i), expected)
+        touched = xr.DataArray(
+            [
+                [
+                    s.intersects(shapely.geometry.box(x - .25, y - .25, x + .25, y + .25))
+                    for x in da['lon'].values
+                ]
+                for y in da['lat'].values
+            ],
+            dims=['lat', 'lon'],
+        )
+        cells = da.where(touched)
+        assert np.allclose(ds['min'].isel(region=i), cells.min(['lat', 'lon']))
+        assert np.allclose(ds['max'].isel(region=i), cells.max(['lat', 'lon']))
+        assert (ds['count'].isel(region=i) == cells.count(['lat', 'lon'])).all()
+        assert np.allclose(
+            ds['quantiles'].sel(quantile=0.5).isel(region=i),
+            cells.median(['lat', 'lon']),
+        )
+    for i in [2, 3]:
+        assert ds['mean'].isel(region=i).isnull().all()
+        assert (ds['count'].isel(region=i) == 0).all()
+    one = pingrid.zonal_stats(da, zones, keys=["b"])
+    assert np.allclose(one['mean'].sel(region="b"), ds['mean'].sel(region="b"))
+    with pytest.raises(pingrid.InvalidRequestError):
+        pingrid.zonal_stats(da, zones, keys=["z"])
+
 def test_tile():
     cmap = pingrid.ColorScale(
         'foo',
@@ -216,6 +298,506 @@ def test_tile():
     print(tile[127][127])
     assert (tile[127][127] == [255, 0, 0, 255]).all()
 
+def test_tile_timedelta():
+    # e.g. onset dates, in days since the start of the season
+    days = np.array([[0, 10], [20, 30]], dtype="timedelta64[D]")
+    days[0, 0] = np.timedelta64("NaT")
+    da = xr.DataArray(
+        days.astype("timedelta64[ns]"),
+        coords={"lat": [-80., 80.], "lon": [-180., 180.]},
+        attrs={
+            "scale_min": np.timedelta64(0),
+            "scale_max": np.timedelta64(30, "D"),
+            "colormap": pingrid.CMAPS["rainbow"],
+        },
+    )
+    for resampling in ["nearest", "block-mean"]:
+        tile = pingrid.impl._tile(
+            da, tx=0, ty=0, tz=0, clipping=None, resampling=resampling
+        )
+        # NaT is transparent
+        assert tile[255][0][3] == 0
+        # the max is the last color of the colormap
+        np.testing.assert_array_equal(
+            tile[0][255], pingrid.CMAPS["rainbow"].to_bgra_array()[-1]
+        )
+
+def test_produce_data_tile_matches_interp():
+    rng = np.random.default_rng(0)
+    da = xr.DataArray(
+        rng.random((40, 60)),
+        dims=["lat", "lon"],
+        coords={
+            "lat": np.arange(20., 0., -0.5),
+            "lon": np.arange(30., 45., 0.25),
+        },
+    )
+    for tx, ty, tz in [(0, 0, 0), (4, 3, 3), (9, 7, 4), (300, 250, 9)]:
+        x = np.fromiter(
+            (a + (b - a) / 2.0 for a, b in pingrid.impl.pixel_extents(pingrid.tile_left, tx, tz, 256)),
+            np.double,
+        )
+        y = np.fromiter(
+            (a + (b - a) / 2.0 for a, b in pingrid.impl.pixel_extents(pingrid.tile_top_mercator, ty, tz, 256)),
+            np.double,
+        )
+        expected = pingrid.impl.create_interp(da)([y, x])
+        z = pingrid.impl.produce_data_tile(da, tx, ty, tz)
+        assert z is not None
+        np.testing.assert_array_equal(z, expected)
+    assert pingrid.impl.produce_data_tile(da, 0, 0, 3) is None
+
+
+def test_produce_data_tile_bilinear():
+    lon = np.arange(30., 45., 0.25)
+    lat = np.arange(20., 0., -0.5)
+    da = xr.DataArray(
+        2 * lon[None, :] - 3 * lat[:, None],
+        dims=["lat", "lon"],
+        coords={"lat": lat, "lon": lon},
+    )
+    tx, ty, tz = 9, 7, 4
+    z = pingrid.impl.produce_data_tile(da, tx, ty, tz, resampling="bilinear")
+    x = pingrid.impl.pixel_centers(pingrid.tile_left, tx, tz, 256)
+    y = pingrid.impl.pixel_centers(pingrid.tile_top_mercator, ty, tz, 256)
+    expected = 2 * x[None, :] - 3 * y[:, None]
+    inside = (
+        ((y >= lat[-1]) & (y <= lat[0]))[:, None]
+        & ((x >= lon[0]) & (x <= lon[-1]))[None, :]
+    )
+    assert inside.any()
+    np.testing.assert_allclose(z[inside], expected[inside])
+    outside = (
+        ((y < lat[-1] - 0.25) | (y >= lat[0] + 0.25))[:, None]
+        | ((x < lon[0] - 0.125) | (x >= lon[-1] + 0.125))[None, :]
+    )
+    assert np.isnan(z[outside]).all()
+
+
+def test_produce_data_tile_block_mean():
+    # 4x4 blocks of the grid have constant values, except for an
+    # alternating pattern that nearest neighbor would alias.
+    res = 360 / 256 / 4
+    n = 64
+    lon = -180 + res / 2 + np.arange(n) * res
+    lat = res / 2 + np.arange(n) * res
+    blocks = np.arange(16 * 16, dtype=float).reshape(16, 16)
+    values = np.kron(blocks, np.ones((4, 4)))
+    values += np.tile([[1., -1.], [-1., 1.]], (n // 2, n // 2))
+    da = xr.DataArray(
+        values, dims=["lat", "lon"], coords={"lat": lat, "lon": lon}
+    )
+    z = pingrid.impl.produce_data_tile(da, 0, 0, 0, resampling="block-mean")
+    # Pixels at zoom 0 are 4 cells wide, so each pixel column is the
+    # mean of a block.
+    cols = pingrid.impl.pixel_centers(pingrid.tile_left, 0, 0, 256)
+    rows = pingrid.impl.pixel_centers(pingrid.tile_top_mercator, 0, 0, 256)
+    j = np.searchsorted(cols, lon[1::4])
+    i = np.argmin(np.abs(rows - 2 * res))
+    np.testing.assert_allclose(z[i, j], blocks[0])
+
+    overviews = [
+        da,
+        da.coarsen(lat=2, lon=2).mean(),
+        da.coarsen(lat=4, lon=4).mean(),
+    ]
+    z2 = pingrid.impl.produce_data_tile(
+        da, 0, 0, 0, resampling="block-mean", overviews=overviews
+    )
+    np.testing.assert_allclose(z2, z)
+
+    with pytest.raises(Exception, match="Unknown resampling"):
+        pingrid.impl.produce_data_tile(da, 0, 0, 0, resampling="cubic")
+
+
+def test_produce_data_tile_block_mean_adjacent_tiles():
+    # Adjacent tiles, each computed from the data clipped to its own
+    # bounds as maprooms do, average the same cells as the whole data.
+    res = 0.0375
+    lon = np.arange(33.05625, 48, res)
+    lat = np.arange(3.01875, 15, res)
+    rng = np.random.default_rng(0)
+    da = xr.DataArray(
+        rng.random((lat.size, lon.size)),
+        dims=["lat", "lon"], coords={"lat": lat, "lon": lon},
+    )
+    tz = 3
+    assert pingrid.impl.block_factor(res, tz) == 4
+    ty = 3
+    tx = 4
+    for t in [tx, tx + 1]:
+        x_min = pingrid.tile_left(t, tz)
+        x_max = pingrid.tile_left(t + 1, tz)
+        clipped = da.sel(
+            lon=slice(x_min - x_min % res, x_max + res - x_max % res)
+        )
+        z = pingrid.impl.produce_data_tile(
+            clipped, t, ty, tz, resampling="block-mean"
+        )
+        expected = pingrid.impl.produce_data_tile(
+            da, t, ty, tz, resampling="block-mean"
+        )
+        inside = ~np.isnan(z)
+        assert inside.any()
+        np.testing.assert_allclose(z[inside], expected[inside])
+
+
+def test_pyramid_level():
+    # pixels at zoom 0 are 360/256 degrees wide
+    assert pingrid.pyramid_level(360 / 256, 0, 4) == 0
+    assert pingrid.pyramid_level(360 / 256 / 4, 0, 4) == 2
+    assert pingrid.pyramid_level(360 / 256 / 4, 1, 4) == 1
+    assert pingrid.pyramid_level(360 / 256 / 64, 0, 4) == 3
+    assert pingrid.pyramid_level(0.0375, 12, 4) == 0
+
+def test_coarsen_overview():
+    da = xr.DataArray(
+        np.arange(30.).reshape(5, 6),
+        dims=["Y", "X"],
+        coords={"Y": np.arange(5) * 0.5, "X": 10 + np.arange(6) * 0.5},
+    )
+    level = pingrid.coarsen_overview(da, 2)
+    np.testing.assert_array_equal(level["X"], [10.25, 11.25, 12.25])
+    np.testing.assert_array_equal(level["Y"], [0.25, 1.25, 2.25])
+    assert level.isel(X=0, Y=0).item() == (0 + 1 + 6 + 7) / 4
+    # padded block
+    assert level.isel(X=0, Y=2).item() == (24 + 25) / 2
+
+    levels = [da, level, pingrid.coarsen_overview(da, 4)]
+    # pixels at zoom 0 are 360/256 degrees wide, or 2.8 cells
+    assert pingrid.select_overview(levels, 0) is levels[1]
+    assert pingrid.select_overview(levels, 3) is levels[0]
+    assert pingrid.select_overview(levels[:1], 0) is levels[0]
+
+
+def test_TileCache_memory_lru():
+    cache = pingrid.TileCache(memory_mb=10 / 2**20)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_TileCache_disk():
+    with tempfile.TemporaryDirectory() as d:
+        cache = pingrid.TileCache(memory_mb=0, disk_path=d, disk_mb=10 / 2**20)
+        cache.put("a", b"aaaa")
+        os.utime(os.path.join(d, "a.png"), (0, 0))
+        cache.put("b", b"bbbb")
+        cache.put("c", b"cccc")
+        # over the limit, so the oldest tile was removed
+        assert cache.get("a") is None
+        # a new process sees the tiles left on disk
+        cache = pingrid.TileCache(memory_mb=0, disk_path=d, disk_mb=10 / 2**20)
+        assert cache.get("b") == b"bbbb"
+        assert cache.get("c") == b"cccc"
+
+def test_cached_tile():
+    import flask
+    app = flask.Flask("test")
+    cache = pingrid.TileCache()
+    calls = []
+    stamp = ["1"]
+
+    @app.route("/tile/<int:tz>/<int:tx>/<int:ty>")
+    @pingrid.cached_tile(cache, stamp=lambda: stamp[0])
+    def tile_endpoint(tz, tx, ty):
+        calls.append((tz, tx, ty))
+        return pingrid.image_resp(pingrid.empty_tile(4, 4))
+
+    client = app.test_client()
+    r1 = client.get("/tile/1/0/0?a=1&b=2")
+    assert r1.status_code == 200
+    assert r1.mimetype == "image/png"
+    assert r1.headers["Cache-Control"] == "public, max-age=3600"
+    etag = r1.headers["ETag"]
+    # argument order doesn't matter
+    r2 = client.get("/tile/1/0/0?b=2&a=1")
+    assert r2.data == r1.data
+    assert r2.headers["ETag"] == etag
+    assert len(calls) == 1
+    r3 = client.get("/tile/1/0/0?a=1&b=2", headers={"If-None-Match": etag})
+    assert r3.status_code == 304
+    assert len(calls) == 1
+    client.get("/tile/1/0/1?a=1&b=2")
+    assert len(calls) == 2
+    # new data invalidates the tiles
+    stamp[0] = "2"
+    r4 = client.get("/tile/1/0/0?a=1&b=2")
+    assert r4.headers["ETag"] != etag
+    assert len(calls) == 3
+
+def _render_square(x):
+    if x < 0:
+        raise pingrid.InvalidRequestError("negative")
+    return x * x
+
+
+def test_TileRenderer_processes():
+    renderer = pingrid.TileRenderer(processes=2)
+    renderer.start()
+    assert renderer.render("a", _render_square, 3) == 9
+    with pytest.raises(pingrid.InvalidRequestError, match="negative"):
+        renderer.render("b", _render_square, -1)
+    assert renderer.stats()["inflight"] == 0
+
+
+def test_TileRenderer_shares_cpus(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 16)
+    assert pingrid.TileRenderer().processes == 16
+    # Under mod_wsgi, with 10 daemon processes
+    monkeypatch.setitem(
+        sys.modules, "mod_wsgi", types.SimpleNamespace(maximum_processes=10)
+    )
+    assert pingrid.server_processes() == 10
+    assert pingrid.TileRenderer().processes == 1
+    assert pingrid.TileRenderer(processes=3).processes == 3
+
+
+def test_TileRenderer_not_started():
+    renderer = pingrid.TileRenderer(processes=2)
+    # Not forked from a request: rendered in the calling thread
+    assert renderer.render("a", os.getpid) == os.getpid()
+    assert not renderer.started()
+
+
+def test_TileRenderer_single_flight():
+    renderer = pingrid.TileRenderer(processes=0, max_pending=1, timeout=5)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow(x):
+        calls.append(x)
+        started.set()
+        release.wait()
+        return x
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(renderer.render("k", slow, 1)))
+        for _ in range(3)
+    ]
+    threads[0].start()
+    started.wait()
+    for t in threads[1:]:
+        t.start()
+    while renderer.stats()["coalesced"] < 2:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == [1, 1, 1]
+    assert calls == [1]
+
+
+def test_TileRenderer_back_pressure():
+    renderer = pingrid.TileRenderer(processes=0, max_pending=1, timeout=0.1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return 1
+
+    t = threading.Thread(target=lambda: renderer.render("a", slow))
+    t.start()
+    started.wait()
+    with pytest.raises(pingrid.ServiceUnavailableError):
+        renderer.render("b", lambda: 2)
+    release.set()
+    t.join()
+    assert renderer.stats()["rejected"] == 1
+
+
+def test_metatile_extents():
+    assert pingrid.metatile_extents(5, 6, 4, 4) == (4, 4, 8, 8)
+    assert pingrid.metatile_extents(3, 3, 4, 4) == (0, 0, 4, 4)
+    # never larger than the whole map
+    assert pingrid.metatile_extents(1, 0, 1, 4) == (0, 0, 2, 2)
+
+
+def test_FieldCache():
+    cache = pingrid.FieldCache(maxsize=2)
+    calls = []
+
+    def compute(x):
+        calls.append(x)
+        return x * 10
+
+    assert cache.get("a", lambda: compute(1)) == 10
+    assert cache.get("a", lambda: compute(1)) == 10
+    assert cache.get("b", lambda: compute(2)) == 20
+    assert cache.get("c", lambda: compute(3)) == 30
+    # "a" was evicted
+    assert cache.get("a", lambda: compute(1)) == 10
+    assert calls == [1, 2, 3, 1]
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_ResultStore():
+    store = pingrid.ResultStore(maxsize=2)
+    calls = []
+
+    def compute(x):
+        calls.append(x)
+        return xr.Dataset({"v": x})
+
+    params = {"a": 1, "b": 2.5}
+    assert store.peek(params, 0) is None
+    assert store.get(params, 0, lambda: compute(1)).v == 1
+    # Keys don't depend on the order of the parameters
+    assert store.get({"b": 2.5, "a": 1}, 0, lambda: compute(1)).v == 1
+    assert store.peek(params, 0).v == 1
+    # A new version of the data is a different result
+    assert store.get(params, 1, lambda: compute(2)).v == 2
+    store.get({"a": 2}, 1, lambda: compute(3))
+    # The first result was evicted
+    assert store.peek(params, 0) is None
+    assert calls == [1, 2, 3]
+
+
+def test_ResultStore_prefetch():
+    store = pingrid.ResultStore(maxsize=2)
+    release = threading.Event()
+    calls = []
+
+    def compute(x):
+        release.wait()
+        calls.append(x)
+        return xr.Dataset({"v": x})
+
+    store.prefetch({"a": 1}, 0, lambda: compute(1))
+    # Already asked for
+    store.prefetch({"a": 1}, 0, lambda: compute(2))
+    assert store.peek({"a": 1}, 0) is None
+    release.set()
+    while store.pending():
+        time.sleep(0.01)
+    assert store.peek({"a": 1}, 0).v == 1
+    assert calls == [1]
+
+
+def test_ResultStore_prefetch_drops_oldest():
+    store = pingrid.ResultStore(maxsize=8, prefetch_size=2)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute(x):
+        started.set()
+        release.wait()
+        calls.append(x)
+        return xr.Dataset({"v": x})
+
+    store.prefetch({"a": 0}, 0, lambda: compute(0))
+    started.wait()
+    # 0 is being computed; 1 is superseded by 2 and 3
+    for x in (1, 2, 3):
+        store.prefetch({"a": x}, 0, lambda x=x: compute(x))
+    assert store.dropped == 1
+    release.set()
+    while store.pending():
+        time.sleep(0.01)
+    assert calls == [0, 3, 2]
+    assert store.peek({"a": 1}, 0) is None
+
+
+def test_ResultStore_prefetch_disabled():
+    store = pingrid.ResultStore(prefetch_size=0)
+    store.prefetch({"a": 1}, 0, lambda: xr.Dataset({"v": 1}))
+    assert store.pending() == 0
+    assert store.peek({"a": 1}, 0) is None
+
+
+def test_DatasetRegistry():
+    opened = []
+    def opener(path, **kwargs):
+        opened.append(path)
+        return xr.Dataset(attrs={"n": len(opened)})
+
+    registry = pingrid.DatasetRegistry()
+    with tempfilename() as fname:
+        ds = registry.open(opener, fname)
+        ds.attrs["n"] = -1
+        # cached, and unaffected by the caller's change
+        assert registry.open(opener, fname).attrs["n"] == 1
+        # different arguments are different datasets
+        assert registry.open(opener, fname, chunks={}).attrs["n"] == 2
+        st = os.stat(fname)
+        os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert registry.open(opener, fname).attrs["n"] == 3
+    assert registry.stats() == {"hits": 1, "misses": 3, "datasets": 2}
+
+def test_DatasetRegistry_dataarray():
+    registry = pingrid.DatasetRegistry()
+    with tempfilename() as fname:
+        opener = lambda path: xr.DataArray(np.arange(3.), dims=["x"])
+        da = registry.open(opener, fname)
+        da.attrs["n"] = -1
+        cached = registry.open(opener, fname)
+        # The data is shared, not copied on every request
+        assert np.shares_memory(cached.values, da.values)
+        assert "n" not in cached.attrs
+
+
+def test_db_pool_after_fork(monkeypatch):
+    monkeypatch.setattr(pingrid.impl, "_POOLS", {})
+    monkeypatch.setattr(pingrid.impl, "_INHERITED_POOLS", [])
+    db_config = {"host": "localhost", "dbname": "test"}
+    pool = pingrid.impl._db_pool(db_config)
+    assert pingrid.impl._db_pool(db_config) is pool
+    # As in a process forked after the pool was created
+    monkeypatch.setattr(pingrid.impl, "_POOLS_PID", None)
+    assert pingrid.impl._db_pool(db_config) is not pool
+    # The parent's connections must not be closed by the child
+    assert pingrid.impl._INHERITED_POOLS == [pool]
+
+def test_GeometryCache(monkeypatch):
+    queries = []
+    def read_sql(db_config, query, params=None):
+        queries.append((query, params))
+        geom = shapely.geometry.box(0, 0, 1, 1)
+        return pd.DataFrame({"key": [1], "the_geom": [memoryview(geom.wkb)]})
+    monkeypatch.setattr(pingrid.impl, "read_sql", read_sql)
+
+    cache = pingrid.GeometryCache(ttl=3600)
+    df = cache.read({}, "select", {"year": 2020})
+    assert df["the_geom"][0].equals(shapely.geometry.box(0, 0, 1, 1))
+    df["the_geom"] = None
+    assert cache.read({}, "select", {"year": 2020})["the_geom"][0] is not None
+    assert len(queries) == 1
+    cache.read({}, "select", {"year": 2021})
+    assert len(queries) == 2
+    cache.invalidate()
+    cache.read({}, "select", {"year": 2020})
+    assert len(queries) == 3
+    cache.ttl = 0
+    cache.read({}, "select", {"year": 2020})
+    assert len(queries) == 4
+
+def test_ShapeIndex():
+    df = pd.DataFrame({
+        "key": [1, 2, 3],
+        "the_geom": [
+            shapely.geometry.box(0, 0, 2, 2),
+            shapely.geometry.box(1, 1, 3, 3),
+            shapely.geometry.box(5, 5, 6, 6),
+        ],
+    }, index=[10, 20, 30])
+    index = pingrid.ShapeIndex(df)
+    assert index.containing(1.5, 1.5)["key"] == 1
+    assert index.containing(2.5, 2.5)["key"] == 2
+    assert index.containing(4, 4) is None
+    box = shapely.geometry.box(1.5, 1.5, 5.5, 5.5)
+    assert list(index.intersecting(box)["key"]) == [1, 2, 3]
+    assert list(index.intersecting(shapely.geometry.box(4, 0, 4.5, 1))["key"]) == []
+
 def test_Color():
     DEEPSKYBLUE = pingrid.Color(0, 191, 255)
     
@@ -38,24 +38,21 @@ def register(FLASK, config):
     APP.layout = layout.app_layout()
 
     def adm_borders(shapes):
-        with psycopg2.connect(**GLOBAL_CONFIG["db"]) as conn:
-            s = sql.Composed(
-                [
-                    sql.SQL("with g as ("),
-                    sql.SQL(shapes),
-                    sql.SQL(
-                        """
-                        )
-                        select
-                            g.label, g.key, g.the_geom
-                        from g
-                        """
-                    ),
-                ]
-            )
-            df = pd.read_sql(s, conn)
-
-        df["the_geom"] = df["the_geom"].apply(lambda x: wkb.loads(x.tobytes()))
+        s = sql.Composed(
+            [
+                sql.SQL("with g as ("),
+                sql.SQL(shapes),
+                sql.SQL(
+                    """
+                    )
+                    select
+                        g.label, g.key, g.the_geom
+                    from g
+                    """
+                ),
+            ]
+        )
+        df = pingrid.read_shapes(GLOBAL_CONFIG["db"], s)
         df["the_geom"] = df["the_geom"].apply(
             lambda x: x if isinstance(x, MultiPolygon) else MultiPolygon([x])
         )
@@ -99,7 +96,7 @@ def register(FLASK, config):
         scenario = "ssp126"
         model = "GFDL-ESM4"
         variable = "tasmin"
-        data = xr.open_zarr(
+        data = pingrid.DATASETS.open_zarr(
             f'/Data/data24/ISIMIP3b/InputData/climate/atmosphere/bias-adjusted'
             f'/global/monthly_rechunked/{scenario}/{model}/zarr/{variable}'
         )[variable]
@@ -144,7 +141,7 @@ def register(FLASK, config):
         scenario = "ssp126"
         model = "GFDL-ESM4"
         variable = "tasmin"
-        data = xr.open_zarr(
+        data = pingrid.DATASETS.open_zarr(
             f'/Data/data24/ISIMIP3b/InputData/climate/atmosphere/bias-adjusted'
             f'/global/monthly_rechunked/{scenario}/{model}/zarr/{variable}'
         )[variable]
@@ -188,7 +185,7 @@ def register(FLASK, config):
         scenario = "ssp126"
         model = "GFDL-ESM4"
         variable = "tasmin"
-        data = xr.open_zarr(
+        data = pingrid.DATASETS.open_zarr(
             f'/Data/data24/ISIMIP3b/InputData/climate/atmosphere/bias-adjusted'
             f'/global/monthly_rechunked/{scenario}/{model}/zarr/{variable}'
         )[variable].isel(T=-1)
@@ -254,7 +251,7 @@ def register(FLASK, config):
         scenario = "ssp126"
         model = "GFDL-ESM4"
         variable = "tasmin"
-        data = xr.open_zarr(
+        data = pingrid.DATASETS.open_zarr(
             f'/Data/data24/ISIMIP3b/InputData/climate/atmosphere/bias-adjusted'
             f'/global/monthly_rechunked/{scenario}/{model}/zarr/{variable}'
         )[variable].isel(T=-1).rename({"X": "lon", "Y": "lat"})
@@ -1,27 +1,58 @@
 __all__ = [
     'boolean',
+    'cached_tile',
     'CMAPS',
+    'coarsen_overview',
     'ClientSideError',
     'Color',
     'ColorScale',
+    'DATASETS',
+    'DatasetRegistry',
+    'db_connection',
+    'GeometryCache',
     'InvalidRequestError',
     'NotFoundError',
     'average_over',
+    'average_over_many',
     'client_side_error',
     'deep_merge',
     'empty_tile',
+    'FieldCache',
     'error_fig',
     'image_resp',
     'load_config',
+    'metatile_extents',
+    'open_overviews',
+    'open_timeseries',
     'open_dataset',
     'open_mfdataset',
+    'overview_path',
     'parse_arg',
     'parse_colormap',
+    'parse_json_arg',
+    'path_stamp',
+    'png_bytes',
+    'pyramid_level',
+    'read_shapes',
+    'read_sql',
+    'render_tile',
+    'ResultStore',
     'sel_snap',
+    'select_overview',
+    'server_processes',
+    'SHAPES',
+    'ShapeIndex',
+    'ServiceUnavailableError',
     'tile',
+    'TileCache',
+    'TileRenderer',
     'tile_left',
+    'tile_png',
     'tile_top_mercator',
+    'timeseries_path',
     'to_dash_colorscale',
+    'zonal_stats',
+    'Zones',
     'AQUAMARINE',
     'BLACK',
     'BLUE',
@@ -43,8 +74,19 @@ __all__ = [
     'YELLOW',
 ]
 
+import collections
+import concurrent.futures
+import contextlib
 import copy
+import functools
+import hashlib
 import io
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import warnings
 from typing import Tuple, List, Literal, Optional, Union, Callable, Iterable as Iterable
 from typing import NamedTuple
 import math
@@ -56,10 +98,13 @@ import xarray as xr
 from collections.abc import Iterable as CollectionsIterable
 import cv2
 import psycopg2.extensions
+import psycopg2.pool
 from psycopg2 import sql
 import rasterio.features
 import rasterio.transform
+import shapely
 import shapely.geometry
+import shapely.wkb
 from shapely.geometry.multipolygon import MultiPolygon
 from shapely.geometry.polygon import Polygon
 from shapely.geometry.multipoint import MultiPoint
@@ -439,20 +484,28 @@ def pixel_extents(g: Callable[[int, int], float], tx: int, tz: int, n: int = 1):
         a = b
 
 
-def tile(da, tx, ty, tz, clipping=None):
-    image_array = _tile(da, tx, ty, tz, clipping)
+def tile(da, tx, ty, tz, clipping=None, resampling="nearest", overviews=None):
+    image_array = _tile(da, tx, ty, tz, clipping, resampling, overviews)
     return image_resp(image_array)
 
 
-def _tile(da, tx, ty, tz, clipping):
-    z = produce_data_tile(da, tx, ty, tz)
+def tile_png(da, tx, ty, tz, clipping=None, resampling="nearest", overviews=None):
+    """Like `tile`, but returns the PNG data rather than a response, for
+    rendering in a `TileRenderer` worker."""
+    return png_bytes(_tile(da, tx, ty, tz, clipping, resampling, overviews))
+
+
+def _tile(da, tx, ty, tz, clipping, resampling="nearest", overviews=None):
+    z = produce_data_tile(
+        da, tx, ty, tz, resampling=resampling, overviews=overviews
+    )
     if z is None:
         return empty_tile()
     im = apply_colormap(
         z,
         da.attrs["colormap"].to_bgra_array(lutsize=256),
-        da.attrs["scale_min"],
-        da.attrs["scale_max"],
+        _as_double(da.attrs["scale_min"]),
+        _as_double(da.attrs["scale_max"]),
     ) 
     if clipping is not None:
         if callable(clipping):
@@ -481,6 +534,236 @@ def empty_tile(width: int = 256, height: int = 256):
     return im
 
 
+def pixel_centers(
+    g: Callable[[np.ndarray, int], np.ndarray], tx: int, tz: int, n: int = 1
+) -> np.ndarray:
+    """Vectorized equivalent of the midpoints of `pixel_extents`. `g`
+    must accept an array of fractional tile coordinates.
+    """
+    assert n >= 1 and tz >= 0 and 0 <= tx < 2 ** tz
+    edges = g(tx + np.arange(n + 1) / n, tz)
+    return edges[:-1] + (edges[1:] - edges[:-1]) / 2.0
+
+
+def grid_definition(da: xr.DataArray) -> Tuple[float, float, int, float, float, int]:
+    """Hashable description (y0, dy, ny, x0, dx, nx) of the evenly spaced
+    lat/lon grid of `da`.
+    """
+    x = da["lon"].values
+    y = da["lat"].values
+    # require at least 2 points in each spatial dimension, and assuming
+    # that the grid is even
+    return (
+        float(y[0]), float(y[1] - y[0]), y.size,
+        float(x[0]), float(x[1] - x[0]), x.size,
+    )
+
+
+def _nearest_index(c0: float, dc: float, n: int, c: np.ndarray) -> np.ndarray:
+    """Index of the grid cell containing each of `c`, -1 if outside."""
+    i = np.floor((c - c0) / dc + 0.5).astype(int)
+    i[(i < 0) | (i >= n)] = -1
+    return i
+
+
+@functools.lru_cache(maxsize=4096)
+def tile_index(
+    grid: Tuple[float, float, int, float, float, int],
+    tx: int,
+    ty: int,
+    tz: int,
+    tile_width: int = 256,
+    tile_height: int = 256,
+):
+    """Nearest-neighbor index maps of a Mercator tile on `grid`, as
+    returned by `grid_definition`. Cached, since tiles of the same
+    grid are requested over and over.
+
+    Returns
+    -------
+    rows, cols : ndarray
+        Sorted distinct rows and columns of the grid the tile reads.
+    flat : ndarray
+        Index of each tile pixel into the (rows, cols) subwindow,
+        flattened, in the order of the tile.
+    valid : ndarray
+        Boolean mask of the tile pixels that fall in the grid, or None if
+        they all do.
+    """
+    y0, dy, ny, x0, dx, nx = grid
+    i = _nearest_index(
+        y0, dy, ny, pixel_centers(tile_top_mercator, ty, tz, tile_height)
+    )
+    j = _nearest_index(
+        x0, dx, nx, pixel_centers(tile_left, tx, tz, tile_width)
+    )
+    rows, ri = np.unique(np.maximum(i, 0), return_inverse=True)
+    cols, ci = np.unique(np.maximum(j, 0), return_inverse=True)
+    flat = (ri[:, None] * cols.size + ci[None, :]).ravel()
+    if (i >= 0).all() and (j >= 0).all():
+        valid = None
+    else:
+        valid = ((i >= 0)[:, None] & (j >= 0)[None, :])
+    for a in (rows, cols, flat, valid):
+        if a is not None:
+            a.flags.writeable = False
+    return rows, cols, flat, valid
+
+
+@functools.lru_cache(maxsize=4096)
+def tile_bilinear_index(
+    grid: Tuple[float, float, int, float, float, int],
+    tx: int,
+    ty: int,
+    tz: int,
+    tile_width: int = 256,
+    tile_height: int = 256,
+):
+    """Bilinear interpolation maps of a Mercator tile on `grid`. Pixels
+    cover the same footprint as with `tile_index`; within half a cell of
+    the edge of the grid they take the value of the edge.
+
+    Returns
+    -------
+    Two (index, weight, valid) tuples, for rows and for columns, where
+    index holds the sorted distinct rows (columns) of the grid the tile
+    reads, weight the (n, 2) positions into index of the two neighbors
+    of each pixel and their weights, and valid the mask of the pixels
+    that fall in the grid.
+    """
+    def axis(c0, dc, n, c):
+        f = (c - c0) / dc
+        valid = (f >= -0.5) & (f < n - 0.5)
+        i0 = np.clip(np.floor(f).astype(int), 0, n - 2)
+        t = np.clip(f - i0, 0, 1)
+        index = np.unique(np.concatenate([i0, i0 + 1]))
+        pos = np.searchsorted(index, np.stack([i0, i0 + 1], axis=1))
+        weight = np.stack([1 - t, t], axis=1)
+        for a in (index, pos, weight, valid):
+            a.flags.writeable = False
+        return index, pos, weight, valid
+
+    y0, dy, ny, x0, dx, nx = grid
+    return (
+        axis(y0, dy, ny, pixel_centers(tile_top_mercator, ty, tz, tile_height)),
+        axis(x0, dx, nx, pixel_centers(tile_left, tx, tz, tile_width)),
+    )
+
+
+def block_factor(resolution: float, tz: int, tile_width: int = 256) -> int:
+    """Largest power of 2 such that blocks of that many cells of
+    `resolution` degrees fit in a pixel of a tile at zoom level `tz`.
+    """
+    return 2 ** pyramid_level(resolution, tz, 64, tile_width)
+
+
+def _as_double(values):
+    """`values` as floats, times (e.g. onset dates in days since the
+    start of the season) as nanoseconds, with NaT as NaN."""
+    values = np.asarray(values)
+    if values.dtype.kind == "m":
+        values = values.astype("timedelta64[ns]")
+    elif values.dtype.kind == "M":
+        values = values.astype("datetime64[ns]")
+    else:
+        return values.astype(np.double, copy=False)
+    missing = np.isnat(values)
+    values = values.view(np.int64).astype(np.double)
+    values[missing] = np.nan
+    return values
+
+
+def _nearest_tile(da, grid, tx, ty, tz, tile_width, tile_height):
+    rows, cols, flat, valid = tile_index(
+        grid, tx, ty, tz, tile_width, tile_height
+    )
+    # Only the cells the tile samples are read, so memory is
+    # proportional to the tile, whatever the size of the dataset.
+    window = da.isel(lat=rows, lon=cols).transpose("lat", "lon").values
+    z = np.take(_as_double(window), flat).reshape(
+        tile_height, tile_width
+    )
+    if valid is not None:
+        z[~valid] = np.nan
+    return z
+
+
+def _bilinear_tile(da, grid, tx, ty, tz, tile_width, tile_height):
+    (rows, rpos, rw, rvalid), (cols, cpos, cw, cvalid) = tile_bilinear_index(
+        grid, tx, ty, tz, tile_width, tile_height
+    )
+    window = da.isel(lat=rows, lon=cols).transpose("lat", "lon").values
+    window = _as_double(window)
+    z = np.zeros((tile_height, tile_width))
+    for a in range(2):
+        for b in range(2):
+            z += (
+                rw[:, a, None] * cw[None, :, b]
+                * window[np.ix_(rpos[:, a], cpos[:, b])]
+            )
+    z[~(rvalid[:, None] & cvalid[None, :])] = np.nan
+    return z
+
+
+def _block_offset(c0: float, dc: float, f: int) -> int:
+    """Position of the cell centered on `c0`, on a grid of spacing `dc`,
+    within its block of `f` cells, blocks being aligned on the coordinate
+    origin.
+    """
+    # Cell centers are either near multiples of dc, where floor is
+    # unstable, or well between them, where round may be.
+    q = c0 / dc
+    i = round(q)
+    if abs(q - i) > 1e-6:
+        i = math.floor(q)
+    return i % f
+
+
+def _block_mean_tile(da, grid, tx, ty, tz, tile_width, tile_height):
+    y0, dy, ny, x0, dx, nx = grid
+    f = block_factor(abs(dx), tz, tile_width)
+    if f == 1:
+        return _nearest_tile(da, grid, tx, ty, tz, tile_width, tile_height)
+    # Blocks are aligned on the coordinate origin rather than on the first
+    # cell of `da`, so that adjacent tiles average the same cells even if
+    # `da` was clipped to each tile.
+    ry = _block_offset(y0, dy, f)
+    rx = _block_offset(x0, dx, f)
+    coarse = (
+        y0 + ((f - 1) / 2 - ry) * dy, f * dy, -(-(ny + ry) // f),
+        x0 + ((f - 1) / 2 - rx) * dx, f * dx, -(-(nx + rx) // f),
+    )
+    rows, cols, flat, valid = tile_index(
+        coarse, tx, ty, tz, tile_width, tile_height
+    )
+    window = da.isel(
+        lat=slice(max(rows[0] * f - ry, 0), (rows[-1] + 1) * f - ry),
+        lon=slice(max(cols[0] * f - rx, 0), (cols[-1] + 1) * f - rx),
+    ).transpose("lat", "lon").values
+    window = _as_double(window)
+    # The first blocks of the grid may start before its first cell
+    window = np.pad(
+        window,
+        ((ry if rows[0] == 0 else 0, 0), (rx if cols[0] == 0 else 0, 0)),
+        constant_values=np.nan,
+    )
+    window = xr.DataArray(window, dims=["lat", "lon"]).coarsen(
+        lat=f, lon=f, boundary="pad"
+    ).mean().values
+    window = window[np.ix_(rows - rows[0], cols - cols[0])]
+    z = np.take(window, flat).reshape(tile_height, tile_width)
+    if valid is not None:
+        z[~valid] = np.nan
+    return z
+
+
+RESAMPLERS = {
+    "nearest": _nearest_tile,
+    "bilinear": _bilinear_tile,
+    "block-mean": _block_mean_tile,
+}
+
+
 def produce_data_tile(
     da: xr.DataArray,
     tx: int,
@@ -488,35 +771,782 @@ def produce_data_tile(
     tz: int,
     tile_width: int = 256,
     tile_height: int = 256,
+    resampling: Literal["nearest", "bilinear", "block-mean"] = "nearest",
+    overviews: Optional[List[xr.DataArray]] = None,
 ) -> np.ndarray:
-    x = np.fromiter(
-        (a + (b - a) / 2.0 for a, b in pixel_extents(tile_left, tx, tz, tile_width)),
-        np.double,
-    )
-    y = np.fromiter(
-        (a + (b - a) / 2.0 for a, b in pixel_extents(tile_top_mercator, ty, tz, tile_height)),
-        np.double,
-    )
+    """Resamples `da` on the pixels of a Mercator tile.
+
+    Parameters
+    ----------
+    da : DataArray
+        Data on an evenly spaced lat/lon grid.
+    tx, ty, tz : int
+        Tile coordinates.
+    resampling : str, optional
+        "nearest" takes the cell containing the center of each pixel,
+        "bilinear" interpolates between the four nearest cells, and
+        "block-mean" averages the cells within each pixel, which avoids
+        aliasing when pixels are larger than cells.
+    overviews : list of DataArray, optional
+        Successive 2x coarsenings of `da`, `da` itself first, as written
+        by overview_pyramid. With "block-mean", the coarsest one that is
+        at least as fine as the pixels is averaged, instead of `da`.
+
+    Returns
+    -------
+    ndarray of shape (tile_height, tile_width), or None if the tile
+    doesn't intersect `da`.
+    """
+    if resampling not in RESAMPLERS:
+        raise Exception(f"Unknown resampling {resampling}")
+    x = pixel_centers(tile_left, tx, tz, tile_width)
+    y = pixel_centers(tile_top_mercator, ty, tz, tile_height)
     tile_bbox = shapely.geometry.box(x[0], y[0], x[-1], y[-1])
     lon = da['lon']
     lat = da['lat']
     da_bbox = shapely.geometry.box(lon[0], lat[0], lon[-1], lat[-1])
-    if tile_bbox.intersects(da_bbox):
-        interp = create_interp(da)
-        z = interp([y, x])
-    else:
-        z = None
-    return z
+    if not tile_bbox.intersects(da_bbox):
+        return None
+    if resampling == "block-mean" and overviews is not None:
+        resolution = abs(da["lon"][1].item() - da["lon"][0].item())
+        da = overviews[
+            pyramid_level(resolution, tz, len(overviews), tile_width)
+        ]
+    return RESAMPLERS[resampling](
+        da, grid_definition(da), tx, ty, tz, tile_width, tile_height
+    )
 
 
-def image_resp(im):
+def pyramid_level(resolution, tz, nlevels, tile_width=256):
+    """Returns the coarsest level of an overview pyramid that is still at
+    least as fine as the pixels of a tile at zoom level `tz`.
+
+    Parameters
+    ----------
+    resolution : float
+        Grid spacing of level 0, in degrees. Level k has spacing
+        `resolution * 2**k`.
+    tz : int
+        Zoom level of the tile.
+    nlevels : int
+        Number of levels in the pyramid.
+    tile_width : int, optional
+        Width of the tile in pixels.
+
+    Returns
+    -------
+    int
+    """
+    pixel_width = 360 / (tile_width * 2**tz)
+    level = math.floor(math.log2(pixel_width / resolution))
+    return min(max(level, 0), nlevels - 1)
+
+
+def coarsen_overview(data, factor, x_dim="X", y_dim="Y"):
+    """Coarsens `data` by block averages of `factor` x `factor` cells,
+    which is a level of an overview pyramid.
+
+    Blocks start at the first cell of `data`; the last ones are padded
+    with missing values. The coordinates of the result are the centers of
+    the blocks.
+
+    Parameters
+    ----------
+    data : DataArray or Dataset
+        Data on a regular grid along `x_dim` and `y_dim`.
+    factor : int
+        Number of cells of `data` along each side of a block.
+
+    Returns
+    -------
+    DataArray or Dataset
+    """
+    level = data.coarsen({x_dim: factor, y_dim: factor}, boundary="pad").mean()
+    # Coarsened coordinates of padded blocks are off-center
+    for dim in [x_dim, y_dim]:
+        res = data[dim][1].item() - data[dim][0].item()
+        level[dim] = (
+            data[dim][0].item() + (factor - 1) * res / 2
+            + np.arange(level[dim].size) * factor * res
+        )
+    return level
+
+
+def overview_path(path):
+    """Path of the overview pyramid of the Zarr store at `path`."""
+    return f"{os.fspath(path).rstrip(os.sep)}.overviews"
+
+
+def open_overviews(path):
+    """Opens the Zarr store at `path` along with its overviews, if any.
+
+    The overviews are the groups 1, 2... of the store at
+    `overview_path(path)`, level k being coarsened by 2**k.
+
+    Returns
+    -------
+    list of Dataset, the first one being the store at `path`
+    """
+    levels = [DATASETS.open_zarr(path)]
+    opath = overview_path(path)
+    if os.path.exists(opath):
+        nlevels = xr.open_zarr(opath, group="1").attrs["levels"]
+        levels += [
+            DATASETS.open_zarr(opath, group=str(k)) for k in range(1, nlevels)
+        ]
+    return levels
+
+
+def timeseries_path(path):
+    """Path of the copy of the Zarr store at `path` that is chunked for
+    reading time series."""
+    return f"{os.fspath(path).rstrip(os.sep)}.timeseries"
+
+
+def open_timeseries(path):
+    """Opens the Zarr store at `path` for point queries.
+
+    That is its copy at `timeseries_path(path)`, in which each chunk holds
+    the whole time series of a few grid cells, if it exists and is up to
+    date with the store, and otherwise the store itself.
+
+    Returns
+    -------
+    Dataset
+    """
+    tpath = timeseries_path(path)
+    if os.path.exists(tpath):
+        ds = DATASETS.open_zarr(tpath)
+        if ds.attrs.get("stamp") == path_stamp(path):
+            return ds
+    return DATASETS.open_zarr(path)
+
+
+def select_overview(levels, tz, x_dim="X", tile_width=256):
+    """Returns the coarsest of `levels` that is still at least as fine
+    as the pixels of a tile at zoom level `tz`.
+
+    Parameters
+    ----------
+    levels : list of DataArray or Dataset
+        Levels of an overview pyramid, as returned by `open_overviews`.
+    tz : int
+        Zoom level of the tile.
+
+    Returns
+    -------
+    DataArray or Dataset
+    """
+    resolution = abs(levels[0][x_dim][1].item() - levels[0][x_dim][0].item())
+    return levels[pyramid_level(resolution, tz, len(levels), tile_width)]
+
+
+def png_bytes(im):
     cv2_imencode_success, buffer = cv2.imencode(".png", im)
     assert cv2_imencode_success
-    io_buf = io.BytesIO(buffer)
+    return buffer.tobytes()
+
+
+def image_resp(im):
+    io_buf = io.BytesIO(png_bytes(im))
     resp = flask.send_file(io_buf, mimetype="image/png")
     return resp
 
 
+class TileCache:
+    """Cache of rendered PNG tiles, with an in-memory LRU tier and an
+    optional on-disk tier.
+
+    Parameters
+    ----------
+    memory_mb : float, optional
+        Maximum total size of the tiles held in memory, in megabytes.
+        0 disables the memory tier.
+    disk_path : str, optional
+        Directory of the disk tier. None (default) disables it. The
+        directory can be shared by several server processes.
+    disk_mb : float, optional
+        Maximum total size of the disk tier, in megabytes. Least recently
+        used tiles are removed when it is exceeded.
+    max_age : int, optional
+        Number of seconds browsers may reuse a tile without revalidating
+        it, sent in the Cache-Control header.
+    """
+
+    def __init__(self, memory_mb=64, disk_path=None, disk_mb=1024, max_age=3600):
+        self.memory_bytes = int(memory_mb * 2**20)
+        self.disk_path = disk_path
+        self.disk_bytes = int(disk_mb * 2**20)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        if disk_path is not None:
+            os.makedirs(disk_path, exist_ok=True)
+            self._disk_used = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key):
+        """Returns the PNG bytes cached under `key`, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is None and self.disk_path is not None:
+            fname = self._disk_fname(key)
+            try:
+                with open(fname, "rb") as f:
+                    data = f.read()
+                os.utime(fname)
+            except FileNotFoundError:
+                data = None
+            if data is not None:
+                self._put_memory(key, data)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Caches the PNG bytes `data` under `key` in both tiers."""
+        self._put_memory(key, data)
+        if self.disk_path is not None and len(data) <= self.disk_bytes:
+            fname = self._disk_fname(key)
+            tmp_fname = f"{fname}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_fname, "wb") as f:
+                f.write(data)
+            os.replace(tmp_fname, fname)
+            with self._lock:
+                self._disk_used += len(data)
+                trim = self._disk_used > self.disk_bytes
+            if trim:
+                self._trim_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+        if self.disk_path is not None:
+            for fname, _, _ in self._disk_entries():
+                _remove_if_exists(fname)
+            self._disk_used = 0
+
+    def _put_memory(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= len(old)
+            self._memory[key] = data
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    def _disk_fname(self, key):
+        return os.path.join(self.disk_path, f"{key}.png")
+
+    def _disk_entries(self):
+        entries = []
+        with os.scandir(self.disk_path) as it:
+            for e in it:
+                if e.name.endswith(".png"):
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        # removed by another process
+                        continue
+                    entries.append((e.path, st.st_size, st.st_mtime))
+        return entries
+
+    def _trim_disk(self):
+        # Other processes may share the directory, so recount rather than
+        # trusting our own running total.
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        used = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for fname, size, _ in entries:
+            if used <= target:
+                break
+            _remove_if_exists(fname)
+            used -= size
+        with self._lock:
+            self._disk_used = used
+
+
+def _remove_if_exists(fname):
+    try:
+        os.remove(fname)
+    except FileNotFoundError:
+        pass
+
+
+def path_stamp(*paths):
+    """Returns a string identifying the current version of the datasets
+    stored at `paths`, for use as the `stamp` of `cached_tile`. For a
+    Zarr store the modification time of its consolidated metadata is
+    used, or if it has none the latest one of its arrays' metadata.
+    Otherwise it is the modification time of the file or directory
+    itself, or 0 if it doesn't exist (e.g. optional overviews).
+    """
+    mtimes = []
+    for p in paths:
+        zmetadata = os.path.join(p, ".zmetadata")
+        if os.path.exists(zmetadata):
+            mtime = os.stat(zmetadata).st_mtime_ns
+        elif os.path.exists(os.path.join(p, ".zgroup")):
+            mtime = max(
+                [os.stat(p).st_mtime_ns] + [
+                    os.stat(f).st_mtime_ns for f in (
+                        os.path.join(e.path, ".zarray") for e in os.scandir(p)
+                    ) if os.path.exists(f)
+                ]
+            )
+        elif os.path.exists(p):
+            mtime = os.stat(p).st_mtime_ns
+        else:
+            mtime = 0
+        mtimes.append(f"{mtime}")
+    return ":".join(mtimes)
+
+
+def tile_cache_key(endpoint, path, args, stamp):
+    """Content-addressed cache key of a tile request. `args` are the
+    query arguments, normalized by sorting so that their order in the
+    URL doesn't matter."""
+    normalized = sorted(
+        (name, val) for name, vals in args.lists() for val in vals
+    )
+    h = hashlib.sha256(
+        json.dumps([endpoint, path, normalized, stamp]).encode()
+    )
+    return h.hexdigest()
+
+
+def cached_tile(cache, stamp=None):
+    """Decorator for tile endpoints that serves rendered tiles from
+    `cache` when possible.
+
+    Tiles are keyed on the endpoint, the request path (which contains
+    z/x/y), the normalized query arguments and the data modification
+    stamp returned by calling `stamp`. Responses carry a strong ETag
+    derived from that key, so that browsers revalidating a tile get a
+    304 without the tile being rendered or even read from the cache.
+
+    Parameters
+    ----------
+    cache : TileCache or None
+        Cache to use. If None, the endpoint is returned undecorated.
+    stamp : callable, optional
+        Returns a string that changes whenever the underlying data
+        changes, e.g. `lambda: path_stamp(zarr_path)`.
+    """
+    def decorator(fn):
+        if cache is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            req = flask.request
+            key = tile_cache_key(
+                req.endpoint,
+                req.path,
+                req.args,
+                None if stamp is None else stamp(),
+            )
+            if key in req.if_none_match:
+                resp = flask.Response(status=304)
+            else:
+                data = cache.get(key)
+                if data is None:
+                    resp = flask.make_response(fn(*args, **kwargs))
+                    if resp.status_code != 200 or resp.mimetype != "image/png":
+                        return resp
+                    resp.direct_passthrough = False
+                    data = resp.get_data()
+                    cache.put(key, data)
+                resp = flask.Response(data, mimetype="image/png")
+            resp.set_etag(key)
+            resp.cache_control.public = True
+            resp.cache_control.max_age = cache.max_age
+            return resp
+
+        return wrapper
+
+    return decorator
+
+
+def server_processes():
+    """Number of processes of the server, each of which has its own
+    workers: that of the mod_wsgi daemon process group the app runs in,
+    or 1 outside of mod_wsgi."""
+    try:
+        import mod_wsgi
+    except ImportError:
+        return 1
+    return max(1, getattr(mod_wsgi, "maximum_processes", 1))
+
+
+class TileRenderer:
+    """Renders tiles in a pool of worker processes, so that the burst of
+    requests of a map loading uses all cores.
+
+    Requests for a tile that is already being rendered wait for that
+    rendering instead of starting another one (single flight). At most
+    `max_pending` tiles are rendered or queued at once; beyond that
+    requests wait up to `timeout` seconds for room, and then fail with
+    a 503 so that the server doesn't accumulate unbounded work.
+
+    Rendering functions run in a worker must be defined at module level,
+    take only picklable arguments and return picklable results (e.g. PNG
+    bytes from `tile_png`). Workers are forked from the server process
+    by `start`, so they share its loaded modules and configuration.
+    Processes in which `start` wasn't called, e.g. ones forked from the
+    server afterwards, render in the requesting thread.
+
+    Parameters
+    ----------
+    processes : int or None, optional
+        Number of worker processes. None to share the CPUs between the
+        server processes (see `server_processes`), 0 to render in the
+        requesting thread (still with single flight and back-pressure).
+    max_pending : int, optional
+        Maximum number of tiles rendered or queued at once.
+    timeout : float, optional
+        Seconds a request may wait for room in the queue, or for the
+        rendering of an identical tile.
+    """
+
+    def __init__(self, processes=None, max_pending=64, timeout=30):
+        self.processes = (
+            max(1, os.cpu_count() // server_processes())
+            if processes is None else processes
+        )
+        self.timeout = timeout
+        self.coalesced = 0
+        self.rejected = 0
+        self._pool = None
+        self._pid = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def start(self):
+        """Starts the worker processes. Call it once, when all modules
+        defining rendering functions are imported and before the server
+        starts threads, since forking a multi-threaded process may leave
+        locks held in the workers. Requests never start it.
+        """
+        if self.processes == 0:
+            return
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context("fork")
+                )
+                self._pid = os.getpid()
+        # Workers are forked on the first submission
+        self._pool.submit(int).result()
+
+    def started(self):
+        """Whether there are worker processes for the current process."""
+        return self._pool is not None and self._pid == os.getpid()
+
+    def render(self, key, fn, *args, inline=False):
+        """Returns `fn(*args)`, computed once for all concurrent calls
+        with the same `key`. If `inline` is True, or there are no workers,
+        it is computed in the calling thread, e.g. for functions that
+        can't be pickled.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            try:
+                return future.result(self.timeout)
+            except concurrent.futures.TimeoutError:
+                raise ServiceUnavailableError("Timed out waiting for tile")
+
+        try:
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.rejected += 1
+                raise ServiceUnavailableError("Too many tiles being rendered")
+            try:
+                if inline or not self.started():
+                    result = fn(*args)
+                else:
+                    result = self._pool.submit(fn, *args).result()
+            finally:
+                self._slots.release()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "inflight": len(self._inflight),
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
+
+
+def metatile_extents(tx, ty, tz, n):
+    """Tile range of the n x n block of tiles (metatile) containing tile
+    (tx, ty) at zoom level tz.
+
+    Returns
+    -------
+    tx0, ty0, tx1, ty1 : int
+        First tiles and last tiles (excluded) of the metatile.
+    """
+    n = min(n, 2 ** tz)
+    tx0 = tx - tx % n
+    ty0 = ty - ty % n
+    return tx0, ty0, tx0 + n, ty0 + n
+
+
+class FieldCache:
+    """Small in-memory LRU cache of computed fields, e.g. the map of a
+    metatile from which its tiles are cut.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of fields held.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """Returns the field cached under `key`, calling `compute()` to
+        get it if it isn't cached. Calls for the same key may compute it
+        concurrently; use a `TileRenderer` in `compute` to avoid that.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResultStore:
+    """Results of an analysis over the whole domain of a dataset, keyed by
+    the parameters of the analysis, held in memory and optionally in Zarr
+    stores on disk.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of results held in memory.
+    path : str or Path, optional
+        Directory where results are also written, one `<key>.zarr` store
+        each, so that they outlive the process and are shared between
+        processes. Results are only held in memory if None.
+    prefetch_size : int, optional
+        Maximum number of results waiting to be computed in the
+        background by `prefetch` . 0 to never compute them in the
+        background.
+    """
+
+    def __init__(self, maxsize=8, path=None, prefetch_size=2):
+        self.maxsize = maxsize
+        self.path = path
+        self.prefetch_size = prefetch_size
+        self.hits = 0
+        self.misses = 0
+        self.dropped = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._jobs = collections.deque()
+        self._pending = set()
+        self._ready = threading.Condition(self._lock)
+        self._pid = None
+
+    @staticmethod
+    def key(params, stamp):
+        """Key of the result of the analysis with `params` , a JSON
+        serializable value, of the data at version `stamp` ."""
+        return hashlib.sha256(
+            json.dumps([params, stamp], sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def peek(self, params, stamp):
+        """Returns the result for `params` and `stamp` if it is in memory or
+        on disk, or None, without computing it.
+
+        Returns
+        -------
+        Dataset or None
+        """
+        key = self.key(params, stamp)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.path is not None:
+            store = os.path.join(self.path, f"{key}.zarr")
+            if os.path.exists(store):
+                result = xr.open_zarr(store)
+                self._put(key, result)
+                with self._lock:
+                    self.hits += 1
+                return result
+        return None
+
+    def get(self, params, stamp, compute):
+        """Returns the result for `params` and `stamp` , calling `compute()`
+        to get it if it isn't stored yet. Concurrent calls for the same key
+        compute it once.
+
+        Returns
+        -------
+        Dataset
+        """
+        result = self.peek(params, stamp)
+        if result is not None:
+            return result
+        key = self.key(params, stamp)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            result = self.peek(params, stamp)
+            if result is None:
+                with self._lock:
+                    self.misses += 1
+                result = compute()
+                if self.path is not None:
+                    self._write(key, result)
+                self._put(key, result)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return result
+
+    def prefetch(self, params, stamp, compute):
+        """Like `get` , but computes the result in a background thread and
+        returns at once. Results are computed one at a time, the last asked
+        for first. Those already asked for are skipped, and beyond
+        `prefetch_size` waiting ones the oldest are dropped, since their
+        maps have most likely been left since.
+        """
+        if self.prefetch_size == 0:
+            return
+        key = self.key(params, stamp)
+        with self._lock:
+            if self._pid != os.getpid():
+                # The worker thread doesn't survive a fork
+                self._jobs = collections.deque()
+                self._pending = set()
+                self._ready = threading.Condition(self._lock)
+                self._pid = os.getpid()
+                threading.Thread(target=self._prefetch_worker, daemon=True).start()
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            self._jobs.append((key, params, stamp, compute))
+            while len(self._jobs) > self.prefetch_size:
+                self._pending.discard(self._jobs.popleft()[0])
+                self.dropped += 1
+            self._ready.notify()
+
+    def _prefetch_worker(self):
+        while True:
+            with self._lock:
+                while not self._jobs:
+                    self._ready.wait()
+                key, params, stamp, compute = self._jobs.pop()
+            try:
+                self.get(params, stamp, compute)
+            except Exception as e:
+                warnings.warn(f"prefetching result {params} failed: {e!r}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def pending(self):
+        """Number of results being or to be prefetched."""
+        with self._lock:
+            return len(self._pending)
+
+    def _write(self, key, result):
+        store = os.path.join(self.path, f"{key}.zarr")
+        tmp_store = f"{store}.{os.getpid()}.tmp"
+        os.makedirs(self.path, exist_ok=True)
+        result.to_zarr(tmp_store, mode="w")
+        try:
+            os.replace(tmp_store, store)
+        except OSError:
+            # Another process wrote it first
+            shutil.rmtree(tmp_store, ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def render_tile(renderer, fn, *args, inline=False):
+    """Renders the tile of the current request by calling
+    `fn(qstring, *args)` , through `renderer` if it isn't None, and
+    returns it as a PNG response.
+
+    `fn` gets the query string of the request, to parse its arguments
+    with `parse_arg(..., qstring=qstring)` , since there is no request
+    in a worker process. It must return PNG data, e.g. from `tile_png`.
+    Identical requests are rendered once.
+    """
+    req = flask.request
+    qstring = "?" + req.query_string.decode() if req.query_string else ""
+    if renderer is None:
+        data = fn(qstring, *args)
+    else:
+        key = tile_cache_key(req.endpoint, req.path, req.args, None)
+        data = renderer.render(key, fn, qstring, *args, inline=inline)
+    return flask.Response(data, mimetype="image/png")
+
+
 def to_multipolygon(p: Union[Polygon, MultiPolygon]) -> MultiPolygon:
     if not isinstance(p, MultiPolygon):
         p = MultiPolygon([p])
@@ -999,6 +2029,252 @@ def average_over(ds, s, lon_name="lon", lat_name="lat", all_touched=False):
     return res
 
 
+def average_over_many(
+    ds, shapes, dim="shape", lon_name="lon", lat_name="lat", all_touched=False
+):
+    """Average a Dataset over each of several shapes at once.
+
+    Equivalent to concatenating the results of `average_over` for each
+    shape along `dim`, but the data is trimmed and weighted once for
+    all of them, with the shapes rasterized on a shared grid.
+    """
+    ds = ds.where(ds.notnull(), drop=True)
+
+    lon_res = ds[lon_name].values[1] - ds[lon_name].values[0]
+    lat_res = ds[lat_name].values[1] - ds[lat_name].values[0]
+
+    bounds = np.array([s.bounds for s in shapes])
+    ds = trim_to_bbox(
+        ds,
+        shapely.geometry.box(
+            bounds[:, 0].min(), bounds[:, 1].min(),
+            bounds[:, 2].max(), bounds[:, 3].max(),
+        ),
+        lon_name=lon_name,
+        lat_name=lat_name,
+    )
+
+    lon_min = ds[lon_name].values[0] - 0.5 * lon_res
+    lon_max = ds[lon_name].values[-1] + 0.5 * lon_res
+    lat_min = ds[lat_name].values[0] - 0.5 * lat_res
+    lat_max = ds[lat_name].values[-1] + 0.5 * lat_res
+
+    lon_size = ds.sizes[lon_name]
+    lat_size = ds.sizes[lat_name]
+
+    t = rasterio.transform.Affine(
+        (lon_max - lon_min) / lon_size,
+        0,
+        lon_min,
+        0,
+        (lat_max - lat_min) / lat_size,
+        lat_min,
+    )
+
+    r0 = np.stack([
+        rasterio.features.rasterize(
+            [s], out_shape=(lat_size, lon_size), transform=t, all_touched=all_touched
+        )
+        for s in shapes
+    ])
+    r0 = xr.DataArray(
+        r0,
+        dims=(dim, lat_name, lon_name),
+        coords={lat_name: ds[lat_name], lon_name: ds[lon_name]},
+    )
+    r = r0 * np.cos(np.deg2rad(ds[lat_name]))
+
+    res = ds.weighted(r).mean([lat_name, lon_name], skipna=True)
+
+    if isinstance(res, xr.DataArray):
+        res.name = ds.name
+
+    return res
+
+
+class Zones:
+    """Assignment of the cells of a regular lat/lon grid to the zones
+    delimited by a list of shapes, for computing statistics over all of
+    them in one pass with `zonal_stats`.
+
+    Cells are assigned to a shape the same way `average_over` does, so
+    with `all_touched` a cell on a boundary belongs to every shape it
+    touches. The assignment is therefore stored as (zone, cell) pairs
+    sorted by zone, rather than as a raster with one label per cell.
+
+    Parameters
+    ----------
+    shapes : list of shapely geometries
+    lon, lat : array_like
+        Evenly spaced cell centers of the grid.
+    keys : list, optional
+        Identifiers of the shapes, used as the coordinate of the zone
+        dimension. Defaults to 0, 1...
+    all_touched : bool, optional
+        As in `rasterio.features.rasterize`.
+    """
+
+    def __init__(self, shapes, lon, lat, keys=None, all_touched=False):
+        lon = np.asarray(lon)
+        lat = np.asarray(lat)
+        lon_res = lon[1] - lon[0]
+        lat_res = lat[1] - lat[0]
+        zone, row, col = [], [], []
+        for i, s in enumerate(shapes):
+            # Same margin as trim_to_bbox
+            x0, y0, x1, y1 = s.bounds
+            cols = np.flatnonzero(
+                (lon >= x0 - abs(lon_res)) & (lon <= x1 + abs(lon_res))
+            )
+            rows = np.flatnonzero(
+                (lat >= y0 - abs(lat_res)) & (lat <= y1 + abs(lat_res))
+            )
+            if cols.size == 0 or rows.size == 0:
+                continue
+            c0, c1 = cols[0], cols[-1] + 1
+            r0, r1 = rows[0], rows[-1] + 1
+            t = rasterio.transform.Affine(
+                lon_res, 0, lon[c0] - 0.5 * lon_res,
+                0, lat_res, lat[r0] - 0.5 * lat_res,
+            )
+            mask = rasterio.features.rasterize(
+                [s], out_shape=(r1 - r0, c1 - c0), transform=t,
+                all_touched=all_touched,
+            )
+            r, c = np.nonzero(mask)
+            zone.append(np.full(r.size, i))
+            row.append(r + r0)
+            col.append(c + c0)
+        self.n = len(shapes)
+        self.keys = list(range(self.n)) if keys is None else list(keys)
+        self.zone = np.concatenate(zone) if zone else np.zeros(0, int)
+        self.row = np.concatenate(row) if row else np.zeros(0, int)
+        self.col = np.concatenate(col) if col else np.zeros(0, int)
+        self.weight = np.cos(np.deg2rad(lat[self.row]))
+        self.starts = np.searchsorted(self.zone, np.arange(self.n), side="left")
+        self.ends = np.searchsorted(self.zone, np.arange(self.n), side="right")
+
+
+def zonal_stats(
+    da, zones, stats=("mean",), quantiles=(), keys=None, dim="region",
+    lon_name="lon", lat_name="lat",
+):
+    """Statistics of a DataArray over each zone of `zones`.
+
+    Only the window of the grid covering the requested zones is read.
+    The mean is weighted by cell area, like `average_over`; the other
+    statistics aren't. Missing values are skipped, and zones without
+    any valid cell get NaN (0 for count).
+
+    Parameters
+    ----------
+    da : DataArray
+        Data on the grid `zones` was built for.
+    zones : Zones
+    stats : sequence of str, optional
+        Any of "mean", "min", "max" and "count".
+    quantiles : sequence of float, optional
+        Quantiles to compute, in [0, 1].
+    keys : list, optional
+        Keys of the zones to compute, all of them by default.
+    dim : str, optional
+        Name of the zone dimension of the result.
+
+    Returns
+    -------
+    Dataset with one variable per statistic (and "quantiles", along a
+    "quantile" dimension), over the non-spatial dimensions of `da` and
+    `dim`.
+    """
+    if keys is None:
+        which = np.arange(zones.n)
+        keys = zones.keys
+    else:
+        key_index = {k: i for i, k in enumerate(zones.keys)}
+        missing = [k for k in keys if k not in key_index]
+        if missing:
+            raise InvalidRequestError(f"invalid region {missing[0]}")
+        which = np.array([key_index[k] for k in keys], dtype=int)
+    sizes = zones.ends[which] - zones.starts[which]
+    pairs = np.concatenate(
+        [np.arange(zones.starts[z], zones.ends[z]) for z in which]
+        + [np.zeros(0, int)]
+    )
+    nonempty = sizes > 0
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])[nonempty]
+
+    other_dims = [d for d in da.dims if d not in (lat_name, lon_name)]
+    other_shape = [da.sizes[d] for d in other_dims]
+    n_other = int(np.prod(other_shape))
+    out_shape = other_shape + [len(which)]
+
+    def result(values):
+        return xr.DataArray(
+            values.reshape(out_shape),
+            dims=other_dims + [dim],
+            coords={
+                **{k: v for k, v in da.coords.items()
+                   if lat_name not in v.dims and lon_name not in v.dims},
+                dim: keys,
+            },
+        )
+
+    if pairs.size > 0:
+        row = zones.row[pairs]
+        col = zones.col[pairs]
+        r0, r1 = row.min(), row.max() + 1
+        c0, c1 = col.min(), col.max() + 1
+        window = da.isel({lat_name: slice(r0, r1), lon_name: slice(c0, c1)})
+        window = window.transpose(*other_dims, lat_name, lon_name).values
+        values = window.reshape(n_other, -1)[:, (row - r0) * (c1 - c0) + (col - c0)]
+        valid = ~np.isnan(values)
+        values_or_0 = np.where(valid, values, 0)
+
+    def per_zone(reduced, fill):
+        full = np.full((n_other, len(which)), fill, dtype=reduced.dtype if pairs.size else float)
+        if pairs.size > 0:
+            full[:, nonempty] = reduced
+        return full
+
+    ds = xr.Dataset()
+    for stat in stats:
+        if stat == "mean":
+            if pairs.size > 0:
+                w = np.where(valid, zones.weight[pairs], 0)
+                wsum = np.add.reduceat(w, starts, axis=1)
+                vsum = np.add.reduceat(w * values_or_0, starts, axis=1)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    reduced = np.where(wsum > 0, vsum / wsum, np.nan)
+            else:
+                reduced = None
+            ds["mean"] = result(per_zone(reduced, np.nan))
+        elif stat == "min" or stat == "max":
+            if pairs.size > 0:
+                # fmin and fmax ignore NaN unless all values are NaN
+                ufunc = np.fmin if stat == "min" else np.fmax
+                reduced = ufunc.reduceat(values, starts, axis=1)
+            else:
+                reduced = None
+            ds[stat] = result(per_zone(reduced, np.nan))
+        elif stat == "count":
+            reduced = np.add.reduceat(valid, starts, axis=1) if pairs.size else None
+            ds["count"] = result(per_zone(reduced, 0).astype(int))
+        else:
+            raise Exception(f"Unknown statistic {stat}")
+    if len(quantiles) > 0:
+        q = np.full((len(quantiles), n_other, len(which)), np.nan)
+        ends = np.concatenate([starts[1:], [pairs.size]])
+        with warnings.catch_warnings():
+            # zones whose cells are all missing
+            warnings.filterwarnings("ignore", "All-NaN slice", RuntimeWarning)
+            for j, (a, b) in zip(np.flatnonzero(nonempty), zip(starts, ends)):
+                q[:, :, j] = np.nanquantile(values[:, a:b], quantiles, axis=1)
+        ds["quantiles"] = xr.concat(
+            [result(qi) for qi in q], pd.Index(quantiles, name="quantile")
+        )
+    return ds
+
+
 #
 # Functions to deal with periodic dimension (e.g. longitude)
 #
@@ -1105,6 +2381,11 @@ class ClientSideError(Exception):
         self.status = status
         super().__init__(message)
 
+    def __reduce__(self):
+        # So that errors raised in TileRenderer workers are re-raised
+        # as they were.
+        return (_rebuild_client_side_error, (type(self), self.message, self.status))
+
     def to_dict(self):
         return {
             "status": self.status,
@@ -1123,6 +2404,17 @@ class NotFoundError(ClientSideError):
         super().__init__(message, 404)
 
 
+class ServiceUnavailableError(ClientSideError):
+    def __init__(self, message):
+        super().__init__(message, 503)
+
+
+def _rebuild_client_side_error(cls, message, status):
+    e = cls.__new__(cls)
+    ClientSideError.__init__(e, message, status)
+    return e
+
+
 def client_side_error(e):
     return (e.to_dict(), e.status)
 
@@ -1166,6 +2458,264 @@ default behavior:
     return val
 
 
+class DatasetRegistry:
+    """Process-wide cache of opened datasets, so that request handlers
+    don't reopen stores and parse their metadata and coordinates on every
+    request.
+
+    A dataset is reopened when `path_stamp` of its path changes, e.g.
+    when its Zarr store is rewritten or appended to. Callers get a shallow
+    copy of the cached dataset, so they may change its attrs freely; the
+    data itself is shared and loaded lazily as usual.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def open(self, opener, path, **kwargs):
+        """Returns `opener(path, **kwargs)`, from the cache if the
+        dataset at `path` hasn't changed since it was opened."""
+        key = (opener, str(path), repr(sorted(kwargs.items())))
+        stamp = path_stamp(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                return entry[1].copy(deep=False)
+            self.misses += 1
+        ds = opener(path, **kwargs)
+        with self._lock:
+            self._entries[key] = (stamp, ds)
+        return ds.copy(deep=False)
+
+    def open_zarr(self, path, **kwargs):
+        return self.open(xr.open_zarr, path, **kwargs)
+
+    def open_dataarray(self, path, **kwargs):
+        return self.open(xr.open_dataarray, path, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "datasets": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+DATASETS = DatasetRegistry()
+
+
+class ConnectionPool:
+    """Bounded pool of connections to a PostgreSQL database. Callers wait
+    for a free connection rather than opening more than `maxconn`.
+
+    Parameters
+    ----------
+    db_config : dict
+        Keyword arguments of `psycopg2.connect`.
+    maxconn : int, optional
+        Maximum number of open connections.
+    """
+
+    def __init__(self, db_config, maxconn=4):
+        self._pool = psycopg2.pool.ThreadedConnectionPool(0, maxconn, **db_config)
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self._slots:
+            conn = self._pool.getconn()
+            try:
+                yield conn
+            finally:
+                # End the transaction that reading opened, or drop
+                # the connection if it's broken.
+                try:
+                    if not conn.closed:
+                        conn.rollback()
+                except psycopg2.Error:
+                    pass
+                self._pool.putconn(conn, close=bool(conn.closed))
+
+
+_POOLS = {}
+_POOLS_PID = None
+_POOLS_LOCK = threading.Lock()
+# Pools inherited from the parent process. Their connections can't be used
+# in a forked child, but they are never closed nor garbage collected
+# either, since that would close the parent's sockets.
+_INHERITED_POOLS = []
+
+
+def _db_pool(db_config):
+    global _POOLS_PID
+    key = tuple(sorted(db_config.items()))
+    with _POOLS_LOCK:
+        if _POOLS_PID != os.getpid():
+            # Connections can't be shared with a forked child process.
+            _INHERITED_POOLS.extend(_POOLS.values())
+            _POOLS.clear()
+            _POOLS_PID = os.getpid()
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_config)
+            _POOLS[key] = pool
+    return pool
+
+
+@contextlib.contextmanager
+def db_connection(db_config):
+    """Context that lends a connection from the process-wide pool of the
+    database described by `db_config` (keyword arguments of
+    `psycopg2.connect`)."""
+    with _db_pool(db_config).connection() as conn:
+        yield conn
+
+
+def read_sql(db_config, query, params=None):
+    """`pandas.read_sql` through a pooled connection."""
+    with db_connection(db_config) as conn:
+        return pd.read_sql(query, conn, params=params)
+
+
+class ShapeIndex:
+    """STRtree spatial index of the `the_geom` column of a DataFrame, for
+    point-in-polygon and intersection queries that don't scan every row.
+    Matching rows are returned in their original order.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self._tree = shapely.STRtree(self.df["the_geom"].values)
+
+    def containing(self, x, y):
+        """Returns the first row whose geometry contains the point (x, y),
+        or None."""
+        i = self._tree.query(shapely.geometry.Point(x, y), predicate="within")
+        if len(i) == 0:
+            return None
+        return self.df.iloc[i.min()]
+
+    def intersecting(self, geom):
+        """Returns the rows whose geometries intersect `geom`."""
+        i = np.sort(self._tree.query(geom, predicate="intersects"))
+        return self.df.iloc[i]
+
+
+class GeometryCache:
+    """Cache of query results whose `the_geom` column has been parsed
+    from WKB into shapely geometries, keyed by the query and its
+    parameters.
+
+    Parameters
+    ----------
+    ttl : float, optional
+        Number of seconds after which a result is read again from the
+        database.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def read(self, db_config, query, params=None):
+        df = self._entry(db_config, query, params)["df"]
+        # Geometries are immutable, so a shallow copy is enough to keep
+        # callers from changing the cached frame.
+        return df.copy(deep=False)
+
+    def index(self, db_config, query, params=None):
+        """Returns a `ShapeIndex` of the result of `query`, built once
+        per cached result."""
+        entry = self._entry(db_config, query, params)
+        with self._lock:
+            if entry.get("index") is None:
+                entry["index"] = ShapeIndex(entry["df"])
+            return entry["index"]
+
+    def zones(self, db_config, query, lon, lat, params=None, all_touched=False):
+        """Returns the `Zones` of the result of `query` on the grid
+        `lon`, `lat`, built once per cached result and grid. The zones
+        are keyed by the result's `key` column, as text."""
+        entry = self._entry(db_config, query, params)
+        lon = np.asarray(lon)
+        lat = np.asarray(lat)
+        grid = (
+            lon.tobytes(), lat.tobytes(), all_touched,
+        )
+        with self._lock:
+            zones = entry.setdefault("zones", {}).get(grid)
+        if zones is None:
+            df = entry["df"]
+            zones = Zones(
+                df["the_geom"], lon, lat,
+                keys=df["key"].astype(str), all_touched=all_touched,
+            )
+            with self._lock:
+                entry["zones"][grid] = zones
+        return zones
+
+    def _entry(self, db_config, query, params):
+        key = (
+            repr(query),
+            repr(sorted(params.items())) if params is not None else None,
+            repr(sorted(db_config.items())),
+        )
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry["time"] >= self.ttl:
+            df = read_sql(db_config, query, params=params)
+            if "the_geom" in df:
+                df["the_geom"] = df["the_geom"].apply(
+                    lambda x: shapely.wkb.loads(x.tobytes())
+                )
+            entry = {"time": time.monotonic(), "df": df}
+            with self._lock:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+SHAPES = GeometryCache()
+
+
+def read_shapes(db_config, query, params=None):
+    """Reads `query` like `read_sql`, with its `the_geom` column parsed
+    into shapely geometries, from the process-wide `SHAPES` cache when
+    possible."""
+    return SHAPES.read(db_config, query, params)
+
+
+def parse_json_arg(obj, name, conversion=str, default=REQUIRED):
+    '''Counterpart of parse_arg for a field of a JSON object, e.g. one
+item of a batch request.'''
+    if not isinstance(obj, dict):
+        raise InvalidRequestError(f"expected a JSON object, got {obj!r}")
+    if name not in obj or obj[name] is None:
+        if default is REQUIRED:
+            raise InvalidRequestError(f"{name} is required")
+        else:
+            return default
+    try:
+        val = conversion(obj[name])
+    except Exception as e:
+        raise InvalidRequestError(f"{name} must be interpretable as {conversion}: {e}") from e
+
+    return val
+
+
 def fix_calendar(ds):
     for name, coord in ds.coords.items():
         if coord.attrs.get("calendar") == "360":